@@ -0,0 +1,110 @@
+"""
+Micro-benchmark of onion link extraction on large synthetic pages.
+
+Compares the streaming extractor (tor2tor.extractor.iter_onion_links) with parsing the
+whole page with BeautifulSoup and running a regex on every <a href>.
+
+Usage: python benchmarks/extractor_benchmark.py [--sizes 1 8 32] [--repeat 3]
+"""
+import re
+import time
+import base64
+import random
+import hashlib
+import argparse
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from tor2tor.coreutils import is_valid_onion
+from tor2tor.extractor import iter_onion_links
+
+
+
+def random_onion_address(generator: random.Random) -> str:
+    """
+    Builds a well-formed v3 onion address (public key, checksum and version) for a random public key.
+
+    :param generator: The random generator.
+    :return: The address, without .onion.
+    """
+    public_key = bytes(generator.getrandbits(8) for _ in range(32))
+    checksum = hashlib.sha3_256(b".onion checksum" + public_key + b"\x03").digest()[:2]
+    return base64.b32encode(public_key + checksum + b"\x03").decode().lower()
+
+
+def synthetic_page(size_mib: float, seed: int = 0) -> bytes:
+    """
+    Builds an onion directory-style page of roughly the given size.
+
+    :param size_mib: Size of the page in MiB.
+    :param seed: Seed for the random generator.
+    :return: The page's HTML.
+    """
+    generator = random.Random(seed)
+    rows = ["<html><body><table>"]
+    size = 0
+    while size < size_mib * 1024 * 1024:
+        address = random_onion_address(generator=generator)
+        row = (
+            f'<tr><td><a class="link" href="http://{address}.onion/index.php?a=1&amp;b=2">'
+            f"Mirror {size}</a></td><td>Lorem ipsum dolor sit amet, http://example.com</td></tr>"
+        )
+        rows.append(row)
+        size += len(row)
+    rows.append("</table></body></html>")
+    return "\n".join(rows).encode()
+
+
+def soup_extractor(page: bytes) -> list:
+    url_pattern = re.compile(r"https?://\S+")
+    valid_onions = []
+    for anchor in BeautifulSoup(page, "html.parser").find_all("a"):
+        href = anchor.get("href")
+        if href:
+            for url in url_pattern.findall(href):
+                if is_valid_onion(url):
+                    valid_onions.append(url)
+    return valid_onions
+
+
+def streaming_extractor(page: bytes) -> list:
+    chunks = (page[index : index + 64 * 1024] for index in range(0, len(page), 64 * 1024))
+    return list(iter_onion_links(chunks=chunks))
+
+
+def measure(extractor, page: bytes, repeat: int) -> tuple:
+    best_time = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        links = extractor(page)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    extractor(page)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(links), best_time, peak_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 8, 32])
+    parser.add_argument("--repeat", type=int, default=3)
+    arguments = parser.parse_args()
+
+    print(f"{'size':>8} {'extractor':>12} {'links':>8} {'seconds':>9} {'peak MiB':>9}")
+    for size_mib in arguments.sizes:
+        page = synthetic_page(size_mib=size_mib)
+        for name, extractor in [("soup", soup_extractor), ("streaming", streaming_extractor)]:
+            links, seconds, peak_memory = measure(
+                extractor=extractor, page=page, repeat=arguments.repeat
+            )
+            print(
+                f"{size_mib:>7}M {name:>12} {links:>8} {seconds:>9.3f} {peak_memory / 1024 / 1024:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
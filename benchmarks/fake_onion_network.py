@@ -0,0 +1,250 @@
+"""
+A local stand-in for the Tor network, for benchmarking tor2tor without Tor or real onions.
+
+It runs a SOCKS5 proxy that accepts CONNECT requests for any hostname and routes them all to
+a local HTTP server. The server serves a synthetic page for every onion address, with a configurable
+latency, size and failure rate. Each page links to other synthetic onions, so the crawler has a graph to walk.
+
+Usage: python benchmarks/fake_onion_network.py [--latency 0.2] [--page-size 20000] [--failure-rate 0.05]
+Then point tor2tor at it, e.g. tor2tor --socks-ports 127.0.0.1:<port> <seed onion printed on startup>
+"""
+import time
+import base64
+import random
+import socket
+import hashlib
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def recv_exactly(connection: socket.socket, size: int) -> bytes:
+    """
+    Receives exactly the given number of bytes from a connection.
+
+    :raise ConnectionError: If the connection is closed first.
+    """
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def onion_address(index: int) -> str:
+    """
+    Gets the synthetic onion address of a given page index. It is a well-formed v3 address
+    (public key, checksum and version), for a made-up public key.
+
+    :param index: Index of the page.
+    :return: The onion hostname.
+    """
+    public_key = hashlib.sha3_256(f"fake-onion-{index}".encode()).digest()
+    checksum = hashlib.sha3_256(b".onion checksum" + public_key + b"\x03").digest()[:2]
+    return base64.b32encode(public_key + checksum + b"\x03").decode().lower() + ".onion"
+
+
+class FakeOnionNetwork:
+    """
+    A local SOCKS5 proxy and HTTP server that serve synthetic onion pages.
+    The hostnames the proxy is asked to connect to are recorded in hosts, in order.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        latency_jitter: float = 0.1,
+        page_size: int = 20_000,
+        failure_rate: float = 0.0,
+        links_per_page: int = 20,
+        pages: int = 10_000,
+        seed: int = 0,
+    ):
+        """
+        :param latency: Seconds the server waits before answering a request (emulating Tor's round trips).
+        :param latency_jitter: Maximum number of seconds randomly added to the latency.
+        :param page_size: Size (in bytes) of each page.
+        :param failure_rate: Fraction of onions (0-1) that can't be reached.
+        :param links_per_page: Number of onion links on each page.
+        :param pages: Number of distinct onions in the network.
+        :param seed: Seed of the random choices, so runs with the same settings are comparable.
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.page_size = page_size
+        self.failure_rate = failure_rate
+        self.links_per_page = links_per_page
+        self.pages = pages
+        self.seed = seed
+
+        self.indexes = {onion_address(index): index for index in range(pages)}
+        self.hosts = []
+        self._hosts_lock = threading.Lock()
+
+        network = self
+
+        class PageHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                network.serve_page(handler=self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        self._http_server.daemon_threads = True
+        self.http_port = self._http_server.server_address[1]
+
+        class SocksHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                network.relay(client=self.request)
+
+        self._socks_server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SocksHandler)
+        self._socks_server.daemon_threads = True
+        self.socks_port = self._socks_server.server_address[1]
+
+        # The servers check for shutdown often, so stop() returns quickly
+        for server in [self._http_server, self._socks_server]:
+            threading.Thread(
+                target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+            ).start()
+
+    @property
+    def seed_onion(self) -> str:
+        """
+        :return: URL of the onion to start crawling from.
+        """
+        return f"http://{onion_address(0)}"
+
+    def page_index(self, hostname: str) -> int:
+        if hostname not in self.indexes:
+            # Addresses that aren't part of the network are mapped onto it deterministically
+            digest = hashlib.blake2b(hostname.encode(), digest_size=8).digest()
+            return int.from_bytes(digest, "big") % self.pages
+        return self.indexes[hostname]
+
+    def is_reachable(self, hostname: str) -> bool:
+        # The seed onion is always reachable, so every run has something to crawl
+        index = self.page_index(hostname=hostname)
+        return index == 0 or random.Random(f"{self.seed}-{index}").random() >= self.failure_rate
+
+    def render_page(self, hostname: str) -> bytes:
+        index = self.page_index(hostname=hostname)
+        rng = random.Random(f"{self.seed}-{index}-links")
+        links = "".join(
+            f'<li><a href="http://{onion_address(rng.randrange(1, self.pages))}/">onion</a></li>'
+            for _ in range(self.links_per_page)
+        )
+        page = (
+            f"<!DOCTYPE html><html><head><title>Fake onion {index}</title></head>"
+            f"<body style='background:hsl({index % 360},60%,85%)'><h1>Fake onion {index}</h1><ul>{links}</ul>"
+        ).encode()
+
+        # Pad the page to its configured size
+        filler = b"<p>" + b"lorem ipsum dolor sit amet " * 40 + b"</p>"
+        padding = max(self.page_size - len(page) - len(b"</body></html>"), 0)
+        return page + (filler * (padding // len(filler) + 1))[:padding] + b"</body></html>"
+
+    def serve_page(self, handler: BaseHTTPRequestHandler):
+        hostname = handler.headers.get("Host", "").split(":")[0]
+        time.sleep(self.latency + random.uniform(0, self.latency_jitter))
+
+        body = self.render_page(hostname=hostname)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def relay(self, client: socket.socket):
+        """
+        Handles a SOCKS5 connection: every CONNECT request is routed to the local HTTP server,
+        unless the requested onion is one of the unreachable ones.
+        """
+        try:
+            # Greeting: no authentication
+            _, methods_count = recv_exactly(client, 2)
+            recv_exactly(client, methods_count)
+            client.sendall(b"\x05\x00")
+
+            # Request: only CONNECT is supported
+            _, command, _, address_type = recv_exactly(client, 4)
+            if address_type == 3:
+                hostname = recv_exactly(client, recv_exactly(client, 1)[0]).decode()
+            elif address_type == 1:
+                hostname = socket.inet_ntoa(recv_exactly(client, 4))
+            else:
+                hostname = socket.inet_ntop(socket.AF_INET6, recv_exactly(client, 16))
+            recv_exactly(client, 2)
+            with self._hosts_lock:
+                self.hosts.append(hostname)
+
+            if command != 1 or not self.is_reachable(hostname=hostname):
+                # Host unreachable
+                time.sleep(self.latency)
+                client.sendall(b"\x05\x04\x00\x01" + b"\x00" * 6)
+                return
+
+            upstream = socket.create_connection(("127.0.0.1", self.http_port))
+            client.sendall(b"\x05\x00\x00\x01" + socket.inet_aton("127.0.0.1") + b"\x00\x00")
+        except (OSError, ValueError):
+            return
+
+        # Relay the connection both ways until either side closes it
+        def pipe(source: socket.socket, destination: socket.socket):
+            try:
+                while data := source.recv(64 * 1024):
+                    destination.sendall(data)
+            except OSError:
+                pass
+            finally:
+                for connection in (source, destination):
+                    try:
+                        connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+        threading.Thread(target=pipe, args=(upstream, client), daemon=True).start()
+        pipe(client, upstream)
+        upstream.close()
+
+    def stop(self):
+        """
+        Stops the SOCKS5 proxy and the HTTP server.
+        """
+        for server in [self._socks_server, self._http_server]:
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-jitter", type=float, default=0.1)
+    parser.add_argument("--page-size", type=int, default=20_000)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--links-per-page", type=int, default=20)
+    arguments = parser.parse_args()
+
+    network = FakeOnionNetwork(
+        latency=arguments.latency,
+        latency_jitter=arguments.latency_jitter,
+        page_size=arguments.page_size,
+        failure_rate=arguments.failure_rate,
+        links_per_page=arguments.links_per_page,
+    )
+    print(f"SOCKS5 proxy: 127.0.0.1:{network.socks_port}")
+    print(f"Seed onion: {network.seed_onion}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        network.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of tor2tor's import and startup times.
+
+Each measurement runs in a fresh interpreter, so nothing is served from an already warm module cache.
+It also checks that importing tor2tor has no side effects (no command line parsing, no log handlers).
+
+Usage: python benchmarks/startup_benchmark.py [--repeat 5]
+"""
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+MEASUREMENTS = {
+    "interpreter": "pass",
+    "import tor2tor.coreutils": "import tor2tor.coreutils",
+    "import tor2tor.tor2tor": "import tor2tor.tor2tor",
+    "Tor2Tor()": "from tor2tor.tor2tor import Tor2Tor; Tor2Tor().close()",
+    "tor2tor --version": (
+        "import sys; sys.argv = ['tor2tor', '--version']\n"
+        "from tor2tor.main import execute_tor2tor\n"
+        "try:\n    execute_tor2tor()\nexcept SystemExit:\n    pass"
+    ),
+}
+
+SIDE_EFFECTS_CHECK = (
+    "import sys, logging; sys.argv = ['orchestrator', '--not-a-tor2tor-option']\n"
+    "import tor2tor.tor2tor\n"
+    "assert not logging.getLogger().handlers, 'root logger was configured on import'\n"
+    "assert not logging.getLogger('Tor2Tor').handlers, 'Tor2Tor logger was configured on import'"
+)
+
+
+def measure(code: str, repeat: int) -> float:
+    """
+    Measures the median wall clock time of running the given code in a fresh interpreter.
+
+    :param code: The code to run.
+    :param repeat: Number of times to run it.
+    :return: The median time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    subprocess.run([sys.executable, "-c", SIDE_EFFECTS_CHECK], check=True)
+    print("import tor2tor.tor2tor has no side effects")
+
+    print(f"{'measurement':>26} {'median seconds':>15}")
+    for name, code in MEASUREMENTS.items():
+        print(f"{name:>26} {measure(code=code, repeat=arguments.repeat):>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+End-to-end throughput benchmark of tor2tor against a local fake onion network.
+
+A fake network (benchmarks/fake_onion_network.py) stands in for Tor and the onions, so runs are
+reproducible and need neither Tor nor network access. Firefox and geckodriver are still required.
+For each combination of pool size and worker threads, Tor2Tor.execute_scraper() crawls and captures
+the fake network in a fresh process (with its own home directory, so nothing is served from a previous
+capture index), and the benchmark reports captures per minute, p50/p95 capture latency and peak RSS
+(of tor2tor and its Firefox processes).
+
+Usage: python benchmarks/throughput_benchmark.py [--pools 1 2 4] [--threads 1 2 4] [--limit 30]
+    [--latency 0.2] [--page-size 20000] [--failure-rate 0.05]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+
+from fake_onion_network import FakeOnionNetwork
+
+
+def process_tree_rss(pid: int) -> int:
+    """
+    Gets the total resident set size of a process and all of its descendants (Linux only).
+
+    :param pid: ID of the root process.
+    :return: The total RSS in bytes.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                # The parent PID is the second field after the (parenthesised) command name
+                parent_pid = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent_pid, []).append(int(entry))
+
+    total_rss = 0
+    pending = [pid]
+    while pending:
+        process_id = pending.pop()
+        pending.extend(children.get(process_id, []))
+        try:
+            with open(f"/proc/{process_id}/statm") as statm_file:
+                total_rss += int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total_rss
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    :return: The given percentile (0-1) of the values, or 0 if there are none.
+    """
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+def run_once(arguments: argparse.Namespace):
+    """
+    Runs a single benchmark configuration, and prints its measurements as JSON.
+    This runs in a child process whose HOME is a fresh temporary directory.
+    """
+    from tor2tor.tor2tor import Tor2Tor
+    from tor2tor.coreutils import PROGRAM_DIRECTORY
+
+    peak_rss = 0
+    sampling = threading.Event()
+
+    def sample_rss():
+        nonlocal peak_rss
+        while not sampling.wait(timeout=0.5):
+            peak_rss = max(peak_rss, process_tree_rss(pid=os.getpid()))
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+
+    tor2tor = Tor2Tor(
+        headless=True,
+        socks_ports=f"127.0.0.1:{arguments.socks_port}",
+        navigate_timeout=30,
+        connect_timeout=10,
+        read_timeout=30,
+    )
+
+    start_time = time.perf_counter()
+    tor2tor.execute_scraper(
+        target_onion=arguments.seed,
+        pool_size=arguments.pool,
+        worker_threads=arguments.thread_count,
+        depth=1,
+        limit=arguments.limit,
+        results_file=os.path.join(PROGRAM_DIRECTORY, "results.jsonl"),
+        show_tables=False,
+        manage_tor_service=False,
+    )
+    elapsed = time.perf_counter() - start_time
+
+    sampling.set()
+    sampler.join()
+
+    # Capture latencies come from the run's capture index
+    connection = sqlite3.connect(os.path.join(PROGRAM_DIRECTORY, "captures.db"))
+    durations = sorted(
+        row[0]
+        for row in connection.execute(
+            "SELECT duration FROM captures WHERE status = 'captured' AND duration IS NOT NULL"
+        )
+    )
+    skipped = connection.execute(
+        "SELECT COUNT(*) FROM captures WHERE status = 'skipped'"
+    ).fetchone()[0]
+    connection.close()
+
+    print(
+        json.dumps(
+            {
+                "captured": len(durations),
+                "skipped": skipped,
+                "elapsed": elapsed,
+                "warmup": tor2tor.pool_warmup_time,
+                "p50": percentile(durations, 0.50),
+                "p95": percentile(durations, 0.95),
+                "peak_rss": peak_rss,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-jitter", type=float, default=0.1)
+    parser.add_argument("--page-size", type=int, default=20_000)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true", help="show tor2tor's output")
+
+    # Options of a single configuration's run (used internally, by the child processes)
+    parser.add_argument("--run-once", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--socks-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", help=argparse.SUPPRESS)
+    parser.add_argument("--pool", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--thread-count", type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run_once:
+        run_once(arguments=arguments)
+        return
+
+    network = FakeOnionNetwork(
+        latency=arguments.latency,
+        latency_jitter=arguments.latency_jitter,
+        page_size=arguments.page_size,
+        failure_rate=arguments.failure_rate,
+    )
+    print(
+        f"Fake onion network: latency {arguments.latency}+{arguments.latency_jitter}s, "
+        f"{arguments.page_size} byte pages, {arguments.failure_rate:.0%} unreachable"
+    )
+    print(
+        f"{'pool':>5} {'threads':>8} {'captured':>9} {'skipped':>8} {'warm-up s':>10} "
+        f"{'captures/min':>13} {'p50 s':>7} {'p95 s':>7} {'peak RSS MiB':>13}"
+    )
+
+    try:
+        for pool in arguments.pools:
+            for thread_count in arguments.threads:
+                with tempfile.TemporaryDirectory(prefix="tor2tor-benchmark-") as home:
+                    process = subprocess.run(
+                        [
+                            sys.executable,
+                            os.path.abspath(__file__),
+                            "--run-once",
+                            f"--socks-port={network.socks_port}",
+                            f"--seed={network.seed_onion}",
+                            f"--pool={pool}",
+                            f"--thread-count={thread_count}",
+                            f"--limit={arguments.limit}",
+                        ],
+                        env=dict(os.environ, HOME=home),
+                        stdout=subprocess.PIPE,
+                        stderr=None if arguments.verbose else subprocess.DEVNULL,
+                        text=True,
+                    )
+
+                try:
+                    result = json.loads(process.stdout.strip().splitlines()[-1])
+                except (IndexError, ValueError):
+                    print(f"{pool:>5} {thread_count:>8} run failed (rerun with --verbose)")
+                    continue
+
+                captures_per_minute = result["captured"] / result["elapsed"] * 60
+                print(
+                    f"{pool:>5} {thread_count:>8} {result['captured']:>9} {result['skipped']:>8} "
+                    f"{result['warmup'] or 0:>10.1f} {captures_per_minute:>13.1f} {result['p50']:>7.2f} "
+                    f"{result['p95']:>7.2f} {result['peak_rss'] / 1024 / 1024:>13.0f}"
+                )
+    finally:
+        network.stop()
+
+
+if __name__ == "__main__":
+    main()
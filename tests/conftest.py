@@ -0,0 +1,112 @@
+import io
+import time
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from fake_onion_network import FakeOnionNetwork
+
+
+@pytest.fixture
+def socks_stubs():
+    """
+    Starts local stand-ins for Tor SOCKS ports (see benchmarks/fake_onion_network.py), which serve a page
+    for any hostname without delay and record the hostnames they were asked for:
+    socks_stubs(2) returns two of them, on their own ports.
+    """
+    stubs = []
+
+    def start(count: int) -> list:
+        started = [
+            FakeOnionNetwork(latency=0, latency_jitter=0, page_size=2000, pages=100)
+            for _ in range(count)
+        ]
+        stubs.extend(started)
+        return started
+
+    yield start
+
+    for stub in stubs:
+        stub.stop()
+
+
+class FakeFirefox:
+    """
+    A stand-in for a Firefox WebDriver instance, which "loads" any page and returns a small PNG screenshot.
+    """
+
+    # Seconds a page takes to load
+    load_time = 0.05
+
+    def __init__(self, options=None):
+        self.command_executor = SimpleNamespace(client_config=SimpleNamespace(timeout=120))
+        self.title = "Fake onion"
+        self.page_source = "<html><body><p>A fake onion</p></body></html>"
+        self.urls = []
+
+    def set_page_load_timeout(self, timeout: float):
+        pass
+
+    def get(self, url: str):
+        self.urls.append(url)
+        time.sleep(self.load_time)
+
+    def execute_script(self, script: str):
+        return "complete"
+
+    def get_full_page_screenshot_as_png(self) -> bytes:
+        image = io.BytesIO()
+        Image.new("RGB", (32, 32), "purple").save(image, "PNG")
+        return image.getvalue()
+
+    get_screenshot_as_png = get_full_page_screenshot_as_png
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def program_directory(tmp_path, monkeypatch) -> str:
+    """
+    Points tor2tor's program directory (where captures, indexes and caches are kept) at a temporary directory.
+    """
+    from tor2tor import coreutils, daemon, tor2tor
+
+    directory = str(tmp_path / "tor2tor")
+    for module in [coreutils, daemon, tor2tor]:
+        monkeypatch.setattr(module, "PROGRAM_DIRECTORY", directory)
+    return directory
+
+
+@pytest.fixture
+def fake_firefox(monkeypatch):
+    """
+    Makes tor2tor's WebDriver pools out of FakeFirefox instances.
+    """
+    from tor2tor import tor2tor
+
+    monkeypatch.setattr(tor2tor.webdriver, "Firefox", FakeFirefox)
+    return FakeFirefox
+
+
+@pytest.fixture
+def tor2tor_session(program_directory, fake_firefox):
+    """
+    Opens a Tor2Tor session whose WebDriver pool is made of FakeFirefox instances: tor2tor_session(**options)
+    returns the Tor2Tor instance, which is closed after the test.
+    """
+    from tor2tor import tor2tor
+
+    opened = []
+
+    def open_session(pool_size: int = 2, **options):
+        instance = tor2tor.Tor2Tor(max_per_host=0, probe_timeout=0, **options)
+        opened.append(instance)
+        instance.open_session(pool_size=pool_size)
+        return instance
+
+    yield open_session
+
+    for instance in opened:
+        instance.close_session()
+        instance.close()
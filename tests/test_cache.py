@@ -0,0 +1,113 @@
+import pytest
+
+from tor2tor import cache
+from tor2tor.cache import ResponseCache
+
+
+class Clock:
+    """
+    A stand-in for time.time() that only moves when it is told to.
+    """
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def response_cache(tmp_path, clock):
+    opened = []
+
+    def open_cache(**options) -> ResponseCache:
+        response_cache = ResponseCache(database_path=str(tmp_path / "cache" / "pages.sqlite3"), **options)
+        opened.append(response_cache)
+        return response_cache
+
+    yield open_cache
+
+    for response_cache in opened:
+        response_cache.close()
+
+
+def test_pages_are_fresh_until_their_ttl_expires(response_cache, clock):
+    pages = response_cache(ttl=60)
+    assert pages.get("http://a.onion/") is None
+
+    pages.store("http://a.onion/", b"<html>a</html>", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    clock.advance(59)
+    entry = pages.get("http://a.onion/")
+    assert entry["fresh"] and entry["body"] == b"<html>a</html>"
+
+    clock.advance(1)
+    entry = pages.get("http://a.onion/")
+    assert not entry["fresh"]
+    assert ResponseCache.validators(entry) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+    # A 304 answer makes the page fresh again, without changing it
+    pages.revalidate("http://a.onion/")
+    entry = pages.get("http://a.onion/")
+    assert entry["fresh"] and entry["body"] == b"<html>a</html>"
+
+
+def test_least_recently_used_pages_are_evicted_at_the_size_cap(response_cache, clock):
+    pages = response_cache(max_size=300)
+    for name in "abc":
+        pages.store(f"http://{name}.onion/", b"x" * 100)
+        clock.advance(1)
+
+    # Reading a makes b the least recently used page
+    pages.get("http://a.onion/")
+    clock.advance(1)
+
+    pages.store("http://d.onion/", b"x" * 100)
+    assert pages.get("http://b.onion/") is None
+    assert all(pages.get(f"http://{name}.onion/") is not None for name in "acd")
+    clock.advance(1)
+
+    # A bigger page evicts as many of the least recently used pages as needed
+    pages.get("http://c.onion/")
+    clock.advance(1)
+    pages.store("http://e.onion/", b"x" * 150)
+    assert [name for name in "acde" if pages.get(f"http://{name}.onion/") is not None] == ["c", "e"]
+
+    # A page bigger than the whole cache isn't cached at all
+    pages.store("http://f.onion/", b"x" * 301)
+    assert pages.get("http://f.onion/") is None
+    assert pages.get("http://c.onion/") is not None
+
+
+def test_updated_page_is_served_with_its_new_body(response_cache, clock):
+    pages = response_cache(ttl=60)
+    pages.store("http://a.onion/", b"old", etag='"v1"')
+    pages.store_links("http://a.onion/", ["http://b.onion/"])
+    assert pages.links("http://a.onion/") == ["http://b.onion/"]
+
+    clock.advance(120)
+    pages.store("http://a.onion/", b"new", etag='"v2"')
+    entry = pages.get("http://a.onion/")
+    assert (entry["body"], entry["etag"], entry["fresh"]) == (b"new", '"v2"', True)
+    # The links of the old version are dropped with it
+    assert pages.links("http://a.onion/") is None
+
+    pages.discard("http://a.onion/")
+    assert pages.get("http://a.onion/") is None
+
+
+def test_cache_persists_across_instances(response_cache):
+    response_cache().store("http://a.onion/", b"page")
+    assert response_cache().get("http://a.onion/")["body"] == b"page"
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+
+from tor2tor.coreutils import (
+    canonical_onion,
+    canonical_url,
+    is_valid_onion,
+    is_valid_onion_address,
+    validate_onions,
+)
+
+PUBLIC_KEY = hashlib.sha3_256(b"test-onion").digest()
+
+
+def build_address(public_key: bytes = PUBLIC_KEY, version: bytes = b"\x03", checksum: bytes = None) -> str:
+    # A v3 address is base32(public key + checksum + version), with the checksum computed over the version
+    if checksum is None:
+        checksum = hashlib.sha3_256(b".onion checksum" + public_key + version).digest()[:2]
+    return base64.b32encode(public_key + checksum + version).decode().lower()
+
+
+ADDRESS = build_address()
+
+
+def test_valid_v3_address():
+    assert len(ADDRESS) == 56
+    assert is_valid_onion_address(address=ADDRESS)
+    assert is_valid_onion(url=f"http://{ADDRESS}.onion/")
+
+
+def test_corrupted_checksum_is_rejected():
+    valid_checksum = base64.b32decode(ADDRESS.upper())[32:34]
+    corrupted_checksum = bytes([valid_checksum[0] ^ 0x01, valid_checksum[1]])
+    assert not is_valid_onion_address(address=build_address(checksum=corrupted_checksum))
+
+    # A typo in the public key part breaks the checksum as well
+    typo = ("b" if ADDRESS[0] != "b" else "c") + ADDRESS[1:]
+    assert not is_valid_onion_address(address=typo)
+    assert canonical_onion(url=f"{typo}.onion") is None
+
+
+def test_wrong_version_byte_is_rejected():
+    # The checksum matches the version byte, so only the version itself is wrong
+    assert not is_valid_onion_address(address=build_address(version=b"\x02"))
+
+
+def test_undecodable_address_is_rejected():
+    assert not is_valid_onion_address(address="1" * 56)
+
+
+def test_v2_addresses_are_rejected():
+    assert canonical_onion(url="http://expyuzz4wqqyqhjn.onion/") is None
+    assert not is_valid_onion(url="expyuzz4wqqyqhjn.onion")
+
+
+def test_canonical_onion_drops_case_scheme_subdomains_port_and_path():
+    expected = f"{ADDRESS}.onion"
+    for url in [
+        f"{ADDRESS}.onion",
+        f"http://{ADDRESS.upper()}.ONION/",
+        f"https://www.{ADDRESS}.onion:8080/path?query#fragment",
+        f"  {ADDRESS}.onion./  ",
+    ]:
+        assert canonical_onion(url=url) == expected, url
+
+    assert canonical_onion(url=f"http://{ADDRESS}.onion.example.com/") is None
+    assert canonical_onion(url="http://example.com/") is None
+
+
+def test_canonical_url_normalises_scheme_case_and_trailing_slash():
+    expected = f"{ADDRESS}.onion/"
+    assert canonical_url(url=f"{ADDRESS}.onion") == expected
+    assert canonical_url(url=f"HTTPS://{ADDRESS.upper()}.onion/") == expected
+    assert canonical_url(url=f"http://{ADDRESS}.onion/#top") == expected
+
+    # The path and query are part of the page
+    assert canonical_url(url=f"http://{ADDRESS}.onion/page?id=1") == f"{ADDRESS}.onion/page?id=1"
+    assert canonical_url(url="http://Example.COM") == "example.com/"
+
+
+def test_validate_onions_keeps_the_first_url_of_each_onion():
+    other_address = build_address(public_key=hashlib.sha3_256(b"other-onion").digest())
+    urls = [
+        f"http://{ADDRESS}.onion/",
+        "not an onion",
+        f"{ADDRESS.upper()}.onion",
+        f"http://{other_address}.onion/page",
+        f"https://www.{ADDRESS}.onion/other-page",
+        "expyuzz4wqqyqhjn.onion",
+        f"http://{other_address}.onion/page",
+    ]
+    valid_urls, invalid_urls = validate_onions(urls=urls)
+    assert valid_urls == [f"http://{ADDRESS}.onion/", f"http://{other_address}.onion/page"]
+    assert invalid_urls == ["not an onion", "expyuzz4wqqyqhjn.onion"]
@@ -0,0 +1,58 @@
+from queue import Queue
+
+import pytest
+from fake_onion_network import FakeOnionNetwork
+
+from tor2tor.fetcher import LivenessProber
+
+
+@pytest.fixture
+def fake_network():
+    network = FakeOnionNetwork(
+        latency=0, latency_jitter=0, page_size=3000, failure_rate=0.5, links_per_page=20, pages=200
+    )
+    yield network
+    network.stop()
+
+
+@pytest.fixture
+def crawler(program_directory, fake_network):
+    from tor2tor.tor2tor import Tor2Tor
+
+    tor2tor = Tor2Tor(socks_ports=f"127.0.0.1:{fake_network.socks_port}")
+    yield tor2tor
+    tor2tor.close()
+
+
+def test_crawl_queues_up_to_the_limit(crawler, fake_network):
+    tasks_queue = Queue()
+    queued = crawler.crawl_onions(
+        seed_onion=fake_network.seed_onion, depth=2, limit=12, tasks_queue=tasks_queue
+    )
+    assert queued == 12
+    tasks = list(tasks_queue.queue)
+    assert [task.index for task in tasks] == list(range(1, 13))
+    assert len({task.onion for task in tasks}) == 12
+
+
+def test_onions_failing_their_liveness_probe_do_not_count_against_the_limit(crawler, fake_network):
+    tasks_queue = Queue()
+    dead = []
+    prober = LivenessProber(
+        tasks_queue=tasks_queue,
+        on_dead=lambda task, error, started_at: dead.append(task),
+        tor_shards=crawler.tor_shards,
+        timeout=5,
+    )
+    try:
+        queued = crawler.crawl_onions(
+            seed_onion=fake_network.seed_onion, depth=2, limit=12, tasks_queue=prober
+        )
+    finally:
+        prober.close()
+
+    # About half the onions of the network are unreachable: the crawl goes on until 12 live ones are queued
+    assert dead
+    assert queued == tasks_queue.qsize() == prober.alive == 12
+    assert all(fake_network.is_reachable(hostname=task.onion[7:-1]) for task in tasks_queue.queue)
+    assert not any(fake_network.is_reachable(hostname=task.onion[7:-1]) for task in dead)
@@ -0,0 +1,56 @@
+import pytest
+
+from fake_onion_network import onion_address
+from tor2tor.coreutils import construct_output_name
+from tor2tor.daemon import CaptureJob, JobManager
+
+ONIONS = [f"http://{onion_address(index)}/" for index in range(3)]
+
+
+@pytest.fixture
+def job_manager(tor2tor_session):
+    job_manager = JobManager(tor2tor=tor2tor_session(), worker_threads=2)
+    yield job_manager
+    job_manager.stop()
+
+
+def run_job(job_manager: JobManager, onion: str) -> CaptureJob:
+    job = job_manager.submit(job=CaptureJob(onion=onion))
+    list(job.iter_results(timeout=30))
+    return job
+
+
+def test_single_onion_job_is_recorded_in_the_capture_index(job_manager):
+    job = run_job(job_manager=job_manager, onion=ONIONS[0])
+    assert job.status == "done"
+    assert [result["status"] for result in job.results] == ["captured"]
+
+    entry = job_manager.tor2tor.capture_index.get(key=construct_output_name(url=job.onion))
+    assert entry is not None
+    assert entry["status"] == "captured"
+    assert entry["successes"] == 1
+    assert entry["mean_duration"] is not None
+
+
+def test_late_cancel_does_not_stop_the_next_job(job_manager):
+    first_job = run_job(job_manager=job_manager, onion=ONIONS[0])
+    assert first_job.status == "done"
+
+    # A cancel (or stop) that comes in just as a job finishes only concerns that job's run
+    job_manager.cancel(job=first_job)
+    job_manager.tor2tor.stop()
+
+    next_job = run_job(job_manager=job_manager, onion=ONIONS[1])
+    assert next_job.status == "done"
+    assert [result["status"] for result in next_job.results] == ["captured"]
+
+
+def test_cancel_before_the_job_runs(job_manager):
+    # The first job keeps the manager busy, so the second one is still queued when it is cancelled
+    first_job = job_manager.submit(job=CaptureJob(onion=ONIONS[0]))
+    second_job = job_manager.submit(job=CaptureJob(onion=ONIONS[1]))
+    job_manager.cancel(job=second_job)
+
+    list(first_job.iter_results(timeout=30))
+    assert first_job.status == "done"
+    assert second_job.status == "cancelled" and second_job.results == []
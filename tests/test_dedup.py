@@ -0,0 +1,92 @@
+import numpy as np
+
+from tor2tor.dedup import DuplicateIndex, hamming_distances
+
+BASE_HASH = 0x0123456789ABCDEF
+
+
+def flip_bits(phash: int, count: int, offset: int = 0) -> int:
+    # Flips `count` distinct bits of the hash, starting at bit `offset`
+    for bit in range(offset, offset + count):
+        phash ^= 1 << bit
+    return phash
+
+
+def test_hamming_distances_count_differing_bits():
+    hashes = np.array([BASE_HASH, flip_bits(BASE_HASH, 3), ~BASE_HASH & (2**64 - 1)], dtype=np.uint64)
+    assert list(hamming_distances(hashes=hashes, phash=BASE_HASH)) == [0, 3, 64]
+
+
+def test_near_duplicates_are_clustered_under_the_first_screenshot():
+    index = DuplicateIndex(threshold=6)
+    assert index.add(key="a", file_path="a.png", phash=BASE_HASH) is None
+    assert index.add(key="b", file_path="b.png", phash=flip_bits(BASE_HASH, 2)) == ("a", "a.png")
+    assert index.add(key="c", file_path="c.png", phash=flip_bits(BASE_HASH, 4, offset=8)) == ("a", "a.png")
+    assert index.add(key="d", file_path="d.png", phash=flip_bits(BASE_HASH, 32)) is None
+
+    assert index.clusters() == [("a", "a.png", ["b", "c"])]
+    assert index.clusters(keys={"d"}) == []
+
+
+def test_threshold_is_inclusive():
+    index = DuplicateIndex(threshold=3)
+    index.add(key="a", file_path="a.png", phash=BASE_HASH)
+    assert index.add(key="b", file_path="b.png", phash=flip_bits(BASE_HASH, 3)) == ("a", "a.png")
+    assert index.add(key="c", file_path="c.png", phash=flip_bits(BASE_HASH, 4, offset=20)) is None
+
+
+def test_index_grows_past_its_capacity():
+    index = DuplicateIndex(capacity=2)
+    for number in range(5):
+        index.add(key=str(number), file_path=f"{number}.png", phash=flip_bits(BASE_HASH, 10 * number))
+    assert len(index) == 5
+    assert index.add(key="again", file_path="again.png", phash=flip_bits(BASE_HASH, 40)) == ("4", "4.png")
+
+
+def test_re_adding_a_duplicate_replaces_its_entry():
+    index = DuplicateIndex(threshold=6)
+    index.add(key="a", file_path="a.png", phash=BASE_HASH)
+    index.add(key="b", file_path="b.png", phash=flip_bits(BASE_HASH, 2))
+
+    # The page changed completely: it leaves the cluster
+    assert index.add(key="b", file_path="b2.png", phash=flip_bits(BASE_HASH, 32)) is None
+    assert len(index) == 2
+    assert index.clusters() == []
+
+
+def test_re_adding_the_canonical_copy_promotes_the_next_member():
+    index = DuplicateIndex(threshold=6)
+    index.add(key="a", file_path="a.png", phash=BASE_HASH)
+    index.add(key="b", file_path="b.png", phash=flip_bits(BASE_HASH, 2))
+    index.add(key="c", file_path="c.png", phash=flip_bits(BASE_HASH, 3))
+
+    # Recaptured with the same content, the canonical copy rejoins its cluster after the others
+    assert index.add(key="a", file_path="a2.png", phash=BASE_HASH) == ("b", "b.png")
+    assert index.clusters() == [("b", "b.png", ["c", "a"])]
+
+    # Recaptured with different content, it leaves the cluster entirely
+    assert index.add(key="a", file_path="a3.png", phash=flip_bits(BASE_HASH, 32)) is None
+    assert index.clusters() == [("b", "b.png", ["c"])]
+    assert len(index) == 3
+
+
+def test_re_adding_the_only_member_of_a_cluster():
+    index = DuplicateIndex(threshold=6)
+    index.add(key="a", file_path="a.png", phash=BASE_HASH)
+    assert index.add(key="a", file_path="a2.png", phash=BASE_HASH) is None
+    assert index.add(key="b", file_path="b.png", phash=BASE_HASH) == ("a", "a2.png")
+    assert index.clusters() == [("a", "a2.png", ["b"])]
+
+
+def test_load_keeps_the_recorded_clusters():
+    index = DuplicateIndex(threshold=6)
+    index.load(
+        entries=[
+            ("b", "b.png", flip_bits(BASE_HASH, 2), "a"),
+            ("a", "a.png", BASE_HASH, None),
+            ("d", "d.png", flip_bits(BASE_HASH, 32), "gone"),
+            ("e", "e.png", flip_bits(BASE_HASH, 33), "gone"),
+        ]
+    )
+    assert sorted(index.clusters()) == [("a", "a.png", ["b"]), ("d", "d.png", ["e"])]
+    assert index.add(key="f", file_path="f.png", phash=flip_bits(BASE_HASH, 1)) == ("a", "a.png")
@@ -0,0 +1,192 @@
+import time
+import threading
+
+import pytest
+from fake_onion_network import onion_address
+
+from tor2tor.coreutils import construct_output_name
+from tor2tor.distributed import LeaseQueue
+from tor2tor.retries import CaptureTask
+
+SEED = f"http://{onion_address(0)}/"
+ONIONS = [f"http://{onion_address(index)}/" for index in range(1, 4)]
+
+
+@pytest.fixture
+def queue_file(tmp_path) -> str:
+    return str(tmp_path / "queue.sqlite3")
+
+
+def publish(lease_queue: LeaseQueue, onions: list):
+    for index, onion in enumerate(onions, start=1):
+        lease_queue.publish(
+            seed=SEED, key=construct_output_name(url=onion), onion_index=index, onion=onion
+        )
+
+
+def test_lease_and_ack(queue_file):
+    lease_queue = LeaseQueue(database_path=queue_file)
+    publish(lease_queue, ONIONS[:1])
+
+    [task] = lease_queue.claim(worker_id="worker-1")
+    assert (task.onion, task.index, task.attempts) == (ONIONS[0], 1, 1)
+    assert lease_queue.claim(worker_id="worker-2") == []
+    assert lease_queue.counts(seed=SEED) == {"leased": 1}
+
+    assert lease_queue.ack(task_id=task.id, result={"status": "captured"})
+    # A second acknowledgement (e.g. from a worker whose lease had expired) is ignored
+    assert not lease_queue.ack(task_id=task.id, result={"status": "skipped"})
+    assert lease_queue.counts(seed=SEED) == {"done": 1}
+
+    [(sequence, finished_task, result, _, _)] = lease_queue.results(seed=SEED)
+    assert (finished_task.id, result) == (task.id, {"status": "captured"})
+    assert list(lease_queue.results(seed=SEED, after=sequence)) == []
+    lease_queue.close()
+
+
+def test_an_onion_is_only_published_once_per_seed(queue_file):
+    lease_queue = LeaseQueue(database_path=queue_file)
+    publish(lease_queue, ONIONS)
+    assert not lease_queue.publish(
+        seed=SEED, key=construct_output_name(url=ONIONS[0]), onion_index=1, onion=ONIONS[0]
+    )
+    assert lease_queue.counts(seed=SEED) == {"pending": 3}
+    lease_queue.close()
+
+
+def test_expired_lease_is_handed_to_another_worker(queue_file):
+    lease_queue = LeaseQueue(database_path=queue_file, lease_seconds=0.1, max_attempts=2)
+    publish(lease_queue, ONIONS[:1])
+
+    [first_lease] = lease_queue.claim(worker_id="worker-1")
+    assert lease_queue.claim(worker_id="worker-2") == []
+    time.sleep(0.2)
+
+    # The first worker died: its onion goes to the next worker that claims
+    [second_lease] = lease_queue.claim(worker_id="worker-2")
+    assert (second_lease.id, second_lease.attempts) == (first_lease.id, 2)
+
+    # The second worker died too, and the onion has used up its attempts
+    time.sleep(0.2)
+    assert lease_queue.expire_leases() == 1
+    assert lease_queue.claim(worker_id="worker-3") == []
+    assert lease_queue.counts(seed=SEED) == {"failed": 1}
+    lease_queue.close()
+
+
+def test_renewed_and_released_leases(queue_file):
+    lease_queue = LeaseQueue(database_path=queue_file, lease_seconds=0.3)
+    publish(lease_queue, ONIONS[:2])
+
+    first_task, second_task = lease_queue.claim(worker_id="worker-1", limit=2)
+    time.sleep(0.2)
+    lease_queue.renew(task_ids=[first_task.id], worker_id="worker-1")
+    # Only the worker holding a lease can give it up
+    lease_queue.release(task_ids=[second_task.id], worker_id="worker-2")
+    time.sleep(0.2)
+
+    # The renewed lease still holds, while the other one expired
+    [task] = lease_queue.claim(worker_id="worker-2", limit=2)
+    assert task.id == second_task.id
+
+    lease_queue.release(task_ids=[task.id], worker_id="worker-2")
+    [task] = lease_queue.claim(worker_id="worker-3")
+    # A released lease doesn't count as an attempt
+    assert (task.id, task.attempts) == (second_task.id, 2)
+    lease_queue.close()
+
+
+def test_no_onion_is_leased_twice_across_connections(queue_file):
+    onions = [f"http://{onion_address(index)}/" for index in range(1, 61)]
+    lease_queues = [LeaseQueue(database_path=queue_file) for _ in range(4)]
+    publish(lease_queues[0], onions)
+
+    claimed = [[] for _ in lease_queues]
+
+    def claim_all(worker: int):
+        while True:
+            tasks = lease_queues[worker].claim(worker_id=f"worker-{worker}", limit=3)
+            if not tasks:
+                return
+            claimed[worker].extend(task.id for task in tasks)
+
+    threads = [threading.Thread(target=claim_all, args=(worker,)) for worker in range(len(lease_queues))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_claimed = [task_id for worker_claimed in claimed for task_id in worker_claimed]
+    assert len(all_claimed) == len(set(all_claimed)) == len(onions)
+    for lease_queue in lease_queues:
+        lease_queue.close()
+
+
+def test_worker_captures_the_queue_then_stops_when_idle(queue_file, program_directory, fake_firefox):
+    from tor2tor.tor2tor import Tor2Tor
+
+    lease_queue = LeaseQueue(database_path=queue_file)
+    publish(lease_queue, ONIONS)
+
+    tor2tor = Tor2Tor(max_per_host=0, probe_timeout=0)
+    started_at = time.monotonic()
+    results = list(
+        tor2tor.serve_queue(
+            lease_queue=lease_queue,
+            pool_size=2,
+            worker_threads=2,
+            worker_id="worker-1",
+            idle_timeout=0.3,
+            poll_interval=0.05,
+        )
+    )
+    tor2tor.close()
+
+    assert sorted(result["onion"] for result in results) == sorted(ONIONS)
+    assert {result["status"] for result in results} == {"captured"}
+    assert lease_queue.counts(seed=SEED) == {"done": 3}
+    assert time.monotonic() - started_at < 30
+    lease_queue.close()
+
+
+def test_worker_stops_when_the_queue_stays_empty(queue_file, program_directory, fake_firefox):
+    from tor2tor.tor2tor import Tor2Tor
+
+    lease_queue = LeaseQueue(database_path=queue_file)
+    tor2tor = Tor2Tor(max_per_host=0, probe_timeout=0)
+    started_at = time.monotonic()
+    assert list(
+        tor2tor.serve_queue(lease_queue=lease_queue, pool_size=1, idle_timeout=0.2, poll_interval=0.05)
+    ) == []
+    assert 0.2 <= time.monotonic() - started_at < 10
+    tor2tor.close()
+    lease_queue.close()
+
+
+def test_coordinator_gives_up_when_no_worker_claims(queue_file, program_directory, tmp_path):
+    from tor2tor.tor2tor import Tor2Tor
+
+    tor2tor = Tor2Tor()
+
+    def crawl_onions(seed_onion, depth, limit, tasks_queue, resume=False):
+        for index, onion in enumerate(ONIONS, start=1):
+            tasks_queue.put(CaptureTask(index=index, onion=onion))
+        return len(ONIONS)
+
+    tor2tor.crawl_onions = crawl_onions
+    started_at = time.monotonic()
+    tor2tor.execute_coordinator(
+        target_onions=[SEED],
+        queue_file=queue_file,
+        results_file=str(tmp_path / "results.jsonl"),
+        show_tables=False,
+        manage_tor_service=False,
+        poll_interval=0.05,
+        idle_timeout=0.3,
+    )
+    assert time.monotonic() - started_at < 10
+
+    # The onions are left in the queue, for a later coordinator (or workers) to pick up
+    lease_queue = LeaseQueue(database_path=queue_file)
+    assert lease_queue.counts(seed=SEED) == {"pending": 3}
+    lease_queue.close()
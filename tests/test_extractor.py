@@ -0,0 +1,55 @@
+import pytest
+from fake_onion_network import onion_address
+
+from tor2tor.extractor import CHUNK_OVERLAP, iter_onion_links
+
+ONIONS = [f"http://{onion_address(index)}/" for index in range(4)]
+
+
+def split(document: bytes, size: int) -> list:
+    return [document[start : start + size] for start in range(0, len(document), size)]
+
+
+def anchor(url: str) -> bytes:
+    return f'<a class="link" href="{url}">link</a>'.encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1000])
+def test_onion_spanning_a_chunk_boundary(chunk_size):
+    document = b"<html><body>" + anchor(ONIONS[0]) + b"</body></html>"
+    assert list(iter_onion_links(split(document, chunk_size))) == [ONIONS[0]]
+
+    # The boundary falls inside the onion address itself, after the overlap was trimmed
+    padding = b"x" * (CHUNK_OVERLAP * 2)
+    document = padding + anchor(ONIONS[1]) + padding
+    boundary = len(padding) + len(anchor(ONIONS[1])) // 2
+    assert list(iter_onion_links([document[:boundary], document[boundary:]])) == [ONIONS[1]]
+
+
+@pytest.mark.parametrize("chunk_size", [CHUNK_OVERLAP - 1, CHUNK_OVERLAP, CHUNK_OVERLAP + 1])
+def test_onion_ending_exactly_at_the_end_of_the_buffer(chunk_size):
+    # The url's last character is the last byte of a chunk, so it could still continue in the next one
+    url = ONIONS[2].rstrip("/")
+    link = f'<a href="{url}'.encode()
+    document = b"y" * (chunk_size - len(link)) + link
+    assert len(document) == chunk_size
+
+    assert list(iter_onion_links([document])) == [url]
+    assert list(iter_onion_links([document, b"/page\">page</a>"])) == [f"{url}/page"]
+    assert list(iter_onion_links([document, b'">page</a>' + anchor(ONIONS[3])])) == [url, ONIONS[3]]
+
+
+@pytest.mark.parametrize("chunk_size", [100, CHUNK_OVERLAP // 2, CHUNK_OVERLAP, CHUNK_OVERLAP + 100])
+def test_links_in_the_overlap_are_yielded_once(chunk_size):
+    # The same onions are linked several times, close to each other, so some of their links are
+    # in the overlap kept between chunks: each link is yielded once, repeated links included
+    links = [ONIONS[index % 3] for index in range(60)]
+    document = b"z" * (CHUNK_OVERLAP - 200) + b" ".join(anchor(url) for url in links) + b"z" * 300
+    assert list(iter_onion_links(split(document, chunk_size))) == links
+
+
+def test_invalid_onions_are_skipped_and_the_size_cap_is_honoured():
+    invalid = "http://" + "a" * 56 + ".onion/"
+    document = anchor(ONIONS[0]) + anchor(invalid) + b"w" * 10000 + anchor(ONIONS[1])
+    assert list(iter_onion_links(split(document, 512))) == [ONIONS[0], ONIONS[1]]
+    assert list(iter_onion_links(split(document, 512), max_bytes=5000)) == [ONIONS[0]]
@@ -0,0 +1,259 @@
+import re
+import threading
+import socketserver
+from queue import Queue
+
+import pytest
+
+from tor2tor.retries import CaptureTask, RetryScheduler, TorController, classify_error
+
+
+class FakeControlPort:
+    """
+    A local stand-in for a Tor control port, which speaks enough of the control protocol for TorController
+    (PROTOCOLINFO, AUTHENTICATE, SIGNAL NEWNYM and QUIT) and records the commands it receives.
+    """
+
+    def __init__(self, password: str = None, cookie_file=None):
+        """
+        :param password: If set, the control port requires this password.
+        :param cookie_file: If set (and there is no password), the control port requires this cookie.
+        """
+        self.password = password
+        self.cookie_file = cookie_file
+        self.commands = []
+
+        control_port = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                control_port.handle(reader=self.rfile, writer=self.wfile)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+
+    @property
+    def newnyms(self) -> int:
+        return self.commands.count("SIGNAL NEWNYM")
+
+    def authenticated(self, command: str) -> bool:
+        argument = command[len("AUTHENTICATE") :].strip()
+        if self.password is not None:
+            quoted = re.fullmatch(r'"((?:[^"\\]|\\.)*)"', argument)
+            return quoted is not None and re.sub(r"\\(.)", r"\1", quoted.group(1)) == self.password
+        if self.cookie_file is not None:
+            return argument == self.cookie_file.read_bytes().hex()
+        return argument == ""
+
+    def handle(self, reader, writer):
+        authenticated = False
+        for line in reader:
+            command = line.decode().rstrip("\r\n")
+            self.commands.append(command)
+
+            if command.startswith("PROTOCOLINFO"):
+                if self.password is not None:
+                    methods = "METHODS=HASHEDPASSWORD"
+                elif self.cookie_file is not None:
+                    methods = f'METHODS=COOKIE,SAFECOOKIE COOKIEFILE="{self.cookie_file}"'
+                else:
+                    methods = "METHODS=NULL"
+                reply = f'250-PROTOCOLINFO 1\r\n250-AUTH {methods}\r\n250-VERSION Tor="0.4.8.9"\r\n250 OK\r\n'
+            elif command.startswith("AUTHENTICATE"):
+                authenticated = self.authenticated(command=command)
+                reply = "250 OK\r\n" if authenticated else "515 Authentication failed\r\n"
+            elif command == "SIGNAL NEWNYM" and authenticated:
+                reply = "250 OK\r\n"
+            elif command == "QUIT":
+                writer.write(b"250 closing connection\r\n")
+                return
+            else:
+                reply = "514 Authentication required.\r\n"
+
+            writer.write(reply.encode())
+            writer.flush()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def control_ports():
+    """
+    Starts fake Tor control ports: control_ports(password=...) returns a new one.
+    """
+    started = []
+
+    def start(**kwargs) -> FakeControlPort:
+        control_port = FakeControlPort(**kwargs)
+        started.append(control_port)
+        return control_port
+
+    yield start
+
+    for control_port in started:
+        control_port.close()
+
+
+def test_cookie_authentication_uses_the_cookie_file_from_protocolinfo(control_ports, tmp_path):
+    cookie_file = tmp_path / "control_auth_cookie"
+    cookie_file.write_bytes(bytes(range(32)))
+    control_port = control_ports(cookie_file=cookie_file)
+
+    assert TorController(host="127.0.0.1", port=control_port.port).new_circuit()
+    # (QUIT is sent without waiting for its reply, so it isn't necessarily recorded yet)
+    assert control_port.commands[:3] == [
+        "PROTOCOLINFO 1",
+        f"AUTHENTICATE {bytes(range(32)).hex()}",
+        "SIGNAL NEWNYM",
+    ]
+
+
+def test_password_authentication_escapes_the_password(control_ports):
+    control_port = control_ports(password='se"cr\\et')
+    controller = TorController(host="127.0.0.1", port=control_port.port, password='se"cr\\et')
+
+    assert controller.new_circuit()
+    assert control_port.commands[:2] == ['AUTHENTICATE "se\\"cr\\\\et"', "SIGNAL NEWNYM"]
+
+
+def test_null_authentication(control_ports):
+    control_port = control_ports()
+    assert TorController(host="127.0.0.1", port=control_port.port).new_circuit()
+    assert control_port.commands[:3] == ["PROTOCOLINFO 1", "AUTHENTICATE", "SIGNAL NEWNYM"]
+
+
+def test_refused_authentication_raises(control_ports):
+    control_port = control_ports(password="secret")
+    controller = TorController(host="127.0.0.1", port=control_port.port, password="wrong")
+    with pytest.raises(ConnectionError, match="515 Authentication failed"):
+        controller.new_circuit()
+    assert control_port.newnyms == 0
+
+
+def test_newnym_is_rate_limited(control_ports):
+    control_port = control_ports()
+    controller = TorController(host="127.0.0.1", port=control_port.port)
+    assert controller.new_circuit()
+    assert not controller.new_circuit()
+    assert control_port.newnyms == 1
+
+
+def test_unreachable_control_port_raises():
+    control_port = FakeControlPort()
+    control_port.close()
+    with pytest.raises(OSError):
+        TorController(host="127.0.0.1", port=control_port.port, timeout=1).new_circuit()
+
+
+def test_errors_are_classified():
+    assert classify_error(TimeoutError("timed out")) == "transient"
+    assert classify_error(OSError("Connection refused")) == "transient"
+    assert classify_error(OSError("about:neterror?e=malformedURI")) == "permanent"
+    assert classify_error(ValueError("bad page")) == "permanent"
+
+
+def test_backoff_doubles_up_to_the_maximum_with_jitter():
+    retry_scheduler = RetryScheduler(tasks_queue=Queue(), base_delay=5, max_delay=30)
+    for attempt, backoff in [(1, 5), (2, 10), (3, 20), (4, 30), (10, 30)]:
+        delays = [retry_scheduler.delay(attempt=attempt) for _ in range(200)]
+        assert all(backoff / 2 <= delay <= backoff for delay in delays)
+        assert max(delays) - min(delays) > 0
+
+
+def test_retry_is_enqueued_before_the_failed_task_is_marked_done():
+    tasks_queue = Queue()
+    retry_scheduler = RetryScheduler(tasks_queue=tasks_queue, max_retries=2, base_delay=0.05)
+    task = CaptureTask(index=1, onion="http://example.onion")
+    tasks_queue.put(task)
+    tasks_queue.get()
+
+    delay = retry_scheduler.schedule(task=task, error=TimeoutError("timed out"))
+    assert delay is not None and retry_scheduler.retries == 1
+
+    # The failed task stays unfinished while its retry is pending, so join() doesn't return early
+    assert tasks_queue.unfinished_tasks == 1
+    assert tasks_queue.empty()
+
+    retry_task = tasks_queue.get(timeout=5)
+    assert retry_task == task._replace(attempt=2)
+
+    # Once the retry is done too, nothing is left unfinished
+    tasks_queue.task_done()
+    tasks_queue.join()
+    assert tasks_queue.unfinished_tasks == 0
+
+
+def test_permanent_errors_and_exhausted_tasks_are_not_retried():
+    tasks_queue = Queue()
+    retry_scheduler = RetryScheduler(tasks_queue=tasks_queue, max_retries=2, base_delay=0.01)
+    task = CaptureTask(index=1, onion="http://example.onion")
+
+    assert retry_scheduler.schedule(task=task, error=ValueError("bad page")) is None
+    assert retry_scheduler.schedule(task=task._replace(attempt=3), error=TimeoutError()) is None
+    assert retry_scheduler.retries == 0
+    assert tasks_queue.unfinished_tasks == 0
+
+
+def test_cancelled_retries_are_marked_done_and_never_enqueued():
+    tasks_queue = Queue()
+    retry_scheduler = RetryScheduler(tasks_queue=tasks_queue, base_delay=60)
+    for index in range(3):
+        task = CaptureTask(index=index, onion=f"http://example{index}.onion")
+        tasks_queue.put(task)
+        tasks_queue.get()
+        retry_scheduler.schedule(task=task, error=TimeoutError())
+    assert tasks_queue.unfinished_tasks == 3
+
+    retry_scheduler.cancel()
+    assert tasks_queue.unfinished_tasks == 0
+    tasks_queue.join()
+    assert tasks_queue.empty()
+
+
+def test_circuits_are_renewed_on_the_failing_tor_client(control_ports):
+    first, second = control_ports(), control_ports()
+    first_endpoint, second_endpoint = ("127.0.0.1", 9060), ("127.0.0.1", 9061)
+    retry_scheduler = RetryScheduler(
+        tasks_queue=Queue(),
+        max_retries=0,
+        controllers={
+            first_endpoint: TorController(host="127.0.0.1", port=first.port),
+            second_endpoint: TorController(host="127.0.0.1", port=second.port),
+        },
+        newnym_after=2,
+    )
+    task = CaptureTask(index=1, onion="http://example.onion")
+
+    # A success resets the count of its own Tor client only
+    retry_scheduler.schedule(task=task, error=TimeoutError(), endpoint=first_endpoint)
+    retry_scheduler.record_success(endpoint=second_endpoint)
+    retry_scheduler.schedule(task=task, error=TimeoutError(), endpoint=second_endpoint)
+    retry_scheduler.schedule(task=task, error=TimeoutError(), endpoint=first_endpoint)
+
+    assert (first.newnyms, second.newnyms) == (1, 0)
+    assert retry_scheduler.circuit_renewals == 1
+
+    retry_scheduler.record_success(endpoint=second_endpoint)
+    retry_scheduler.schedule(task=task, error=TimeoutError(), endpoint=second_endpoint)
+    assert second.newnyms == 0
+
+
+def test_shared_controller_is_used_for_unknown_endpoints(control_ports):
+    control_port = control_ports()
+    controller = TorController(host="127.0.0.1", port=control_port.port)
+    retry_scheduler = RetryScheduler(
+        tasks_queue=Queue(),
+        max_retries=0,
+        controllers=dict.fromkeys([("127.0.0.1", 9050), ("127.0.0.1", 9052)], controller),
+        newnym_after=1,
+    )
+    retry_scheduler.schedule(
+        task=CaptureTask(index=1, onion="http://example.onion"), error=TimeoutError()
+    )
+    assert control_port.newnyms == 1
@@ -0,0 +1,134 @@
+import queue
+import threading
+
+import pytest
+from fake_onion_network import onion_address
+
+from tor2tor.coreutils import construct_output_name
+from tor2tor.retries import CaptureTask
+from tor2tor.scheduler import CaptureScheduler, expected_cost
+
+ONIONS = [f"http://{onion_address(index)}/" for index in range(4)]
+
+
+def task(index: int, onion: str) -> CaptureTask:
+    return CaptureTask(index=index, onion=onion)
+
+
+def test_expected_cost_prefers_fast_and_alive_onions():
+    unknown = expected_cost(history=None, default_duration=30)
+    assert unknown == 60
+    assert expected_cost(history={"successes": 9, "failures": 0, "mean_duration": 10}, default_duration=30) < unknown
+    assert expected_cost(history={"successes": 0, "failures": 5, "mean_duration": 10}, default_duration=30) > unknown
+
+
+def test_onions_without_history_are_handed_out_in_order():
+    scheduler = CaptureScheduler(max_per_host=0)
+    for index, onion in enumerate(ONIONS):
+        scheduler.put(task(index, onion))
+    assert [scheduler.get(timeout=1).onion for _ in ONIONS] == ONIONS
+
+
+def test_onions_are_ordered_by_their_history():
+    histories = {
+        construct_output_name(url=ONIONS[0]): {"successes": 0, "failures": 4, "mean_duration": 30},
+        construct_output_name(url=ONIONS[1]): {"successes": 5, "failures": 0, "mean_duration": 5},
+        construct_output_name(url=ONIONS[2]): {"successes": 5, "failures": 0, "mean_duration": 60},
+    }
+    scheduler = CaptureScheduler(history=histories.get, max_per_host=0)
+    for index, onion in enumerate(ONIONS):
+        scheduler.put(task(index, onion))
+
+    # ONIONS[3] has no history, so it costs the default duration at a success rate of 1/2
+    assert [scheduler.get(timeout=1).onion for _ in ONIONS] == [ONIONS[1], ONIONS[3], ONIONS[2], ONIONS[0]]
+
+
+def test_per_host_cap_holds_back_onions_until_released():
+    host = onion_address(0)
+    scheduler = CaptureScheduler(max_per_host=1)
+    scheduler.put(task(1, f"http://{host}/a"))
+    # A subdomain is the same host
+    scheduler.put(task(2, f"http://www.{host}/b"))
+    scheduler.put(task(3, ONIONS[1]))
+
+    first = scheduler.get(timeout=1)
+    assert first.index == 1
+    # The second onion of the host is held back, so the other host's onion comes first
+    assert scheduler.get(timeout=1).index == 3
+    assert scheduler.queued() == 1
+    with pytest.raises(queue.Empty):
+        scheduler.get(timeout=0.1)
+
+    scheduler.release(task=first)
+    assert scheduler.get(timeout=1).index == 2
+    assert scheduler.queued() == 0
+
+
+def test_release_wakes_up_a_waiting_worker():
+    host = onion_address(0)
+    scheduler = CaptureScheduler(max_per_host=1)
+    scheduler.put(task(1, f"http://{host}/a"))
+    scheduler.put(task(2, f"http://{host}/b"))
+    first = scheduler.get(timeout=1)
+
+    handed_out = []
+    waiter = threading.Thread(target=lambda: handed_out.append(scheduler.get(timeout=5)))
+    waiter.start()
+    scheduler.release(task=first)
+    waiter.join()
+    assert [handed_task.index for handed_task in handed_out] == [2]
+
+
+def test_stop_signals_are_handed_out_after_the_queued_onions():
+    scheduler = CaptureScheduler(max_per_host=0)
+    scheduler.put(task(1, ONIONS[0]))
+    scheduler.put(None)
+    scheduler.put(task(2, ONIONS[1]))
+    scheduler.put(None)
+    assert [scheduler.get(timeout=1) for _ in range(4)] == [task(1, ONIONS[0]), task(2, ONIONS[1]), None, None]
+
+
+def test_stop_signals_wait_for_held_back_onions():
+    host = onion_address(0)
+    scheduler = CaptureScheduler(max_per_host=1)
+    scheduler.put(task(1, f"http://{host}/a"))
+    scheduler.put(task(2, f"http://{host}/b"))
+    scheduler.put(None)
+
+    first = scheduler.get(timeout=1)
+    with pytest.raises(queue.Empty):
+        scheduler.get(timeout=0.1)
+    scheduler.release(task=first)
+    assert scheduler.get(timeout=1).index == 2
+    assert scheduler.get(timeout=1) is None
+
+
+def test_workers_stop_once_every_onion_is_handled():
+    scheduler = CaptureScheduler(max_per_host=1)
+    onions = [f"http://{onion_address(index % 3)}/{index}" for index in range(12)]
+    for index, onion in enumerate(onions):
+        scheduler.put(task(index, onion))
+
+    handled = []
+
+    def worker():
+        while True:
+            handed_task = scheduler.get(timeout=5)
+            if handed_task is None:
+                scheduler.task_done()
+                return
+            handled.append(handed_task.index)
+            scheduler.release(task=handed_task)
+            scheduler.task_done()
+
+    workers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in workers:
+        thread.start()
+    scheduler.join()
+    for _ in workers:
+        scheduler.put(None)
+    for thread in workers:
+        thread.join(timeout=5)
+
+    assert not any(thread.is_alive() for thread in workers)
+    assert sorted(handled) == list(range(12))
@@ -0,0 +1,154 @@
+import os
+import stat
+from collections import Counter
+
+import pytest
+
+from tor2tor.fetcher import OnionFetcher
+from tor2tor.shards import (
+    TorShards,
+    launch_tor_instances,
+    parse_socks_ports,
+    stop_tor_instances,
+)
+
+ONIONS = [f"http://page{index}.onion/" for index in range(8)]
+
+
+def endpoints_of(stubs: list) -> list:
+    return [("127.0.0.1", stub.socks_port) for stub in stubs]
+
+
+def test_round_robin_cycles_through_endpoints():
+    shards = TorShards(endpoints=[("127.0.0.1", 9050), ("127.0.0.1", 9052)])
+    assigned = [shards.acquire() for _ in range(4)]
+    assert [port for _, port in assigned] == [9050, 9052, 9050, 9052]
+
+
+def test_least_loaded_picks_the_endpoint_with_fewest_users():
+    shards = TorShards(
+        endpoints=[("127.0.0.1", 9050), ("127.0.0.1", 9052)], strategy="least-loaded"
+    )
+    first = shards.acquire()
+    second = shards.acquire()
+    assert {first, second} == {("127.0.0.1", 9050), ("127.0.0.1", 9052)}
+
+    # Once the first endpoint is released, it is the least loaded one again
+    shards.release(endpoint=first)
+    assert shards.acquire() == first
+    assert shards.loads() == {("127.0.0.1", 9050): 1, ("127.0.0.1", 9052): 1}
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        TorShards(endpoints=[("127.0.0.1", 9050)], strategy="random")
+
+
+def test_parse_socks_ports():
+    assert parse_socks_ports(ports="9050, 10.0.0.2:9052,", host="127.0.0.1") == [
+        ("127.0.0.1", 9050),
+        ("10.0.0.2", 9052),
+    ]
+
+
+def test_round_robin_fetches_alternate_between_socks_ports(socks_stubs):
+    stubs = socks_stubs(2)
+    fetcher = OnionFetcher(tor_shards=TorShards(endpoints=endpoints_of(stubs)))
+    try:
+        for onion in ONIONS:
+            assert fetcher.fetch(url=onion) == stubs[0].render_page(hostname=onion[7:-1])
+    finally:
+        fetcher.close()
+
+    assert stubs[0].hosts == [onion[7:-1] for onion in ONIONS[0::2]]
+    assert stubs[1].hosts == [onion[7:-1] for onion in ONIONS[1::2]]
+
+
+def test_least_loaded_sequential_fetches_reuse_the_idle_socks_port(socks_stubs):
+    stubs = socks_stubs(2)
+    fetcher = OnionFetcher(
+        tor_shards=TorShards(endpoints=endpoints_of(stubs), strategy="least-loaded")
+    )
+    try:
+        for onion in ONIONS:
+            fetcher.fetch(url=onion)
+    finally:
+        fetcher.close()
+
+    # Each fetch releases its endpoint before the next one, so the first endpoint is always the least loaded
+    assert len(stubs[0].hosts) == len(ONIONS)
+    assert stubs[1].hosts == []
+
+
+@pytest.mark.parametrize("strategy", TorShards.strategies)
+def test_concurrent_fetches_are_spread_across_socks_ports(socks_stubs, strategy):
+    stubs = socks_stubs(3)
+    shards = TorShards(endpoints=endpoints_of(stubs), strategy=strategy)
+    fetcher = OnionFetcher(tor_shards=shards, concurrency=len(ONIONS))
+    try:
+        results = fetcher.fetch_many(urls=ONIONS)
+    finally:
+        fetcher.close()
+
+    assert [url for url, _ in results] == ONIONS
+    assert all(isinstance(body, bytes) for _, body in results)
+
+    # Every onion went through exactly one port, and no port got more than its share (rounded up)
+    hosts = Counter(host for stub in stubs for host in stub.hosts)
+    assert sorted(hosts) == sorted(onion[7:-1] for onion in ONIONS)
+    assert set(hosts.values()) == {1}
+    assert max(len(stub.hosts) for stub in stubs) <= -(-len(ONIONS) // len(stubs))
+    assert shards.loads() == dict.fromkeys(shards.endpoints, 0)
+
+
+@pytest.fixture
+def fake_tor(tmp_path, monkeypatch):
+    """
+    Puts a fake tor binary in PATH, whose behaviour is given by a shell script snippet
+    (with the SOCKS port in $2 and the data directory in $4).
+    """
+
+    def install(script: str):
+        binary = tmp_path / "bin" / "tor"
+        binary.parent.mkdir(exist_ok=True)
+        binary.write_text(f"#!/bin/sh\n{script}\n")
+        binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{binary.parent}{os.pathsep}{os.environ['PATH']}")
+
+    return install
+
+
+def test_launched_instances_get_their_own_socks_and_control_ports(fake_tor, tmp_path):
+    fake_tor('echo "$@" > "$4/args"\necho "Bootstrapped 100% (done): Done"\nexec sleep 30')
+    instances = launch_tor_instances(
+        count=2, base_port=9160, data_directory=str(tmp_path / "data"), bootstrap_timeout=10
+    )
+    try:
+        assert [(instance.port, instance.control_port) for instance in instances] == [
+            (9160, 9162),
+            (9161, 9163),
+        ]
+        arguments = (tmp_path / "data" / "tor-9161" / "args").read_text().split()
+        assert arguments[arguments.index("--ControlPort") + 1] == "9163"
+        assert arguments[arguments.index("--CookieAuthentication") + 1] == "1"
+    finally:
+        stop_tor_instances(instances=instances)
+
+
+def test_exited_instance_is_reported_with_its_log(fake_tor, tmp_path):
+    fake_tor(
+        'if [ "$2" = 9161 ]; then echo "Could not bind to 127.0.0.1:9161"; exit 1; fi\n'
+        'echo "Bootstrapped 100% (done): Done"\nexec sleep 30'
+    )
+    with pytest.raises(RuntimeError, match=r"port 9161 exited[\s\S]*Could not bind"):
+        launch_tor_instances(
+            count=2, base_port=9160, data_directory=str(tmp_path / "data"), bootstrap_timeout=10
+        )
+
+
+def test_instance_that_does_not_bootstrap_is_reported(fake_tor, tmp_path):
+    fake_tor('echo "Bootstrapped 5%"\nexec sleep 30')
+    with pytest.raises(RuntimeError, match=r"port 9160 didn't bootstrap in 1 seconds"):
+        launch_tor_instances(
+            count=1, base_port=9160, data_directory=str(tmp_path / "data"), bootstrap_timeout=1
+        )
@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+
+from tor2tor.sinks import RESULT_FIELDS, ResultSink, iter_results, open_sink
+
+
+def make_result(index: int) -> dict:
+    return {
+        "index": index,
+        "onion": f"http://page{index}.onion/",
+        "status": "captured",
+        "already_captured": False,
+        "attempts": 1,
+        "processing_time": 0.5,
+    }
+
+
+def test_result_sink_requires_write_batch(tmp_path):
+    with pytest.raises(TypeError):
+        ResultSink(file_path=str(tmp_path / "results.jsonl"))
+
+
+@pytest.mark.parametrize("extension", ["jsonl", "csv"])
+def test_appended_runs_are_read_back_from_their_offset(tmp_path, extension):
+    results_file = str(tmp_path / f"results.{extension}")
+    with open_sink(file_path=results_file) as results_sink:
+        results_sink.write(result=make_result(index=1))
+
+    with open_sink(file_path=results_file) as results_sink:
+        results_sink.write(result=make_result(index=2))
+
+    assert [result["index"] for result in iter_results(file_path=results_file)] == [1, 2]
+    assert [
+        result["index"]
+        for result in iter_results(file_path=results_file, offset=results_sink.start_offset)
+    ] == [2]
+
+
+def test_csv_with_other_fields_is_moved_aside(tmp_path):
+    results_file = tmp_path / "results.csv"
+    old_fields = RESULT_FIELDS[:4]
+    with open(results_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(old_fields)
+        writer.writerow(["1", "http://old.onion/", "http://seed.onion/", "captured"])
+
+    with open_sink(file_path=str(results_file)) as results_sink:
+        results_sink.write(result=make_result(index=2))
+
+    # The new file only has the new results, under the current header
+    with open(results_file, newline="") as file:
+        assert next(csv.reader(file)) == RESULT_FIELDS
+    assert [result["index"] for result in iter_results(file_path=str(results_file))] == [2]
+
+    # The old results are kept, with their own header
+    [rotated_file] = [path for path in tmp_path.iterdir() if path != results_file]
+    assert rotated_file.name.startswith("results-") and rotated_file.suffix == ".csv"
+    with open(rotated_file, newline="") as file:
+        assert next(csv.reader(file)) == old_fields
+
+
+def test_csv_with_the_current_fields_is_appended_to(tmp_path):
+    results_file = tmp_path / "results.csv"
+    for index in [1, 2]:
+        with open_sink(file_path=str(results_file)) as results_sink:
+            results_sink.write(result=make_result(index=index))
+
+    assert list(tmp_path.iterdir()) == [results_file]
+    with open(results_file, newline="") as file:
+        assert sum(1 for row in csv.reader(file) if row == RESULT_FIELDS) == 1
@@ -0,0 +1,83 @@
+import json
+import tarfile
+
+import pytest
+
+from tor2tor import storage
+from tor2tor.storage import ScreenshotStore
+
+
+def make_screenshot(directory, name: str, content: bytes) -> str:
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def archived_names(archive_path) -> list:
+    with tarfile.open(archive_path) as archive:
+        return archive.getnames()
+
+
+def test_identical_screenshots_are_archived_once_with_a_manifest(tmp_path):
+    archive_path = tmp_path / "archive.tar"
+    store = ScreenshotStore(root=str(tmp_path / "blobs"), archive_path=str(archive_path))
+    first_path, first_hash = store.put(make_screenshot(tmp_path, "a.png", b"same"), key="a.onion")
+    _, second_hash = store.put(make_screenshot(tmp_path, "b.png", b"same"), key="b.onion")
+    store.close()
+
+    assert first_hash == second_hash
+    names = archived_names(archive_path)
+    assert names.count(f"blobs/{first_hash}.png") == 1
+
+    [manifest_name] = [name for name in names if name.startswith("manifests/")]
+    with tarfile.open(archive_path) as archive:
+        manifest = [json.loads(line) for line in archive.extractfile(manifest_name)]
+    assert [entry["key"] for entry in manifest] == ["a.onion", "b.onion"]
+
+
+def test_archive_is_readable_and_appendable_after_an_interrupted_write(tmp_path, monkeypatch):
+    archive_path = tmp_path / "archive.tar"
+    store = ScreenshotStore(root=str(tmp_path / "blobs"), archive_path=str(archive_path))
+    _, first_hash = store.put(make_screenshot(tmp_path, "a.png", b"a" * 3000))
+    _, second_hash = store.put(make_screenshot(tmp_path, "b.png", b"b" * 3000))
+
+    # The run is killed halfway through writing a third member's data: the store is never closed
+    def killed_copy(source, destination, length=0):
+        destination.write(source.read(1000))
+        destination.flush()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(storage.shutil, "copyfileobj", killed_copy)
+    with pytest.raises(KeyboardInterrupt):
+        store.put(make_screenshot(tmp_path, "partial.png", b"p" * 3000))
+    monkeypatch.undo()
+
+    # The archive still opens, with the members that were finished
+    with tarfile.open(archive_path) as archive:
+        assert archive.getnames() == [f"blobs/{first_hash}.png", f"blobs/{second_hash}.png"]
+        assert archive.extractfile(f"blobs/{first_hash}.png").read() == b"a" * 3000
+        assert archive.extractfile(f"blobs/{second_hash}.png").read() == b"b" * 3000
+
+    # The next run drops the partial member and appends after the finished ones
+    next_store = ScreenshotStore(root=str(tmp_path / "blobs"), archive_path=str(archive_path))
+    _, third_hash = next_store.put(make_screenshot(tmp_path, "c.png", b"c" * 3000))
+    next_store.put(make_screenshot(tmp_path, "a2.png", b"a" * 3000))
+    next_store.close()
+
+    assert archived_names(archive_path) == [
+        f"blobs/{first_hash}.png",
+        f"blobs/{second_hash}.png",
+        f"blobs/{third_hash}.png",
+    ]
+    with tarfile.open(archive_path) as archive:
+        assert archive.extractfile(f"blobs/{third_hash}.png").read() == b"c" * 3000
+
+
+def test_archive_killed_in_the_first_member_starts_over(tmp_path):
+    archive_path = tmp_path / "archive.tar"
+    archive_path.write_bytes(b"\0" * 100)
+
+    store = ScreenshotStore(root=str(tmp_path / "blobs"), archive_path=str(archive_path))
+    _, sha256 = store.put(make_screenshot(tmp_path, "a.png", b"a"))
+    store.close()
+    assert archived_names(archive_path) == [f"blobs/{sha256}.png"]
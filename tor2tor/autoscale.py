@@ -0,0 +1,197 @@
+import os
+import time
+from threading import Event, Thread
+from typing import Callable, Optional
+
+from .coreutils import log
+from .metrics import Metrics
+
+# Memory (in bytes) a headless Firefox instance is expected to use, when deciding whether another one fits
+INSTANCE_MEMORY = 400 * 1024 * 1024
+
+# Memory (in bytes) that is kept available for the rest of the system
+MEMORY_RESERVE = 512 * 1024 * 1024
+
+
+def cpu_load() -> Optional[float]:
+    """
+    :return: The 1-minute load average per CPU, or None if it isn't available on this platform.
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def available_memory() -> Optional[int]:
+    """
+    :return: The memory available to new processes in bytes (MemAvailable), or None if it isn't known (non-Linux).
+    """
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class Autoscaler:
+    """
+    Grows or shrinks the WebDriver pool while a run is going, within configured bounds.
+
+    Every interval, it samples the run's throughput (results per second), the average time workers waited
+    to borrow a WebDriver instance, the pool's utilisation, the host's CPU load and its available memory, and:
+
+    - shrinks the pool if memory is short or the CPU is overloaded;
+    - grows the pool if workers are waiting for instances (or all instances are busy), there are onions left
+      to capture, and the host has room for another instance. If a growth step didn't improve the throughput,
+      the pool is shrunk back and not grown past that size again for a while (e.g. when Tor, not the browsers,
+      is the bottleneck);
+    - shrinks the pool if it is mostly idle and there is nothing left to capture.
+    """
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        pool_size: Callable[[], int],
+        pool_in_use: Callable[[], int],
+        queued: Callable[[], int],
+        resize: Callable[[int], None],
+        min_pool_size: int = 1,
+        max_pool_size: int = 8,
+        interval: float = 15,
+        wait_threshold: float = 1.0,
+        max_cpu_load: float = 0.9,
+    ):
+        """
+        :param metrics: The run's metrics, which the throughput and borrow wait times are read from.
+        :param pool_size: A function returning the current size of the pool.
+        :param pool_in_use: A function returning the number of instances currently borrowed by workers.
+        :param queued: A function returning the number of onions waiting to be captured.
+        :param resize: A function resizing the pool (and the workers) to a given size.
+        :param min_pool_size: Minimum size of the pool.
+        :param max_pool_size: Maximum size of the pool.
+        :param interval: Seconds between scaling decisions.
+        :param wait_threshold: Average borrow wait (in seconds) above which the pool is considered too small.
+        :param max_cpu_load: Load average per CPU above which the pool is shrunk.
+        """
+        self.metrics = metrics
+        self.pool_size = pool_size
+        self.pool_in_use = pool_in_use
+        self.queued = queued
+        self.resize = resize
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.interval = interval
+        self.wait_threshold = wait_threshold
+        self.max_cpu_load = max_cpu_load
+
+        # The size the pool isn't grown past (after a growth step that didn't help), and until when
+        self._ceiling = None
+        self._ceiling_until = 0.0
+        self._last_growth = None
+
+        self._last_sample = self._read_totals()
+        self._stop_event = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _read_totals(self) -> tuple:
+        wait_sum, wait_count = self.metrics.histogram_totals("pool_wait_seconds")
+        return time.monotonic(), self.metrics.counter_total("results"), wait_sum, wait_count
+
+    def sample(self) -> dict:
+        """
+        Samples the run since the previous sample.
+
+        :return: A dictionary of the throughput (results per second), average borrow wait (seconds),
+            cpu_load (per CPU) and available_memory (bytes) since the previous sample.
+        """
+        totals = self._read_totals()
+        previous_time, previous_results, previous_wait_sum, previous_wait_count = self._last_sample
+        now, results, wait_sum, wait_count = totals
+        self._last_sample = totals
+
+        borrows = wait_count - previous_wait_count
+        return {
+            "throughput": (results - previous_results) / max(now - previous_time, 1e-9),
+            "borrow_wait": (wait_sum - previous_wait_sum) / borrows if borrows else 0.0,
+            "cpu_load": cpu_load(),
+            "available_memory": available_memory(),
+        }
+
+    def decide(self, pool_size: int, sample: dict) -> tuple:
+        """
+        Decides the size of the pool from a sample.
+
+        :param pool_size: Current size of the pool.
+        :param sample: A sample returned by sample().
+        :return: A tuple of the new pool size and the reason for it (the size is unchanged if the reason is None).
+        """
+        memory = sample["available_memory"]
+        load = sample["cpu_load"]
+
+        if memory is not None and memory < MEMORY_RESERVE and pool_size > self.min_pool_size:
+            return pool_size - 1, f"{memory / 1024 / 1024:.0f} MiB of memory available"
+        if load is not None and load > self.max_cpu_load and pool_size > self.min_pool_size:
+            return pool_size - 1, f"CPU load {load:.2f}"
+
+        if self._last_growth is not None:
+            # Check whether the last growth step paid off
+            grown_from, throughput_before = self._last_growth
+            self._last_growth = None
+            if sample["throughput"] <= throughput_before * 1.05 and pool_size > grown_from:
+                self._ceiling = grown_from
+                self._ceiling_until = time.monotonic() + self.interval * 10
+                return grown_from, "growing the pool did not improve throughput"
+
+        ceiling = self.max_pool_size
+        if self._ceiling is not None and time.monotonic() < self._ceiling_until:
+            ceiling = min(ceiling, self._ceiling)
+
+        has_room = (memory is None or memory - INSTANCE_MEMORY >= MEMORY_RESERVE) and (
+            load is None or load < self.max_cpu_load * 0.8
+        )
+        # The pool is too small if workers wait to borrow instances, or if all of them are busy with a backlog
+        if sample["borrow_wait"] > self.wait_threshold:
+            bottleneck = f"workers waited {sample['borrow_wait']:.1f}s for an instance"
+        elif self.pool_in_use() >= pool_size:
+            bottleneck = "all instances are busy"
+        else:
+            bottleneck = None
+        if bottleneck is not None and self.queued() > 0 and has_room and pool_size < ceiling:
+            self._last_growth = (pool_size, sample["throughput"])
+            return pool_size + 1, f"{bottleneck}, {self.queued()} onions queued"
+
+        if (
+            self.queued() == 0
+            and self.pool_in_use() < pool_size / 2
+            and pool_size > self.min_pool_size
+        ):
+            return pool_size - 1, "the pool is mostly idle"
+
+        return pool_size, None
+
+    def _run(self):
+        while not self._stop_event.wait(timeout=self.interval):
+            pool_size = self.pool_size()
+            new_size, reason = self.decide(pool_size=pool_size, sample=self.sample())
+            if reason is None or new_size == pool_size:
+                continue
+
+            log.info(
+                f"Autoscaling the WebDriver pool from {pool_size} to {new_size} instances ({reason})."
+            )
+            try:
+                self.resize(new_size)
+            except Exception as e:
+                log.warning(f"Failed to resize the WebDriver pool: [yellow]{e}[/]")
+
+    def stop(self):
+        """
+        Stops making scaling decisions.
+        """
+        self._stop_event.set()
+        self._thread.join()
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import sqlite3
+from collections import Counter
+from threading import Lock
+from typing import Optional
+
+# Seconds a cached page is used without asking its server whether it has changed
+DEFAULT_TTL = 3600
+
+# Maximum total size (in bytes) of the cached pages
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    An on-disk (SQLite) cache of fetched pages, keyed by url, with the links extracted from them.
+
+    A page fetched less than ttl seconds ago is served from the cache without going over Tor.
+    An older page is revalidated with a conditional request (If-None-Match / If-Modified-Since)
+    when its server sent an ETag or a Last-Modified header, so an unchanged page costs a 304 response
+    instead of its body, and its links don't have to be extracted again.
+    The least recently used pages are evicted once the cache grows past its maximum size.
+    """
+
+    def __init__(
+        self, database_path: str, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE
+    ):
+        """
+        :param database_path: Path to the SQLite database file.
+        :param ttl: Seconds a cached page is served without revalidating it.
+        :param max_size: Maximum total size (in bytes) of the cached pages.
+        """
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # Number of lookups, by outcome (hit, revalidated or miss)
+        self.counts = Counter()
+
+        # The connection is shared by the crawler and the fetches, so access to it is serialised with a lock
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            database_path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                links TEXT
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)")
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Gets a cached page, and marks it as recently used.
+
+        :param url: The page's url.
+        :return: A dictionary of the page's body, etag, last_modified, fetched_at and whether it is fresh
+            (fetched less than ttl seconds ago), or None if the page isn't cached.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE pages SET used_at = ? WHERE url = ?", (now, url))
+
+        entry = dict(row)
+        entry["fresh"] = now - entry["fetched_at"] < self.ttl
+        return entry
+
+    @staticmethod
+    def validators(entry: Optional[dict]) -> dict:
+        """
+        :param entry: A cached page returned by get(), or None.
+        :return: The headers of a conditional request for the page (empty if it can't be revalidated).
+        """
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, body: bytes, etag: str = None, last_modified: str = None):
+        """
+        Caches a fetched page (replacing its earlier version and links), then evicts the least recently used
+        pages if the cache has grown past its maximum size.
+
+        :param url: The page's url.
+        :param body: The page's body.
+        :param etag: The page's ETag header, if any.
+        :param last_modified: The page's Last-Modified header, if any.
+        """
+        if len(body) > self.max_size:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO pages (url, body, size, etag, last_modified, fetched_at, used_at, links)
+                VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+                """,
+                (url, body, len(body), etag, last_modified, now, now),
+            )
+            self._evict()
+
+    def revalidate(self, url: str):
+        """
+        Marks a cached page as fresh again, after its server answered that it hasn't changed (304).
+
+        :param url: The page's url.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def discard(self, url: str):
+        """
+        Removes a page from the cache (e.g. after its server answered with an error).
+
+        :param url: The page's url.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def _evict(self):
+        total_size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        evicted = []
+        for row in self._connection.execute("SELECT url, size FROM pages ORDER BY used_at"):
+            if total_size <= self.max_size:
+                break
+            evicted.append((row["url"],))
+            total_size -= row["size"]
+        self._connection.executemany("DELETE FROM pages WHERE url = ?", evicted)
+
+    def links(self, url: str) -> Optional[list]:
+        """
+        Gets the links extracted from the cached version of a page.
+
+        :param url: The page's url.
+        :return: The links, or None if they haven't been extracted from the cached version of the page.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT links FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return json.loads(row["links"]) if row is not None and row["links"] is not None else None
+
+    def store_links(self, url: str, links: list):
+        """
+        Caches the links extracted from the cached version of a page.
+
+        :param url: The page's url.
+        :param links: The links.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET links = ? WHERE url = ?", (json.dumps(links), url)
+            )
+
+    def count(self, outcome: str):
+        """
+        Counts a lookup.
+
+        :param outcome: "hit" (served from the cache), "revalidated" (served from the cache after a 304)
+            or "miss" (fetched).
+        """
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def close(self):
+        """
+        Closes the cache's database connection.
+        """
+        with self._lock:
+            self._connection.close()
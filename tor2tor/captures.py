@@ -0,0 +1,328 @@
+import os
+import time
+import sqlite3
+from threading import Lock
+from typing import Optional
+
+# Weight of the latest capture duration in an onion's moving average of capture durations
+DURATION_SMOOTHING = 0.3
+
+# SQL expression updating the mean_duration column with a new duration (bound twice)
+MEAN_DURATION_UPDATE = (
+    "CASE WHEN mean_duration IS NULL THEN ? "
+    f"ELSE mean_duration * {1 - DURATION_SMOOTHING} + ? * {DURATION_SMOOTHING} END"
+)
+
+
+class CaptureIndex:
+    """
+    An on-disk (SQLite) index of captured onions.
+
+    Every onion that is queued for capture is recorded in the index, together with its status
+    (pending, captured or skipped), the screenshot file, the file's SHA-256 hash and the capture timings.
+    The index also keeps each onion's history across runs (successes, failed capture attempts, skips
+    and a moving average of its capture durations), which the capture scheduler uses to prioritise onions.
+    The index is consulted before a WebDriver instance is borrowed, so onions that are already
+    captured do not cost a page load, and pending entries are used to resume interrupted runs.
+    """
+
+    def __init__(self, database_path: str):
+        """
+        :param database_path: Path to the SQLite database file.
+        """
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+
+        # The connection is shared by the worker threads, so access to it is serialised with a lock
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            database_path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS captures (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                seed TEXT,
+                status TEXT NOT NULL,
+                file TEXT,
+                sha256 TEXT,
+                reason TEXT,
+                queued_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                duration REAL,
+                phash TEXT,
+                duplicate_of TEXT,
+                content_hash TEXT,
+                checked_at REAL,
+                successes INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                mean_duration REAL,
+                render_profile TEXT,
+                skips INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+        # Add the columns that indexes created by older versions don't have
+        columns = {
+            row["name"] for row in self._connection.execute("PRAGMA table_info(captures)")
+        }
+        for column, column_type in [
+            ("phash", "TEXT"),
+            ("duplicate_of", "TEXT"),
+            ("content_hash", "TEXT"),
+            ("checked_at", "REAL"),
+            ("successes", "INTEGER NOT NULL DEFAULT 0"),
+            ("failures", "INTEGER NOT NULL DEFAULT 0"),
+            ("mean_duration", "REAL"),
+            ("render_profile", "TEXT"),
+            ("skips", "INTEGER NOT NULL DEFAULT 0"),
+        ]:
+            if column not in columns:
+                self._connection.execute(
+                    f"ALTER TABLE captures ADD COLUMN {column} {column_type}"
+                )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS captures_seed_status ON captures (seed, status)"
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Gets the index entry of a given capture key.
+
+        :param key: The capture key (output name) of the onion.
+        :return: A dictionary containing the entry's columns, or None if the onion is not indexed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM captures WHERE key = ?", (key,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def history(self, key: str) -> Optional[dict]:
+        """
+        Gets the capture history of an onion, from all runs.
+
+        :param key: The capture key (output name) of the onion.
+        :return: A dictionary of the onion's successes, failures and mean_duration (in seconds),
+            or None if the onion is not indexed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT successes, failures, mean_duration FROM captures WHERE key = ?",
+                (key,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def average_duration(self) -> Optional[float]:
+        """
+        Gets the average of the onions' mean capture durations.
+
+        :return: The average duration in seconds, or None if no capture durations have been recorded.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT AVG(mean_duration) FROM captures WHERE mean_duration IS NOT NULL"
+            ).fetchone()
+        return row[0]
+
+    def is_captured(self, key: str, file_path: str) -> bool:
+        """
+        Checks whether an onion has already been captured.
+
+        :param key: The capture key (output name) of the onion.
+        :param file_path: Path where the onion's screenshot is expected to be.
+        :return: True if the onion is indexed as captured (or its screenshot already exists), False otherwise.
+        """
+        entry = self.get(key=key)
+        if entry is not None and entry.get("status") == "captured":
+            return os.path.exists(entry.get("file") or file_path)
+        return os.path.exists(file_path)
+
+    def file_references(self, file_path: str, exclude_key: str = None) -> int:
+        """
+        Counts the captured onions whose screenshot is a given file (e.g. a blob shared by identical captures).
+
+        :param file_path: Path to the screenshot.
+        :param exclude_key: The capture key of an onion to leave out of the count.
+        :return: The number of captured onions using the file.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT COUNT(*) FROM captures WHERE file = ? AND status = 'captured' AND key != ?",
+                (file_path, exclude_key or ""),
+            ).fetchone()
+        return row[0]
+
+    def mark_pending(self, key: str, url: str, seed: str):
+        """
+        Records an onion as queued for capture. Onions that are already captured keep their status.
+
+        :param key: The capture key (output name) of the onion.
+        :param url: The onion url.
+        :param seed: The seed onion the onion was found from.
+        """
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO captures (key, url, seed, status, queued_at) VALUES (?, ?, ?, 'pending', ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    url = excluded.url,
+                    seed = excluded.seed,
+                    queued_at = excluded.queued_at,
+                    status = CASE WHEN status = 'captured' THEN status ELSE 'pending' END
+                """,
+                (key, url, seed, time.time()),
+            )
+
+    def mark_captured(
+        self,
+        key: str,
+        file_path: str,
+        sha256: str,
+        started_at: float,
+        finished_at: float,
+        phash: int = None,
+        duplicate_of: str = None,
+        content_hash: str = None,
+        render_profile: str = None,
+    ):
+        """
+        Records an onion as captured.
+
+        :param key: The capture key (output name) of the onion.
+        :param file_path: Path to the onion's screenshot.
+        :param sha256: SHA-256 hash of the screenshot.
+        :param started_at: Unix timestamp of when the capture started.
+        :param finished_at: Unix timestamp of when the capture finished.
+        :param phash: Perceptual hash of the screenshot.
+        :param duplicate_of: Capture key of the onion whose screenshot this one is a near-duplicate of.
+        :param content_hash: Hash of the onion's normalised content, which later runs compare to in incremental mode.
+        :param render_profile: The render profile the onion was captured with.
+        """
+        with self._lock:
+            self._connection.execute(
+                f"""
+                UPDATE captures SET status = 'captured', file = ?, sha256 = ?, reason = NULL,
+                    started_at = ?, finished_at = ?, duration = ?, phash = ?, duplicate_of = ?,
+                    content_hash = ?, checked_at = ?, render_profile = ?, successes = successes + 1,
+                    mean_duration = {MEAN_DURATION_UPDATE}
+                WHERE key = ?
+                """,
+                (
+                    file_path,
+                    sha256,
+                    started_at,
+                    finished_at,
+                    finished_at - started_at,
+                    f"{phash:016x}" if phash is not None else None,
+                    duplicate_of,
+                    content_hash,
+                    finished_at,
+                    render_profile,
+                    finished_at - started_at,
+                    finished_at - started_at,
+                    key,
+                ),
+            )
+
+    def mark_unchanged(self, key: str, checked_at: float):
+        """
+        Records that a captured onion's content was checked and hasn't changed. The onion keeps its capture.
+
+        :param key: The capture key (output name) of the onion.
+        :param checked_at: Unix timestamp of when the onion's content was checked.
+        """
+        with self._lock:
+            self._connection.execute(
+                """
+                UPDATE captures SET status = 'captured', checked_at = ?, successes = successes + 1
+                WHERE key = ?
+                """,
+                (checked_at, key),
+            )
+
+    def mark_failed(self, key: str, started_at: float, finished_at: float, attempts: int = 1):
+        """
+        Records failed capture attempts of an onion in its history (whether or not they are retried),
+        even if it was captured in an earlier run.
+
+        :param key: The capture key (output name) of the onion.
+        :param started_at: Unix timestamp of when the (last) attempt started.
+        :param finished_at: Unix timestamp of when the (last) attempt failed.
+        :param attempts: Number of failed attempts.
+        """
+        with self._lock:
+            self._connection.execute(
+                f"""
+                UPDATE captures SET failures = failures + ?, mean_duration = {MEAN_DURATION_UPDATE}
+                WHERE key = ?
+                """,
+                (attempts, finished_at - started_at, finished_at - started_at, key),
+            )
+
+    def mark_skipped(self, key: str, reason: str, started_at: float, finished_at: float):
+        """
+        Records an onion as skipped. Skips are counted apart from failures (see mark_failed()),
+        since an onion can be skipped without a capture being attempted (e.g. after a failed liveness probe).
+
+        :param key: The capture key (output name) of the onion.
+        :param reason: The reason the onion was skipped.
+        :param started_at: Unix timestamp of when the capture started.
+        :param finished_at: Unix timestamp of when the capture was given up on.
+        """
+        with self._lock:
+            self._connection.execute(
+                """
+                UPDATE captures SET status = 'skipped', reason = ?, started_at = ?, finished_at = ?, duration = ?
+                WHERE key = ? AND status != 'captured'
+                """,
+                (reason, started_at, finished_at, finished_at - started_at, key),
+            )
+
+            # The skip is recorded in the onion's history, even if it was captured in an earlier run
+            self._connection.execute(
+                "UPDATE captures SET skips = skips + 1 WHERE key = ?", (key,)
+            )
+
+    def pending(self, seed: str) -> list:
+        """
+        Gets onions of a given seed that were queued but never captured or skipped.
+
+        :param seed: The seed onion.
+        :return: A list of (key, url) tuples, in the order they were queued.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, url FROM captures WHERE seed = ? AND status = 'pending' ORDER BY queued_at",
+                (seed,),
+            ).fetchall()
+        return [(row["key"], row["url"]) for row in rows]
+
+    def perceptual_hashes(self) -> list:
+        """
+        Gets the perceptual hashes of all captured screenshots.
+
+        :return: A list of (key, file, phash, duplicate_of) tuples, in the order the onions were captured.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT key, file, phash, duplicate_of FROM captures
+                WHERE status = 'captured' AND phash IS NOT NULL ORDER BY finished_at
+                """
+            ).fetchall()
+        return [
+            (row["key"], row["file"], int(row["phash"], 16), row["duplicate_of"])
+            for row in rows
+        ]
+
+    def close(self):
+        """
+        Closes the index's database connection.
+        """
+        with self._lock:
+            self._connection.close()
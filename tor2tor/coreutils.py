@@ -1,30 +1,62 @@
 import os
 import re
+import sys
 import time
 import json
 import logging
+import base64
+import binascii
 import argparse
+import hashlib
 import subprocess
+from functools import lru_cache
+from threading import Lock, Thread
+from collections import OrderedDict
 from datetime import datetime
+from typing import Iterable, Optional
 from urllib.parse import urlparse
 
 import requests
 from rich import print
 from rich.table import Table
-from rich.markdown import Markdown
-from rich.logging import RichHandler
-from rich_argparse import RichHelpFormatter
 
 from . import __author__, __about__, __version__
 
 # Construct path to the user's home directory
 PROGRAM_DIRECTORY = os.path.expanduser(os.path.join("~", "tor2tor"))
 
+# The program's logger. Handlers are only configured by set_loglevel(), so importing tor2tor has no side effects.
+log = logging.getLogger("Tor2Tor")
 
+# Markup that changes between loads of an otherwise unchanged page (comments, scripts, styles,
+# hidden form fields such as CSRF tokens, and nonces), which is left out of content hashes.
+VOLATILE_MARKUP_PATTERN = re.compile(
+    r"<!--.*?-->"
+    r"|<(script|style|noscript)\b.*?</\1\s*>"
+    r"|<input\b[^>]*\btype\s*=\s*[\"']?hidden\b[^>]*>"
+    r"|\bnonce\s*=\s*(\"[^\"]*\"|'[^']*'|\S+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+# Matches a url (with or without a scheme) whose host is a v3 onion address (56 base32 characters) or a subdomain
+# of one (such as www.), capturing the address.
+ONION_URL_PATTERN = re.compile(
+    r"^(?:https?://)?(?:[a-z0-9-]+\.)*([a-z2-7]{56})\.onion\.?(?::\d+)?(?:[/?#]|$)", re.IGNORECASE
+)
+
+# Version byte and checksum prefix of v3 onion addresses (see Tor's rend-spec-v3)
+ONION_VERSION = b"\x03"
+ONION_CHECKSUM_PREFIX = b".onion checksum"
+
+
+@lru_cache(maxsize=None)
 def load_settings() -> dict:
     """
     Loads settings from /settings/settings.json
 
+    The settings are only read from the file once, and then returned from cache.
+
     :return: Dictionary (JSON) containing settings
     """
     # Get the absolute path of the current file
@@ -41,12 +73,84 @@ def load_settings() -> dict:
 
 
 def create_parser() -> argparse.ArgumentParser:
+    # Imported here, so they are only paid for when the command line is used
+    from rich.markdown import Markdown
+    from rich_argparse import RichHelpFormatter
     from . import __version__, __epilog__, __description__
+
     parser = argparse.ArgumentParser(
         description=Markdown(__description__, "argparse.text"),
         epilog=Markdown(__epilog__), formatter_class=RichHelpFormatter
     )
-    parser.add_argument("onion", help="onion url to scrape")
+    parser.add_argument(
+        "onion",
+        help="onion url to scrape (omit it when using --seeds, --queue-worker or --serve, "
+        "or give serve to run the daemon)",
+        nargs="?",
+    )
+    parser.add_argument(
+        "--seeds",
+        help="file of onion urls to scrape one after another (one per line, - to read them from stdin), "
+        "through one Tor session and one WebDriver pool",
+        dest="seeds_file",
+    )
+    parser.add_argument(
+        "--coordinator",
+        help="crawl the onion(s) and publish the onions found to a distributed queue (an SQLite file, "
+        "e.g. on a shared volume) for --queue-worker processes to capture, then merge their results",
+        metavar="QUEUE_FILE",
+        dest="coordinator_queue",
+    )
+    parser.add_argument(
+        "--queue-worker",
+        help="capture the onions published to a distributed queue by a --coordinator, and report back to it",
+        metavar="QUEUE_FILE",
+        dest="worker_queue",
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="identifier of this --queue-worker (default: the hostname and process ID)",
+        dest="worker_id",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        help="seconds a claimed onion is leased to a worker before it is re-issued, unless the lease is renewed "
+        "(default: %(default)s)",
+        dest="lease_seconds",
+        type=float,
+        default=300,
+    )
+    parser.add_argument(
+        "--idle-exit",
+        help="seconds a --queue-worker waits for new onions once the queue is empty, or a --coordinator "
+        "waits for workers to claim its remaining onions, before it exits (default: wait forever)",
+        dest="idle_timeout",
+        type=float,
+    )
+    parser.add_argument(
+        "--serve",
+        help="run as a daemon that keeps Tor and the WebDriver pool warm, and captures the jobs "
+        "submitted to its local HTTP API (same as tor2tor serve)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--api-host",
+        help="address the --serve API listens on (default: %(default)s)",
+        dest="api_host",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--api-port",
+        help="port the --serve API listens on (default: %(default)s)",
+        dest="api_port",
+        type=int,
+        default=8765,
+    )
+    parser.add_argument(
+        "--api-socket",
+        help="serve the --serve API on this Unix socket instead of a TCP port",
+        dest="api_socket",
+    )
     parser.add_argument(
         "--headless",
         help="run Firefox WebDriver instances in headless mode",
@@ -55,6 +159,12 @@ def create_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "-l", "--limit", help="number of onion links to capture", type=int, default=10
     )
+    parser.add_argument(
+        "--depth",
+        help="number of hops to crawl away from the given onion (default: %(default)s)",
+        type=int,
+        default=1,
+    )
     parser.add_argument(
         "-p",
         "--pool",
@@ -69,12 +179,337 @@ def create_parser() -> argparse.ArgumentParser:
         type=int,
         default=3,
     )
+    parser.add_argument(
+        "--autoscale",
+        help="grow or shrink the WebDriver pool and worker threads during the run, "
+        "based on throughput, borrow wait times, CPU load and available memory",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--min-pool",
+        help="minimum size of the autoscaled WebDriver pool (default: %(default)s)",
+        dest="min_pool_size",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--max-pool",
+        help="maximum size of the autoscaled WebDriver pool (default: the larger of -p/--pool and the CPU count)",
+        dest="max_pool_size",
+        type=int,
+    )
+    parser.add_argument(
+        "--autoscale-interval",
+        help="seconds between autoscaling decisions (default: %(default)s)",
+        dest="autoscale_interval",
+        type=float,
+        default=15,
+    )
+    parser.add_argument(
+        "--page-load-strategy",
+        help="when navigation to an onion is considered done (default: %(default)s)",
+        dest="page_load_strategy",
+        choices=["normal", "eager", "none"],
+        default="normal",
+    )
+    parser.add_argument(
+        "--render-profile",
+        help="resources onions are rendered with: everything (full), no media, web fonts, autoplay or "
+        "cross-site images (light), or no JavaScript and no images (text) (default: %(default)s)",
+        dest="render_profile",
+        choices=["full", "light", "text"],
+        default="full",
+    )
+    parser.add_argument(
+        "--viewport-only",
+        help="capture only the browser's viewport instead of the full page",
+        dest="viewport_only",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--navigate-timeout",
+        help="seconds to wait for an onion to load in the browser (default: %(default)s)",
+        dest="navigate_timeout",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--settle-timeout",
+        help="seconds to wait for a loaded onion to settle before capturing it (default: %(default)s)",
+        dest="settle_timeout",
+        type=float,
+        default=10,
+    )
+    parser.add_argument(
+        "--screenshot-timeout",
+        help="seconds to wait for a screenshot to be taken (default: %(default)s)",
+        dest="screenshot_timeout",
+        type=float,
+        default=30,
+    )
+    parser.add_argument(
+        "--image-format",
+        help="format to save screenshots in (default: %(default)s)",
+        dest="image_format",
+        choices=["png", "webp", "jpeg"],
+        default="png",
+    )
+    parser.add_argument(
+        "--image-quality",
+        help="quality of webp/jpeg screenshots, from 1 to 100 (default: %(default)s)",
+        dest="image_quality",
+        type=int,
+        default=80,
+    )
+    parser.add_argument(
+        "--max-height",
+        help="crop screenshots to this height in pixels (default: no cropping)",
+        dest="max_height",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--thumbnail-width",
+        help="generate screenshot thumbnails of this width in pixels (default: no thumbnails)",
+        dest="thumbnail_width",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--postprocess-workers",
+        help="number of screenshot post-processing processes (default: number of CPUs)",
+        dest="postprocess_workers",
+        type=int,
+    )
+    parser.add_argument(
+        "--duplicates",
+        help="what to do with near-duplicate screenshots: keep them, hardlink them to a single copy, "
+        "or drop them (default: %(default)s)",
+        dest="duplicates",
+        choices=["keep", "hardlink", "drop"],
+        default="keep",
+    )
+    parser.add_argument(
+        "--duplicate-threshold",
+        help="maximum number of differing perceptual hash bits (out of 64) "
+        "for screenshots to be near-duplicates (default: %(default)s)",
+        dest="duplicate_threshold",
+        type=int,
+        default=6,
+    )
+    parser.add_argument(
+        "--storage",
+        help="how screenshots are stored: one file per onion in the seed's directory (flat), or as "
+        "content-addressed blobs in hash-sharded directories under blobs/, indexed by onion (sharded) "
+        "(default: %(default)s)",
+        dest="storage",
+        choices=["flat", "sharded"],
+        default="flat",
+    )
+    parser.add_argument(
+        "--archive",
+        help="also append the stored screenshots to this tar archive (one entry per unique screenshot, "
+        "with a manifest per run), for bulk transfer",
+        dest="archive_file",
+    )
+    parser.add_argument(
+        "--retries",
+        help="maximum number of times to retry an onion that failed with a transient error (default: %(default)s)",
+        dest="max_retries",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--retry-delay",
+        help="seconds to wait before the first retry of an onion, doubled for each further retry "
+        "(default: %(default)s)",
+        dest="retry_delay",
+        type=float,
+        default=5,
+    )
+    parser.add_argument(
+        "--tor-control-port",
+        help="Tor control port to request new circuits (NEWNYM) through after repeated failures "
+        "(instances launched with --tor-instances use their own control ports)",
+        dest="tor_control_port",
+        type=int,
+    )
+    parser.add_argument(
+        "--tor-control-password",
+        help="password of the Tor control port (default: cookie or no authentication)",
+        dest="tor_control_password",
+    )
+    parser.add_argument(
+        "--newnym-after",
+        help="number of consecutive transient failures after which new Tor circuits are requested "
+        "(default: %(default)s)",
+        dest="newnym_after",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--max-per-host",
+        help="maximum number of concurrent loads of the same onion host, 0 for no cap (default: %(default)s)",
+        dest="max_per_host",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--tor-instances",
+        help="launch n Tor instances and shard WebDriver instances and fetches across them "
+        "(their control ports follow their SOCKS ports)",
+        dest="tor_instances",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--tor-base-port",
+        help="SOCKS port of the first launched Tor instance (default: %(default)s)",
+        dest="tor_base_port",
+        type=int,
+        default=9060,
+    )
+    parser.add_argument(
+        "--socks-ports",
+        help="comma-separated Tor SOCKS ports (or host:port pairs) to shard across, e.g. 9050,9052",
+        dest="socks_ports",
+    )
+    parser.add_argument(
+        "--shard-strategy",
+        help="how Tor SOCKS endpoints are assigned (default: %(default)s)",
+        dest="shard_strategy",
+        choices=["round-robin", "least-loaded"],
+        default="round-robin",
+    )
+    parser.add_argument(
+        "--fetch-concurrency",
+        help="number of pages to fetch at once while crawling (default: %(default)s)",
+        dest="fetch_concurrency",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        "--max-page-size",
+        help="maximum size (in MiB) of a page to read links from (default: %(default)s)",
+        dest="max_page_size",
+        type=float,
+        default=10,
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        help="seconds to wait for a connection when fetching pages (default: %(default)s)",
+        dest="connect_timeout",
+        type=float,
+        default=30,
+    )
+    parser.add_argument(
+        "--read-timeout",
+        help="seconds to wait for data when fetching pages (default: %(default)s)",
+        dest="read_timeout",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="always fetch crawled pages over Tor, instead of using the on-disk page cache",
+        dest="cache",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        help="seconds a cached page is used before its server is asked whether it has changed "
+        "(default: %(default)s)",
+        dest="cache_ttl",
+        type=float,
+        default=3600,
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="maximum size (in MiB) of the page cache, least recently used pages are evicted first "
+        "(default: %(default)s)",
+        dest="cache_size",
+        type=float,
+        default=256,
+    )
+    parser.add_argument(
+        "--probe-timeout",
+        help="seconds a crawled onion has to respond to a liveness probe before a browser is spent on it, "
+        "0 to capture onions without probing them (default: %(default)s)",
+        dest="probe_timeout",
+        type=float,
+        default=15,
+    )
+    parser.add_argument(
+        "--probe-concurrency",
+        help="number of onions to probe at once, independently of the browsers (default: %(default)s)",
+        dest="probe_concurrency",
+        type=int,
+        default=32,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="only capture onions whose content changed since they were last captured, comparing hashes of their "
+        "rendered DOM (dom) or of a cheap HTTP prefetch (http) (default: %(const)s)",
+        dest="incremental",
+        nargs="?",
+        const="dom",
+        choices=["dom", "http"],
+    )
+    parser.add_argument(
+        "--resume",
+        help="resume an interrupted run by capturing the onions it left pending first",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="file to stream results to, as they are produced "
+        "(default: results.jsonl in the onion's output directory, or batch-<time>.jsonl with --seeds)",
+        dest="results_file",
+    )
+    parser.add_argument(
+        "--output-format",
+        help="format of the results file (default: from the file's extension, or jsonl)",
+        dest="results_format",
+        choices=["jsonl", "csv"],
+    )
+    parser.add_argument(
+        "--no-tables",
+        help="don't print tables of the results once the run ends (useful for large crawls)",
+        dest="show_tables",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help="serve live metrics (per-stage latencies, counters, pool and queue gauges) "
+        "on this local port, at /metrics",
+        dest="metrics_port",
+        type=int,
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="write live metrics to this file periodically",
+        dest="metrics_file",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        help="seconds between writes of the metrics file (default: %(default)s)",
+        dest="metrics_interval",
+        type=float,
+        default=10,
+    )
     parser.add_argument(
         "--log-skipped",
         help="log skipped onions on output",
         dest="log_skipped",
         action="store_true",
     )
+    parser.add_argument(
+        "--no-update-check",
+        help="don't check for updates on startup",
+        dest="update_check",
+        action="store_false",
+    )
     parser.add_argument(
         "-d", "--debug", help="run program in debug mode", action="store_true"
     )
@@ -89,6 +524,8 @@ def set_loglevel(debug_mode: bool) -> logging.getLogger:
     :param debug_mode: If True, the log level is set to "NOTSET". Otherwise, it is set to "INFO".
     :return: A logging object configured with the specified log level.
     """
+    from rich.logging import RichHandler
+
     logging.basicConfig(
         level="NOTSET" if debug_mode else "INFO",
         format="%(message)s",
@@ -106,32 +543,117 @@ def add_http_to_link(link: str) -> str:
     :param link: The link to modify.
     :return: The modified URL.
     """
-    if not link.startswith(("http://", "https://")):
+    # Schemes are case-insensitive
+    if not link.lower().startswith(("http://", "https://")):
         return f"http://{link}"
     return link
 
 
+@lru_cache(maxsize=65536)
+def is_valid_onion_address(address: str) -> bool:
+    """
+    Checks whether a v3 onion address is well-formed: it must decode to a 32-byte public key,
+    a 2-byte checksum and the version byte 3, and the checksum must match the public key.
+
+    The result is cached, since the same addresses come up again and again in crawled link lists.
+
+    :param address: The address (the 56 base32 characters, without .onion), in lowercase.
+    :return: True if the address is a valid v3 onion address, False if it isn't.
+    """
+    try:
+        decoded = base64.b32decode(address.upper())
+    except (binascii.Error, ValueError):
+        return False
+
+    public_key, checksum, version = decoded[:32], decoded[32:34], decoded[34:]
+    expected_checksum = hashlib.sha3_256(ONION_CHECKSUM_PREFIX + public_key + version).digest()[:2]
+    return version == ONION_VERSION and checksum == expected_checksum
+
+
+def canonical_onion(url: str) -> Optional[str]:
+    """
+    Gets the canonical name of the onion service a url points to: its lowercase v3 address followed by .onion.
+    The scheme, subdomains (e.g. www.), port, path, query and fragment are left out, so all the urls
+    of the same service have the same canonical name.
+
+    :param url: The url (with or without a scheme).
+    :return: The onion's canonical name, or None if the url doesn't point to a valid v3 onion address.
+    """
+    match = ONION_URL_PATTERN.match(url.strip())
+    if match is None:
+        return None
+
+    address = match.group(1).lower()
+    return f"{address}.onion" if is_valid_onion_address(address=address) else None
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalises a url, so the urls of the same page compare equal: the scheme, subdomains, port and fragment
+    of onion urls are left out, the host is lowercased, and an empty path becomes /.
+
+    :param url: The url (with or without a scheme).
+    :return: The canonical url (without a scheme), e.g. for deduplicating crawled pages.
+    """
+    parsed_url = urlparse(add_http_to_link(link=url.strip()))
+    host = canonical_onion(url=url) or parsed_url.netloc.lower()
+    query = f"?{parsed_url.query}" if parsed_url.query else ""
+    return f"{host}{parsed_url.path or '/'}{query}"
+
+
 def is_valid_onion(url: str) -> bool:
     """
-    Uses a regex pattern to determine whether a given url is an onion service or not.
+    Determines whether a given url points to a valid v3 onion service, checking its address' checksum
+    and version byte (see canonical_onion()).
 
     :param url: The url to check.
-    :return: True if the url matches the strict pattern criterion. False if it doesn't
-
-    Regex Explanation
-    -----------------
-    - ^ - Asserts the start of a string.
-    - (http://|https://)? - Matches HTTP or HTTPS protocol in the string (optional).
-    - (www\\.)? - Optionally matches the www. subdomain.
-    - ([a-z2-7]{54,}d) - Matches 55 or more characters, where each can be a lowercase letter or a digit from 2 to 7,
-      and ends with 'd'.
-    - \\.onion - Matches .onion.
-    - (/|$) - Matches either a forward slash or the end of the string.
-    """
-    if re.search(r"^(http://|https://)?(www\.)?([a-z2-7]{54,}d)\.onion(/|$)", url):
-        return True
+    :return: True if the url points to a valid v3 onion address. False if it doesn't.
+    """
+    return canonical_onion(url=url) is not None
+
+
+def validate_onions(urls: Iterable[str]) -> tuple:
+    """
+    Validates a batch of urls, keeping one url per onion service.
+
+    :param urls: The urls to validate.
+    :return: A tuple of the list of valid urls (the first url of each onion service, in the given order)
+        and the list of invalid urls: (valid_urls, invalid_urls).
+    """
+    valid_urls = []
+    invalid_urls = []
+    seen_onions = set()
+
+    for url in urls:
+        onion = canonical_onion(url=url)
+        if onion is None:
+            invalid_urls.append(url)
+        elif onion not in seen_onions:
+            seen_onions.add(onion)
+            valid_urls.append(url)
+    return valid_urls, invalid_urls
+
+
+def read_seeds(source: str) -> list:
+    """
+    Reads seed onions from a file, one per line. Blank lines and lines starting with # are ignored,
+    and seeds that are listed more than once are only kept once.
+
+    :param source: Path to the file, or - to read the seeds from stdin.
+    :return: A list of the seed onions, in the order they are listed.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
     else:
-        return False
+        with open(source, encoding="utf-8") as seeds_file:
+            lines = seeds_file.read().splitlines()
+
+    seeds = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#") and line not in seeds:
+            seeds.append(line)
+    return seeds
 
 
 def create_table(table_headers: list, table_title: str = "") -> Table:
@@ -158,16 +680,95 @@ def create_table(table_headers: list, table_title: str = "") -> Table:
 
 def construct_output_name(url: str) -> str:
     """
-    Constructs an output name based on the network location part (netloc) of a given URL.
+    Constructs an output name (the capture key used for deduplication and file names) for a given URL.
 
     :param url: The URL to parse.
-    :return: The network location part (netloc) of the URL.
+    :return: The canonical name of the URL's onion service (see canonical_onion()),
+        or the URL's lowercase network location part (netloc) if it isn't a valid onion URL.
     """
-    parsed_url = urlparse(url)
-    output_name = parsed_url.netloc
+    output_name = canonical_onion(url=url)
+    if output_name is None:
+        output_name = urlparse(url).netloc.lower()
     return output_name
 
 
+class CaptureTimeout(Exception):
+    """
+    Raised when a phase of a capture (navigate, settle or screenshot) exceeds its deadline.
+    """
+
+    def __init__(self, phase: str, partial_capture: str = None):
+        """
+        :param phase: The phase that timed out.
+        :param partial_capture: Path to the partial capture taken when the phase timed out, if any.
+        """
+        self.phase = phase
+        self.partial_capture = partial_capture
+        message = f"{phase} timed out"
+        if partial_capture is not None:
+            message += f" (partial capture saved to {os.path.basename(partial_capture)})"
+        super().__init__(message)
+
+
+class ContentUnchanged(Exception):
+    """
+    Raised when an onion's content hasn't changed since it was last captured, so it is not captured again.
+    """
+
+    def __init__(self, content_hash: str):
+        """
+        :param content_hash: The unchanged content hash of the onion.
+        """
+        self.content_hash = content_hash
+        super().__init__("content unchanged")
+
+
+class VisitedSet:
+    """
+    A thread-safe, memory-bounded set of visited keys.
+
+    Keys are stored as 8-byte digests rather than full URLs, and once the set holds
+    `max_entries` keys, the oldest ones are evicted to make room for new ones.
+    """
+
+    def __init__(self, max_entries: int = 1_000_000):
+        """
+        :param max_entries: Maximum number of keys to keep in memory.
+        """
+        self.max_entries = max_entries
+        self._digests = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+    def add(self, key: str) -> bool:
+        """
+        Adds a key to the set.
+
+        :param key: The key to add.
+        :return: True if the key was not in the set, False if it had already been visited.
+        """
+        digest = self._digest(key=key)
+        with self._lock:
+            if digest in self._digests:
+                return False
+
+            self._digests[digest] = None
+            if len(self._digests) > self.max_entries:
+                # Evict the oldest key
+                self._digests.popitem(last=False)
+            return True
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._digest(key=key) in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
 def path_finder(url: str):
     """
     Checks if the specified directories exist.
@@ -205,12 +806,46 @@ def get_file_info(filename: str) -> tuple:
     return file_size, created_time
 
 
-def check_updates():
+def get_file_hash(filename: str) -> str:
+    """
+    Gets the SHA-256 hash of a given file.
+
+    :param filename: File to hash.
+    :return: The hex digest of the file's SHA-256 hash.
+    """
+    file_hash = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def get_content_hash(page_source: str) -> str:
+    """
+    Gets the SHA-256 hash of a page's normalised source, which stays the same across loads of an unchanged page.
+
+    :param page_source: The page's HTML source.
+    :return: The hex digest of the normalised source's SHA-256 hash.
+    """
+    normalised_source = VOLATILE_MARKUP_PATTERN.sub("", page_source)
+
+    # Whitespace is collapsed, and whitespace between tags is dropped
+    normalised_source = re.sub(r">\s+<", "><", " ".join(normalised_source.split()))
+    return hashlib.sha256(normalised_source.encode("utf-8")).hexdigest()
+
+
+def check_updates(timeout: float = 10):
     """
     Checks the program's updates by comparing the current program version tag with the remote version tag from GitHub.
+
+    :param timeout: Seconds to wait for GitHub to respond.
     """
+    from rich.markdown import Markdown
+
     response = requests.get(
-        "https://api.github.com/repos/rly0nheart/tor2tor/releases/latest"
+        "https://api.github.com/repos/rly0nheart/tor2tor/releases/latest",
+        timeout=timeout,
     ).json()
     remote_version = response.get("tag_name")
 
@@ -226,6 +861,24 @@ def check_updates():
         print("\n")
 
 
+def check_updates_in_background() -> Thread:
+    """
+    Checks the program's updates in a daemon thread, so startup is not blocked by the request to GitHub.
+
+    :return: The thread running the update check.
+    """
+
+    def check():
+        try:
+            check_updates()
+        except Exception as e:
+            log.debug(f"Failed to check for updates: {e}")
+
+    thread = Thread(target=check, daemon=True)
+    thread.start()
+    return thread
+
+
 def tor_service(command: str):
     """
     Starts/Stops the Tor service based on the provided command and operating system.
@@ -255,7 +908,3 @@ def tor_service(command: str):
 
     except subprocess.CalledProcessError as e:
         print(f"Failed to {command} the Tor service: {e}")
-
-
-args = create_parser().parse_args()
-log = set_loglevel(debug_mode=args.debug)
@@ -0,0 +1,420 @@
+import os
+import json
+import time
+import uuid
+import socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Event, Lock, Thread
+
+from .coreutils import (
+    PROGRAM_DIRECTORY,
+    log,
+    is_valid_onion,
+    add_http_to_link,
+    construct_output_name,
+)
+from .retries import CaptureTask
+from .sinks import open_sink
+
+# Number of finished jobs that are kept in memory (their results files are kept on disk regardless)
+MAX_FINISHED_JOBS = 100
+
+
+class CaptureJob:
+    """
+    A capture job submitted to the daemon, and the results it has produced so far.
+    """
+
+    def __init__(self, onion: str, crawl: bool = False, depth: int = 1, limit: int = 10):
+        """
+        :param onion: The onion to capture (or to crawl from).
+        :param crawl: If True, the onions linked from the onion are captured (like the CLI does),
+            otherwise only the onion itself is captured.
+        :param depth: Number of hops to crawl away from the onion (if crawling).
+        :param limit: Maximum number of onions to capture (if crawling).
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.onion = add_http_to_link(link=onion)
+        self.crawl = crawl
+        self.depth = depth
+        self.limit = limit
+
+        self.status = "queued"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.results = []
+        self.results_file = os.path.join(PROGRAM_DIRECTORY, "jobs", f"{self.id}.jsonl")
+        self.cancelled = Event()
+
+        # Notified whenever a result is added or the job finishes
+        self.updated = Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def add_result(self, result: dict):
+        with self.updated:
+            self.results.append(result)
+            self.updated.notify_all()
+
+    def finish(self, status: str, error: str = None):
+        with self.updated:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self.updated.notify_all()
+
+    def iter_results(self, timeout: float = None):
+        """
+        Yields the job's results as they are produced, until the job finishes.
+
+        :param timeout: Maximum number of seconds to wait for the next result. If None, wait indefinitely.
+        """
+        position = 0
+        while True:
+            with self.updated:
+                self.updated.wait_for(
+                    lambda: position < len(self.results) or self.finished, timeout=timeout
+                )
+                results = self.results[position:]
+                finished = self.finished
+            position += len(results)
+            yield from results
+            if finished and position >= len(self.results):
+                return
+
+    def summary(self) -> dict:
+        """
+        :return: A JSON-serialisable summary of the job.
+        """
+        counts = {}
+        for result in list(self.results):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return {
+            "id": self.id,
+            "onion": self.onion,
+            "crawl": self.crawl,
+            "depth": self.depth,
+            "limit": self.limit,
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "results": counts,
+            "results_file": self.results_file,
+        }
+
+
+class JobManager:
+    """
+    Runs capture jobs one after another through a Tor2Tor session that stays open (a warm WebDriver pool),
+    using the same workers, scheduler and retries as the CLI.
+    """
+
+    def __init__(self, tor2tor, worker_threads: int = 3):
+        """
+        :param tor2tor: The Tor2Tor instance, whose session must already be open (see Tor2Tor.open_session()).
+        :param worker_threads: Number of worker threads for each job.
+        """
+        self.tor2tor = tor2tor
+        self.worker_threads = worker_threads
+
+        self._lock = Lock()
+        self._jobs = OrderedDict()
+        self._pending = []
+        self._pending_condition = Condition(self._lock)
+        self._stopping = False
+        # The job whose run is in progress, if any
+        self._running = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: CaptureJob) -> CaptureJob:
+        """
+        Queues a job.
+
+        :param job: The job to queue.
+        :return: The queued job.
+        """
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._pending_condition.notify()
+
+            # Forget the oldest finished jobs
+            finished_jobs = [queued_job for queued_job in self._jobs.values() if queued_job.finished]
+            for finished_job in finished_jobs[: max(len(finished_jobs) - MAX_FINISHED_JOBS, 0)]:
+                del self._jobs[finished_job.id]
+        return job
+
+    def get(self, job_id: str):
+        """
+        :return: The job with the given ID, or None if there is no such job.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        """
+        :return: The known jobs, in the order they were submitted.
+        """
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job: CaptureJob):
+        """
+        Cancels a queued job, or stops a running one (its results so far are kept).
+        """
+        job.cancelled.set()
+        with self._lock:
+            if job in self._pending:
+                self._pending.remove(job)
+                job.finish(status="cancelled")
+            else:
+                self._stop_run(job=job)
+
+    def _stop_run(self, job: CaptureJob):
+        """
+        Stops a job's run now, rather than when its next result comes in. Called with the lock held.
+        """
+        # The job's cancelled event is its run's stop event, which stops its crawling and workers as soon as it
+        # is set. Its pending retries are cancelled too, if the run has started (and is still the current run).
+        job.cancelled.set()
+        if job is self._running and self.tor2tor.stop_event is job.cancelled:
+            self.tor2tor.stop()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._pending_condition.wait_for(lambda: self._pending or self._stopping)
+                if self._stopping:
+                    return
+                job = self._pending.pop(0)
+            self._run_job(job=job)
+
+    def _run_job(self, job: CaptureJob):
+        job.status = "running"
+        job.started_at = time.time()
+        log.info(f"Running job {job.id} ({job.onion})...")
+
+        def feed(tasks_queue):
+            # The onion is recorded in the capture index (as crawled onions are), so its capture is indexed
+            capture_key = construct_output_name(url=job.onion)
+            self.tor2tor.capture_index.mark_pending(key=capture_key, url=job.onion, seed=capture_key)
+            tasks_queue.put(CaptureTask(index=1, onion=job.onion))
+
+        try:
+            with open_sink(file_path=job.results_file) as results_sink:
+                results = self.tor2tor.run_seed(
+                    seed_onion=job.onion,
+                    worker_threads=self.worker_threads,
+                    depth=job.depth,
+                    limit=job.limit,
+                    # Jobs that don't crawl are fed their onion directly, instead of the onions linked from it
+                    feed=None if job.crawl else feed,
+                    stop_event=job.cancelled,
+                )
+                with self._lock:
+                    self._running = job
+                try:
+                    for result in results:
+                        results_sink.write(result=result)
+                        job.add_result(result=result)
+                        if job.cancelled.is_set():
+                            break
+                finally:
+                    with self._lock:
+                        self._running = None
+                    # Waits for the job's workers to stop, if it was cancelled
+                    results.close()
+        except Exception as e:
+            log.error(f"Job {job.id} failed: [red]{e}[/]")
+            job.finish(status="failed", error=str(e))
+        else:
+            job.finish(status="cancelled" if job.cancelled.is_set() else "done")
+            log.info(f"Job {job.id} {job.status} with {len(job.results)} results.")
+
+    def stop(self):
+        """
+        Stops running jobs after the current one. Queued jobs are cancelled.
+        """
+        with self._lock:
+            self._stopping = True
+            for job in self._pending:
+                job.finish(status="cancelled")
+            self._pending.clear()
+            self._pending_condition.notify_all()
+            if self._running is not None:
+                self._stop_run(job=self._running)
+        self._thread.join()
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    An HTTP server listening on a Unix socket.
+    """
+
+    daemon_threads = True
+
+
+class DaemonServer:
+    """
+    Serves the daemon's job API over HTTP, on a local TCP port or a Unix socket:
+
+    - POST /jobs: submits a job ({"onion": ..., "crawl": false, "depth": 1, "limit": 10}), returns its summary.
+    - GET /jobs: lists the jobs' summaries.
+    - GET /jobs/<id>: returns a job's summary.
+    - GET /jobs/<id>/results: streams a job's results as JSON lines, as they are produced, until the job finishes.
+    - DELETE /jobs/<id>: cancels a queued job, or stops a running one.
+    - GET /health: returns the state of the pool.
+    - GET /metrics: returns the metrics, in the Prometheus text format.
+    """
+
+    def __init__(
+        self,
+        job_manager: JobManager,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        socket_path: str = None,
+    ):
+        """
+        :param job_manager: The job manager to submit jobs to.
+        :param host: Address to listen on. Only the local host by default.
+        :param port: Port to listen on.
+        :param socket_path: If set, the API listens on this Unix socket instead of a TCP port.
+        """
+        tor2tor = job_manager.tor2tor
+
+        class APIHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send_json(self, status: int, body):
+                data = (json.dumps(body, default=str) + "\n").encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def find_job(self, job_id: str):
+                job = job_manager.get(job_id=job_id)
+                if job is None:
+                    self.send_json(404, {"error": f"No job {job_id}."})
+                return job
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts == ["health"]:
+                    self.send_json(
+                        200,
+                        {
+                            "pool_size": tor2tor.pool_size,
+                            "pool_idle": tor2tor.firefox_pool.qsize()
+                            if tor2tor.firefox_pool is not None
+                            else 0,
+                            "jobs": len(job_manager.jobs()),
+                        },
+                    )
+                elif parts == ["metrics"]:
+                    data = tor2tor.metrics.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                elif parts == ["jobs"]:
+                    self.send_json(200, [job.summary() for job in job_manager.jobs()])
+                elif len(parts) == 2 and parts[0] == "jobs":
+                    job = self.find_job(job_id=parts[1])
+                    if job is not None:
+                        self.send_json(200, job.summary())
+                elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "results":
+                    job = self.find_job(job_id=parts[1])
+                    if job is not None:
+                        self.stream_results(job=job)
+                else:
+                    self.send_json(404, {"error": "Not found."})
+
+            def stream_results(self, job: CaptureJob):
+                # Results are sent in chunks as they are produced, so clients can follow a job live
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for result in job.iter_results():
+                        data = (json.dumps(result, default=str) + "\n").encode("utf-8")
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def do_POST(self):
+                if self.path.split("?")[0].strip("/") != "jobs":
+                    self.send_json(404, {"error": "Not found."})
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    onion = str(body["onion"])
+                    crawl = bool(body.get("crawl", False))
+                    depth = int(body.get("depth", 1))
+                    limit = int(body.get("limit", 10))
+                except (KeyError, TypeError, ValueError) as e:
+                    self.send_json(400, {"error": f"Invalid job: {e}"})
+                    return
+
+                if not is_valid_onion(url=onion):
+                    self.send_json(400, {"error": f"{onion} does not seem to be a valid onion."})
+                    return
+
+                job = job_manager.submit(
+                    job=CaptureJob(onion=onion, crawl=crawl, depth=depth, limit=limit)
+                )
+                self.send_json(202, job.summary())
+
+            def do_DELETE(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if len(parts) != 2 or parts[0] != "jobs":
+                    self.send_json(404, {"error": "Not found."})
+                    return
+                job = self.find_job(job_id=parts[1])
+                if job is not None:
+                    job_manager.cancel(job=job)
+                    self.send_json(200, job.summary())
+
+            def address_string(self):
+                # Unix socket clients have no address
+                return self.client_address[0] if self.client_address else "unix"
+
+            def log_message(self, format, *args):
+                log.debug(f"API: {format % args}")
+
+        self.socket_path = socket_path
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._server = ThreadingUnixHTTPServer(socket_path, APIHandler)
+            self.address = socket_path
+        else:
+            self._server = ThreadingHTTPServer((host, port), APIHandler)
+            self._server.daemon_threads = True
+            self.address = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops serving the API.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
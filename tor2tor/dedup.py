@@ -0,0 +1,212 @@
+import os
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+
+# Side length of the downscaled image the DCT is computed on, and of the low-frequency block that is hashed
+HASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
+
+# Number of differing bits under which two screenshots are considered near-duplicates (out of 64)
+DEFAULT_THRESHOLD = 6
+
+DUPLICATE_ACTIONS = ["keep", "hardlink", "drop"]
+
+# Number of set bits in each byte value, for counting bits on NumPy versions without bitwise_count()
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    # Orthonormal DCT-II basis, so the 2D DCT of an image is matrix @ image @ matrix.T
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT_MATRIX = _dct_matrix(HASH_IMAGE_SIZE)
+
+
+def perceptual_hash(image) -> int:
+    """
+    Computes the DCT-based perceptual hash (pHash) of a screenshot.
+
+    Screenshots of the same page with minor differences (ads, counters, timestamps, rendering noise)
+    get hashes that differ in a few bits only.
+
+    :param image: Path to the screenshot, or an already opened PIL image.
+    :return: The 64-bit perceptual hash.
+    """
+    from PIL import Image
+
+    if isinstance(image, str):
+        with Image.open(image) as opened_image:
+            return perceptual_hash(opened_image)
+
+    pixels = np.asarray(
+        image.convert("L").resize(
+            (HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.Resampling.LANCZOS
+        ),
+        dtype=np.float64,
+    )
+    coefficients = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+
+    # The DC coefficient is left out of the median, as it only reflects the overall brightness
+    bits = (coefficients > np.median(coefficients.flatten()[1:])).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(hashes: np.ndarray, phash: int) -> np.ndarray:
+    """
+    Computes the Hamming distances between a hash and an array of hashes.
+
+    :param hashes: An array of 64-bit hashes (uint64).
+    :param phash: The hash to compare them to.
+    :return: An array of the number of differing bits of each hash.
+    """
+    differences = np.bitwise_xor(hashes, np.uint64(phash))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(differences)
+    return _POPCOUNT_TABLE[differences.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class DuplicateIndex:
+    """
+    An in-memory index of screenshots' perceptual hashes that finds near-duplicate screenshots.
+
+    The hashes are kept in a contiguous uint64 array, so a lookup is a single vectorised
+    XOR and bit count over the whole archive, which stays fast for hundreds of thousands of hashes.
+    Every screenshot belongs to a cluster, whose first screenshot is its canonical copy. When a screenshot is
+    captured again, its previous entry leaves its cluster (so the next screenshot of the cluster becomes
+    the canonical copy, if it was the first) before the new one is added.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, capacity: int = 1024):
+        """
+        :param threshold: Maximum number of differing bits for two screenshots to be near-duplicates.
+        :param capacity: Number of hashes to allocate room for up front. The index grows as needed.
+        """
+        self.threshold = threshold
+
+        self._lock = Lock()
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._positions = {}
+        self._keys = []
+        self._files = []
+        self._clusters = []
+        self._members = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _append(self, key: str, file_path: str, phash: int, cluster: int):
+        count = len(self._keys)
+        if count == len(self._hashes):
+            # Double the arrays, so adding hashes stays amortised O(1)
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+            self._active = np.concatenate([self._active, np.zeros_like(self._active)])
+
+        self._hashes[count] = phash
+        self._active[count] = True
+        self._positions[key] = count
+        self._keys.append(key)
+        self._files.append(file_path)
+        self._clusters.append(cluster)
+        self._members.setdefault(cluster, []).append(key)
+
+    def _remove(self, key: str):
+        position = self._positions.pop(key)
+        self._active[position] = False
+
+        cluster = self._clusters[position]
+        members = self._members[cluster]
+        members.remove(key)
+        if not members:
+            del self._members[cluster]
+
+    def _canonical(self, cluster: int) -> tuple:
+        # The first remaining member of a cluster is its canonical copy
+        key = self._members[cluster][0]
+        return key, self._files[self._positions[key]]
+
+    def load(self, entries: list):
+        """
+        Loads already clustered screenshots (e.g. from the capture index) without comparing them again.
+
+        :param entries: A list of (key, file, phash, canonical key) tuples.
+            The canonical key is None for screenshots that are not duplicates.
+        """
+        with self._lock:
+            positions = {}
+            duplicates = []
+            for key, file_path, phash, canonical_key in entries:
+                if canonical_key is None or canonical_key == key:
+                    positions[key] = len(self._keys)
+                    self._append(key=key, file_path=file_path, phash=phash, cluster=positions[key])
+                else:
+                    duplicates.append((key, file_path, phash, canonical_key))
+
+            for key, file_path, phash, canonical_key in duplicates:
+                # The first duplicate of a canonical copy that is no longer indexed takes its place
+                cluster = positions.setdefault(canonical_key, len(self._keys))
+                self._append(key=key, file_path=file_path, phash=phash, cluster=cluster)
+
+    def add(self, key: str, file_path: str, phash: int) -> Optional[tuple]:
+        """
+        Adds a screenshot to the index.
+
+        :param key: The capture key (output name) of the screenshot's onion.
+        :param file_path: Path to the screenshot.
+        :param phash: The screenshot's perceptual hash.
+        :return: A (key, file) tuple of the canonical copy of the screenshot's cluster if it is a near-duplicate,
+            None otherwise.
+        """
+        with self._lock:
+            if key in self._positions:
+                # A screenshot that is captured again replaces its previous hash
+                self._remove(key)
+
+            count = len(self._keys)
+            cluster = count
+            if self._positions:
+                distances = hamming_distances(hashes=self._hashes[:count], phash=phash)
+                distances[~self._active[:count]] = HASH_SIZE * HASH_SIZE + 1
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= self.threshold:
+                    cluster = self._clusters[nearest]
+
+            self._append(key=key, file_path=file_path, phash=phash, cluster=cluster)
+
+            if cluster == count:
+                return None
+            return self._canonical(cluster)
+
+    def clusters(self, keys: set = None) -> list:
+        """
+        Gets the clusters of near-duplicate screenshots.
+
+        :param keys: If given, only clusters containing at least one of these capture keys are returned.
+        :return: A list of (canonical key, canonical file, [duplicate keys]) tuples, largest clusters first.
+        """
+        with self._lock:
+            clusters = [
+                (*self._canonical(cluster), members[1:])
+                for cluster, members in self._members.items()
+                if len(members) > 1 and (keys is None or not keys.isdisjoint(members))
+            ]
+        return sorted(clusters, key=lambda cluster: len(cluster[2]), reverse=True)
+
+
+def link_duplicate(file_path: str, canonical_path: str):
+    """
+    Replaces a screenshot with a hardlink to the canonical copy of its cluster.
+
+    :param file_path: Path to the duplicate screenshot.
+    :param canonical_path: Path to the canonical copy.
+    :raise OSError: If the hardlink cannot be created (e.g. across filesystems). The screenshot is then kept.
+    """
+    temporary_path = f"{file_path}.link"
+    os.link(canonical_path, temporary_path)
+    os.replace(temporary_path, file_path)
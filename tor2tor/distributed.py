@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+from threading import Lock
+from typing import Iterator, NamedTuple, Optional
+
+# Seconds a claimed task is leased to a worker for, unless the worker renews the lease
+DEFAULT_LEASE_SECONDS = 300
+
+# Number of times a task is leased before it is given up on (e.g. because its workers keep dying)
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class LeasedTask(NamedTuple):
+    """
+    A task claimed from a LeaseQueue.
+    """
+
+    id: int
+    seed: str
+    key: str
+    index: int
+    onion: str
+    attempts: int
+
+
+def default_worker_id() -> str:
+    """
+    :return: An identifier of the current process that is unique across nodes (hostname and PID).
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseQueue:
+    """
+    A work queue shared by several tor2tor processes, possibly on different nodes, backed by an SQLite
+    database (e.g. on a shared volume).
+
+    A coordinator publishes onions to capture. Workers claim them, which leases them for a number of seconds,
+    and acknowledge them with their results. Leases that expire without being renewed or acknowledged
+    (e.g. because the worker died) make their tasks claimable again, up to a maximum number of attempts.
+    The coordinator reads the acknowledged results back to merge them centrally.
+
+    The database uses SQLite's rollback journal rather than WAL, because WAL needs shared memory,
+    which processes on different hosts don't have. Claims are serialised with BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        """
+        :param database_path: Path to the SQLite database file.
+        :param lease_seconds: Seconds a claimed task is leased for.
+        :param max_attempts: Number of times a task is leased before it is failed.
+        """
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.database_path = database_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        # The connection is shared by the process' threads, so access to it is serialised with a lock
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            database_path, timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=DELETE")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seed TEXT NOT NULL,
+                key TEXT NOT NULL,
+                onion_index INTEGER NOT NULL,
+                onion TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                published_at REAL,
+                claimed_at REAL,
+                finished_at REAL,
+                finished_sequence INTEGER,
+                result TEXT,
+                UNIQUE (seed, key)
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_finished ON tasks (seed, finished_sequence)"
+        )
+        # Lets _finish() find the last sequence number without scanning the table
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_finished_sequence ON tasks (finished_sequence)"
+        )
+
+    def _finish(self, task_id: int, state: str, result: dict) -> bool:
+        # Finished tasks are numbered in the order they finish, so results can be read back incrementally.
+        # (This runs in a write transaction, so the numbers are unique across processes.)
+        cursor = self._connection.execute(
+            """
+            UPDATE tasks SET state = ?, finished_at = ?, lease_owner = NULL, result = ?,
+                finished_sequence = COALESCE((SELECT MAX(finished_sequence) FROM tasks), 0) + 1
+            WHERE id = ? AND state NOT IN ('done', 'failed')
+            """,
+            (state, time.time(), json.dumps(result, default=str), task_id),
+        )
+        return cursor.rowcount > 0
+
+    def publish(self, seed: str, key: str, onion_index: int, onion: str) -> bool:
+        """
+        Publishes an onion to capture. An onion that was already published for the seed is not published again.
+
+        :param seed: The seed onion the onion was found from.
+        :param key: The capture key (output name) of the onion.
+        :param onion_index: Index of the onion in the seed's crawl.
+        :param onion: The onion url.
+        :return: True if the onion was published, False if it already was.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                """
+                INSERT OR IGNORE INTO tasks (seed, key, onion_index, onion, published_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (seed, key, onion_index, onion, time.time()),
+            )
+        return cursor.rowcount > 0
+
+    def _expire(self, now: float, seed: str = None) -> int:
+        seed_filter = "AND seed = ?" if seed is not None else ""
+        seed_parameters = (seed,) if seed is not None else ()
+
+        # Tasks whose last lease expired after their final attempt are given up on
+        expired_rows = self._connection.execute(
+            f"""
+            SELECT id FROM tasks
+            WHERE state = 'leased' AND lease_expires < ? AND attempts >= ? {seed_filter}
+            """,
+            (now, self.max_attempts) + seed_parameters,
+        ).fetchall()
+        for row in expired_rows:
+            self._finish(
+                task_id=row["id"],
+                state="failed",
+                result={"status": "skipped", "reason": "lease expired"},
+            )
+
+        # The others can be claimed again
+        cursor = self._connection.execute(
+            f"""
+            UPDATE tasks SET state = 'pending', lease_owner = NULL, lease_expires = NULL
+            WHERE state = 'leased' AND lease_expires < ? {seed_filter}
+            """,
+            (now,) + seed_parameters,
+        )
+        return len(expired_rows) + cursor.rowcount
+
+    def expire_leases(self, seed: str = None) -> int:
+        """
+        Makes the tasks whose lease has expired (e.g. because their worker died) claimable again,
+        or fails them if they have used up their attempts.
+
+        This is also done by claim(), but the coordinator does it too, so tasks don't stay leased
+        when no worker is left to claim them.
+
+        :param seed: If set, only the leases of tasks of this seed are expired.
+        :return: The number of expired leases.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._expire(now=time.time(), seed=seed)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return expired
+
+    def claim(self, worker_id: str, seed: str = None, limit: int = 1) -> list:
+        """
+        Claims pending tasks (and tasks whose lease has expired), leasing them to a worker.
+        Expired tasks that have used up their attempts are failed instead.
+
+        :param worker_id: Identifier of the claiming worker.
+        :param seed: If set, only tasks of this seed are claimed.
+        :param limit: Maximum number of tasks to claim.
+        :return: A list of the claimed LeasedTasks.
+        """
+        now = time.time()
+        seed_filter = "AND seed = ?" if seed is not None else ""
+        seed_parameters = (seed,) if seed is not None else ()
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire(now=now, seed=seed)
+                rows = self._connection.execute(
+                    f"""
+                    SELECT * FROM tasks WHERE state = 'pending' {seed_filter}
+                    ORDER BY id LIMIT ?
+                    """,
+                    seed_parameters + (limit,),
+                ).fetchall()
+                self._connection.executemany(
+                    """
+                    UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_owner = ?,
+                        lease_expires = ?, claimed_at = ?
+                    WHERE id = ?
+                    """,
+                    [(worker_id, now + self.lease_seconds, now, row["id"]) for row in rows],
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+        return [
+            LeasedTask(
+                id=row["id"],
+                seed=row["seed"],
+                key=row["key"],
+                index=row["onion_index"],
+                onion=row["onion"],
+                attempts=row["attempts"] + 1,
+            )
+            for row in rows
+        ]
+
+    def renew(self, task_ids: list, worker_id: str):
+        """
+        Extends the leases a worker holds on tasks it is still working on.
+
+        :param task_ids: IDs of the tasks.
+        :param worker_id: Identifier of the worker holding the leases.
+        """
+        with self._lock:
+            self._connection.executemany(
+                """
+                UPDATE tasks SET lease_expires = ?
+                WHERE id = ? AND lease_owner = ? AND state = 'leased'
+                """,
+                [(time.time() + self.lease_seconds, task_id, worker_id) for task_id in task_ids],
+            )
+
+    def ack(self, task_id: int, result: dict) -> bool:
+        """
+        Acknowledges a task with its result.
+
+        A result is accepted even if the task's lease has expired meanwhile, as long as no other worker
+        has acknowledged the task yet, so the work isn't lost.
+
+        :param task_id: ID of the task.
+        :param result: The task's result (see sinks.RESULT_FIELDS).
+        :return: True if the result was accepted, False if the task had already been finished.
+        """
+        state = "failed" if result.get("status") == "skipped" else "done"
+        with self._lock:
+            return self._finish(task_id=task_id, state=state, result=result)
+
+    def release(self, task_ids: list, worker_id: str):
+        """
+        Gives up a worker's leases on tasks it won't work on (e.g. because it is stopping),
+        so they can be claimed straight away by other workers.
+
+        :param task_ids: IDs of the tasks.
+        :param worker_id: Identifier of the worker holding the leases.
+        """
+        with self._lock:
+            self._connection.executemany(
+                """
+                UPDATE tasks SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL,
+                    lease_expires = NULL
+                WHERE id = ? AND lease_owner = ? AND state = 'leased'
+                """,
+                [(task_id, worker_id) for task_id in task_ids],
+            )
+
+    def next_seed(self) -> Optional[str]:
+        """
+        :return: The oldest seed with claimable tasks, or None if there are none.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                """
+                SELECT seed FROM tasks
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (time.time(),),
+            ).fetchone()
+        return row["seed"] if row is not None else None
+
+    def counts(self, seed: str) -> dict:
+        """
+        :param seed: The seed onion.
+        :return: A dictionary mapping each task state (pending, leased, done, failed) to the seed's number of tasks.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT state, COUNT(*) AS count FROM tasks WHERE seed = ? GROUP BY state",
+                (seed,),
+            ).fetchall()
+        return {row["state"]: row["count"] for row in rows}
+
+    def results(self, seed: str, after: int = 0) -> Iterator[tuple]:
+        """
+        Reads back the results of a seed's finished tasks, in the order they finished.
+
+        :param seed: The seed onion.
+        :param after: Only tasks that finished after the one with this sequence number are read
+            (to read results incrementally).
+        :return: A generator yielding a (sequence number, LeasedTask, result, claimed_at, finished_at) tuple
+            for each finished task.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT * FROM tasks
+                WHERE seed = ? AND finished_sequence > ? ORDER BY finished_sequence
+                """,
+                (seed, after),
+            ).fetchall()
+
+        for row in rows:
+            task = LeasedTask(
+                id=row["id"],
+                seed=row["seed"],
+                key=row["key"],
+                index=row["onion_index"],
+                onion=row["onion"],
+                attempts=row["attempts"],
+            )
+            yield (
+                row["finished_sequence"],
+                task,
+                json.loads(row["result"] or "{}"),
+                row["claimed_at"],
+                row["finished_at"],
+            )
+
+    def close(self):
+        """
+        Closes the queue's database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class PublishingQueue:
+    """
+    A stand-in for the tasks queue that Tor2Tor.crawl_onions() feeds, which publishes the onions
+    to a LeaseQueue instead of capturing them locally.
+    """
+
+    def __init__(self, lease_queue: LeaseQueue, seed: str, key_function):
+        """
+        :param lease_queue: The queue to publish the onions to.
+        :param seed: The seed onion that is being crawled.
+        :param key_function: A function returning the capture key of an onion url.
+        """
+        self.lease_queue = lease_queue
+        self.seed = seed
+        self.key_function = key_function
+        self.published = 0
+
+    def put(self, task):
+        """
+        Publishes a task (a CaptureTask) to the lease queue.
+        """
+        index, onion = task[0], task[1]
+        if self.lease_queue.publish(
+            seed=self.seed, key=self.key_function(onion), onion_index=index, onion=onion
+        ):
+            self.published += 1
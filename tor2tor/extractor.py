@@ -0,0 +1,59 @@
+import re
+import html
+from typing import Iterable, Iterator
+
+from .coreutils import is_valid_onion
+
+# Matches the http(s) URL in the href attribute of an <a> tag.
+ANCHOR_HREF_PATTERN = re.compile(
+    rb"""<a\s[^>]{0,1024}?\bhref\s*=\s*["']?\s*(https?://[^\s"'<>]{1,2048})""",
+    re.IGNORECASE,
+)
+
+# Number of bytes kept between chunks, so a tag split across two chunks is still matched.
+# It has to be longer than the longest possible match of ANCHOR_HREF_PATTERN.
+CHUNK_OVERLAP = 4096
+
+
+def iter_onion_links(chunks: Iterable[bytes], max_bytes: int = None) -> Iterator[str]:
+    """
+    Extracts valid onion URLs from the <a href> attributes of an HTML document, in a single streaming pass.
+
+    The document is read chunk by chunk, so only a small window of it is held in memory at a time.
+
+    :param chunks: The HTML document's chunks (e.g. from requests.Response.iter_content()).
+    :param max_bytes: Maximum number of bytes to read from the document. If None, the whole document is read.
+    :return: A generator yielding the valid onion URLs, in the order they appear in the document.
+    """
+    buffer = b""
+    bytes_read = 0
+
+    for chunk in chunks:
+        if max_bytes is not None and bytes_read + len(chunk) > max_bytes:
+            chunk = chunk[: max_bytes - bytes_read]
+
+        bytes_read += len(chunk)
+        buffer += chunk
+        if max_bytes is not None and bytes_read >= max_bytes:
+            # The size cap has been reached, so the rest of the document is ignored
+            break
+
+        # A match ending inside the overlap might continue in the next chunk, so it is left for later
+        safe_end = len(buffer) - CHUNK_OVERLAP
+        keep_from = max(safe_end, 0)
+        for match in ANCHOR_HREF_PATTERN.finditer(buffer):
+            if match.end() >= safe_end:
+                keep_from = min(keep_from, match.start())
+                break
+            yield from _valid_onions(match=match)
+
+        buffer = buffer[keep_from:]
+
+    for match in ANCHOR_HREF_PATTERN.finditer(buffer):
+        yield from _valid_onions(match=match)
+
+
+def _valid_onions(match: re.Match) -> Iterator[str]:
+    url = html.unescape(match.group(1).decode("utf-8", errors="replace"))
+    if is_valid_onion(url):
+        yield url
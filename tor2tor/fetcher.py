@@ -0,0 +1,377 @@
+import time
+import asyncio
+from threading import Condition, Thread
+from typing import Callable, Optional
+
+import aiohttp
+import requests
+from aiohttp_socks import ProxyConnector
+from requests.adapters import HTTPAdapter
+
+from .cache import ResponseCache
+from .metrics import Metrics
+from .shards import TorShards
+
+
+def open_endpoint_sessions(
+    tor_shards: TorShards, concurrency: int, timeout: aiohttp.ClientTimeout
+) -> dict:
+    """
+    Opens an aiohttp session for each Tor SOCKS endpoint, so connections are pooled per endpoint.
+    Must be called from a running event loop.
+
+    :param tor_shards: The Tor SOCKS endpoints.
+    :param concurrency: Maximum number of connections of each session.
+    :param timeout: The sessions' timeouts.
+    :return: A dictionary mapping each (host, port) endpoint to its session.
+    """
+    return {
+        (host, port): aiohttp.ClientSession(
+            connector=ProxyConnector.from_url(
+                f"socks5://{host}:{port}", rdns=True, limit=concurrency
+            ),
+            timeout=timeout,
+        )
+        for host, port in tor_shards.endpoints
+    }
+
+
+class OnionFetcher:
+    """
+    Fetches onion pages through SOCKS5 proxies, with pooled connections and connect/read timeouts.
+
+    Single pages are fetched with a pooled requests.Session, and batches of pages
+    are fetched concurrently on an asyncio event loop with aiohttp.
+    Each fetch goes through one of the Tor SOCKS endpoints assigned by the given shards.
+    Pages fetched with fetch() and fetch_many() are served from (and stored in) the response cache, if given.
+    """
+
+    def __init__(
+        self,
+        tor_shards: TorShards,
+        connect_timeout: float = 30,
+        read_timeout: float = 60,
+        concurrency: int = 8,
+        max_bytes: int = None,
+        metrics: Metrics = None,
+        cache: ResponseCache = None,
+    ):
+        """
+        :param tor_shards: The Tor SOCKS endpoints to fetch through.
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait between bytes received from the server.
+        :param concurrency: Maximum number of pages to fetch at once.
+        :param max_bytes: Maximum number of bytes to read from a page fetched with fetch_many().
+            If None, whole pages are read.
+        :param metrics: The metrics to record fetch latencies and errors in.
+        :param cache: The cache of fetched pages. If None, pages are always fetched.
+        """
+        self.tor_shards = tor_shards
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.metrics = metrics or Metrics()
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, stream: bool = False) -> requests.Response:
+        """
+        Fetches a single page.
+
+        :param url: The URL to fetch.
+        :param stream: If True, the body is not downloaded until it is read from the response.
+        :return: The response.
+        """
+        endpoint = self.tor_shards.acquire()
+        host, port = endpoint
+
+        # socks5h makes the proxy resolve the onion hostnames
+        proxy_url = f"socks5h://{host}:{port}"
+
+        start_time = time.perf_counter()
+        try:
+            response = self.session.get(
+                url,
+                proxies={"http": proxy_url, "https": proxy_url},
+                timeout=(self.connect_timeout, self.read_timeout),
+                stream=stream,
+            )
+            self.metrics.increment("fetches", status="ok")
+            return response
+        except Exception:
+            self.metrics.increment("fetches", status="error")
+            raise
+        finally:
+            # For streamed responses, this is the time until the headers were received
+            self.metrics.observe("fetch_seconds", time.perf_counter() - start_time)
+            self.tor_shards.release(endpoint=endpoint)
+
+    def _count_cache(self, outcome: str):
+        self.cache.count(outcome=outcome)
+        self.metrics.increment("cache_lookups", result=outcome)
+
+    def _cached(self, url: str) -> tuple:
+        # Returns a fresh cached body (or None), and the cached page to revalidate otherwise
+        if self.cache is None:
+            return None, None
+        entry = self.cache.get(url=url)
+        if entry is not None and entry["fresh"]:
+            self._count_cache(outcome="hit")
+            return entry["body"], entry
+        return None, entry
+
+    def _update_cache(
+        self, url: str, entry: dict, status: int, headers, body: Optional[bytes]
+    ) -> Optional[bytes]:
+        # Returns the cached body if the server answered that it hasn't changed, and caches new bodies
+        if self.cache is None:
+            return body
+        if status == 304 and entry is not None:
+            self.cache.revalidate(url=url)
+            self._count_cache(outcome="revalidated")
+            return entry["body"]
+
+        self._count_cache(outcome="miss")
+        if status == 200:
+            self.cache.store(
+                url=url,
+                body=body,
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+            )
+        elif entry is not None:
+            # The cached page (and its links) no longer reflects what the server serves
+            self.cache.discard(url=url)
+        return body
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Fetches a single page's body (up to max_bytes), through the response cache.
+
+        :param url: The URL to fetch.
+        :return: The page's body.
+        """
+        body, entry = self._cached(url=url)
+        if body is not None:
+            return body
+
+        endpoint = self.tor_shards.acquire()
+        host, port = endpoint
+        proxy_url = f"socks5h://{host}:{port}"
+
+        start_time = time.perf_counter()
+        try:
+            with self.session.get(
+                url,
+                proxies={"http": proxy_url, "https": proxy_url},
+                timeout=(self.connect_timeout, self.read_timeout),
+                headers=ResponseCache.validators(entry=entry),
+                stream=True,
+            ) as response:
+                body = bytearray()
+                if response.status_code != 304:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        body += chunk
+                        if self.max_bytes is not None and len(body) >= self.max_bytes:
+                            break
+                body = bytes(body[: self.max_bytes])
+            self.metrics.increment("fetches", status="ok")
+        except Exception:
+            self.metrics.increment("fetches", status="error")
+            raise
+        finally:
+            self.metrics.observe("fetch_seconds", time.perf_counter() - start_time)
+            self.tor_shards.release(endpoint=endpoint)
+
+        return self._update_cache(
+            url=url, entry=entry, status=response.status_code, headers=response.headers, body=body
+        )
+
+    async def _fetch(
+        self, sessions: dict, semaphore: asyncio.Semaphore, url: str
+    ) -> tuple:
+        body, entry = self._cached(url=url)
+        if body is not None:
+            return url, body
+
+        async with semaphore:
+            endpoint = self.tor_shards.acquire()
+            start_time = time.perf_counter()
+            try:
+                async with sessions[endpoint].get(
+                    url, headers=ResponseCache.validators(entry=entry)
+                ) as response:
+                    if self.max_bytes is None:
+                        body = await response.read()
+                    else:
+                        # Stop reading once the size cap is reached
+                        body = bytearray()
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            body += chunk
+                            if len(body) >= self.max_bytes:
+                                break
+                        body = bytes(body[: self.max_bytes])
+                    status, headers = response.status, response.headers
+
+                self.metrics.increment("fetches", status="ok")
+                return url, self._update_cache(
+                    url=url, entry=entry, status=status, headers=headers, body=body
+                )
+            except Exception as e:
+                self.metrics.increment("fetches", status="error")
+                return url, e
+            finally:
+                self.metrics.observe("fetch_seconds", time.perf_counter() - start_time)
+                self.tor_shards.release(endpoint=endpoint)
+
+    async def _fetch_many(self, urls: list) -> list:
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sessions = open_endpoint_sessions(
+            tor_shards=self.tor_shards, concurrency=self.concurrency, timeout=timeout
+        )
+
+        try:
+            return await asyncio.gather(
+                *(self._fetch(sessions=sessions, semaphore=semaphore, url=url) for url in urls)
+            )
+        finally:
+            for session in sessions.values():
+                await session.close()
+
+    def fetch_many(self, urls: list) -> list:
+        """
+        Fetches a batch of pages concurrently.
+
+        :param urls: The URLs to fetch.
+        :return: A list of (url, content) tuples in the order of the given URLs,
+            where content is either the page's body (bytes) or the exception raised while fetching it.
+        """
+        return asyncio.run(self._fetch_many(urls=urls))
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
+
+
+class LivenessProber:
+    """
+    A pre-flight stage in front of the tasks queue, which probes onions with a short deadline
+    before they are captured, so dead onions don't tie up a WebDriver instance until the browser times out.
+
+    Onions are probed concurrently (with their own concurrency, separate from the browsers') on an asyncio
+    event loop running in a background thread. An onion that answers with any HTTP response is forwarded
+    to the tasks queue. An onion that doesn't is handed to a callback instead, with the error.
+    """
+
+    def __init__(
+        self,
+        tasks_queue,
+        on_dead: Callable,
+        tor_shards: TorShards,
+        timeout: float = 15,
+        concurrency: int = 32,
+        metrics: Metrics = None,
+    ):
+        """
+        :param tasks_queue: The queue where responsive onions are added (anything with a put() method).
+        :param on_dead: A function called with the task, the error and the start time (Unix timestamp)
+            of the probe of each onion that failed its probe.
+        :param tor_shards: The Tor SOCKS endpoints to probe through.
+        :param timeout: Seconds an onion has to respond to its probe.
+        :param concurrency: Maximum number of onions to probe at once.
+        :param metrics: The metrics to record probe latencies and outcomes in.
+        """
+        self.tasks_queue = tasks_queue
+        self.on_dead = on_dead
+        self.tor_shards = tor_shards
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.metrics = metrics or Metrics()
+        self.alive = 0
+        self.dead = 0
+
+        # Number of probes that haven't finished yet
+        self._pending = 0
+        self._pending_condition = Condition()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    async def _open(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._sessions = open_endpoint_sessions(
+            tor_shards=self.tor_shards,
+            concurrency=self.concurrency,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def _close(self):
+        for session in self._sessions.values():
+            await session.close()
+
+    async def _probe(self, task):
+        error = None
+        try:
+            async with self._semaphore:
+                endpoint = self.tor_shards.acquire()
+                started_at = time.time()
+                start_time = time.perf_counter()
+                try:
+                    # Any response means the onion is up (the body isn't read)
+                    async with self._sessions[endpoint].get(task[1], allow_redirects=False):
+                        pass
+                except Exception as e:
+                    error = e
+                finally:
+                    self.metrics.observe("probe_seconds", time.perf_counter() - start_time)
+                    self.tor_shards.release(endpoint=endpoint)
+
+            if error is None:
+                self.alive += 1
+                self.metrics.increment("probes", status="alive")
+                self.tasks_queue.put(task)
+            else:
+                self.dead += 1
+                self.metrics.increment("probes", status="dead")
+                self.on_dead(task, error, started_at)
+        finally:
+            with self._pending_condition:
+                self._pending -= 1
+                self._pending_condition.notify_all()
+
+    def put(self, task):
+        """
+        Probes an onion (a CaptureTask), and adds it to the tasks queue if it responds.
+        """
+        with self._pending_condition:
+            self._pending += 1
+        asyncio.run_coroutine_threadsafe(self._probe(task), self._loop)
+
+    def join(self):
+        """
+        Waits for the probes that haven't finished yet.
+        """
+        with self._pending_condition:
+            self._pending_condition.wait_for(lambda: self._pending == 0)
+
+    def close(self):
+        """
+        Waits for the remaining probes, then closes the probes' connections and stops the event loop.
+        """
+        self.join()
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
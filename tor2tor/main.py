@@ -1,29 +1,159 @@
-from .tor2tor import log, args, Tor2Tor
 from .coreutils import (
-    path_finder,
+    create_parser,
+    set_loglevel,
     is_valid_onion,
+    validate_onions,
+    read_seeds,
+    check_updates_in_background,
 )
 
 
 def execute_tor2tor():
-    target_onion = args.onion
-    tor2tor = Tor2Tor()
+    parser = create_parser()
+    args = parser.parse_args()
+    log = set_loglevel(debug_mode=args.debug)
 
-    if is_valid_onion(url=target_onion):
+    # The daemon is run with either tor2tor serve or tor2tor --serve
+    serve = args.serve or args.onion == "serve"
+
+    if args.seeds_file is not None:
+        # Batch mode: the seeds are read from a file (or stdin), and the invalid ones
+        # (and the repeated ones, reached through a different url) are left out
+        target_onions, invalid_onions = validate_onions(urls=read_seeds(source=args.seeds_file))
+        for seed_onion in invalid_onions:
+            log.warning(f"{seed_onion} does not seem to be a valid onion.")
+        if not target_onions:
+            log.warning("No valid onions to scrape.")
+            return
+    elif args.onion is not None and not serve:
+        target_onions = [args.onion]
+    elif args.worker_queue is not None or serve:
+        # Queue workers get their onions from the queue, and the daemon from its API
+        target_onions = []
+    else:
+        parser.error("an onion url, --seeds, --queue-worker or --serve is required")
+
+    target_onion = target_onions[0] if target_onions else None
+    if (
+        args.seeds_file is not None
+        or args.worker_queue is not None
+        or serve
+        or is_valid_onion(url=target_onion)
+    ):
         print("""
 ┏┳┓     ┏┳┓    
  ┃ ┏┓┏┓┓ ┃ ┏┓┏┓
  ┻ ┗┛┛ ┗ ┻ ┗┛┛ """
               )
-        path_finder(
-            url=target_onion
-        )  # Create a directory with the onion link as the name.
-
-        tor2tor.execute_scraper(
-            target_onion=target_onion,
-            pool_size=args.pool,
-            worker_threads=args.threads,
+        if args.update_check:
+            check_updates_in_background()
+
+        # Imported here, so the WebDriver dependencies are only loaded when they are needed
+        from .tor2tor import Tor2Tor
+
+        tor2tor = Tor2Tor(
+            headless=args.headless,
+            log_skipped=args.log_skipped,
+            page_load_strategy=args.page_load_strategy,
+            render_profile=args.render_profile,
+            viewport_only=args.viewport_only,
+            navigate_timeout=args.navigate_timeout,
+            settle_timeout=args.settle_timeout,
+            screenshot_timeout=args.screenshot_timeout,
+            tor_instances=args.tor_instances,
+            tor_base_port=args.tor_base_port,
+            socks_ports=args.socks_ports,
+            shard_strategy=args.shard_strategy,
+            fetch_concurrency=args.fetch_concurrency,
+            max_page_size=args.max_page_size,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            probe_timeout=args.probe_timeout,
+            probe_concurrency=args.probe_concurrency,
+            cache=args.cache,
+            cache_ttl=args.cache_ttl,
+            cache_size=args.cache_size,
+            image_format=args.image_format,
+            image_quality=args.image_quality,
+            max_height=args.max_height,
+            thumbnail_width=args.thumbnail_width,
+            postprocess_workers=args.postprocess_workers,
+            duplicates=args.duplicates,
+            duplicate_threshold=args.duplicate_threshold,
+            storage=args.storage,
+            archive_file=args.archive_file,
+            incremental=args.incremental,
+            metrics_port=args.metrics_port,
+            metrics_file=args.metrics_file,
+            metrics_interval=args.metrics_interval,
+            max_retries=args.max_retries,
+            retry_delay=args.retry_delay,
+            tor_control_port=args.tor_control_port,
+            tor_control_password=args.tor_control_password,
+            newnym_after=args.newnym_after,
+            max_per_host=args.max_per_host,
+            autoscale=args.autoscale,
+            min_pool_size=args.min_pool_size,
+            max_pool_size=args.max_pool_size,
+            autoscale_interval=args.autoscale_interval,
         )
 
+        if serve:
+            tor2tor.execute_daemon(
+                pool_size=args.pool,
+                worker_threads=args.threads,
+                host=args.api_host,
+                port=args.api_port,
+                socket_path=args.api_socket,
+            )
+        elif args.worker_queue is not None:
+            tor2tor.execute_queue_worker(
+                queue_file=args.worker_queue,
+                pool_size=args.pool,
+                worker_threads=args.threads,
+                worker_id=args.worker_id,
+                lease_seconds=args.lease_seconds,
+                idle_timeout=args.idle_timeout,
+                results_file=args.results_file,
+                results_format=args.results_format,
+            )
+        elif args.coordinator_queue is not None:
+            tor2tor.execute_coordinator(
+                target_onions=target_onions,
+                queue_file=args.coordinator_queue,
+                depth=args.depth,
+                limit=args.limit,
+                resume=args.resume,
+                lease_seconds=args.lease_seconds,
+                results_file=args.results_file,
+                results_format=args.results_format,
+                show_tables=args.show_tables,
+                idle_timeout=args.idle_timeout,
+            )
+        elif args.seeds_file is not None:
+            tor2tor.execute_batch(
+                target_onions=target_onions,
+                pool_size=args.pool,
+                worker_threads=args.threads,
+                depth=args.depth,
+                limit=args.limit,
+                resume=args.resume,
+                results_file=args.results_file,
+                results_format=args.results_format,
+                show_tables=args.show_tables,
+            )
+        else:
+            tor2tor.execute_scraper(
+                target_onion=target_onion,
+                pool_size=args.pool,
+                worker_threads=args.threads,
+                depth=args.depth,
+                limit=args.limit,
+                resume=args.resume,
+                results_file=args.results_file,
+                results_format=args.results_format,
+                show_tables=args.show_tables,
+            )
+
     else:
         log.warning(f"{target_onion} does not seem to be a valid onion.")
@@ -0,0 +1,278 @@
+import os
+import time
+import bisect
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Callable
+
+# Upper bounds (in seconds) of the latency histograms' buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """
+    A thread-safe registry of counters, latency histograms and gauges, rendered in the Prometheus text format.
+
+    Counters and histograms are created the first time they are updated. Gauges are callables
+    that are read whenever the metrics are rendered, so they always show live values.
+    """
+
+    def __init__(self, prefix: str = "tor2tor"):
+        """
+        :param prefix: Prefix of the metric names.
+        """
+        self.prefix = prefix
+
+        self._lock = Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def describe(self, name: str, help_text: str):
+        """
+        Sets the help text of a metric.
+
+        :param name: The metric's name (without the prefix).
+        :param help_text: The help text.
+        """
+        self._help[name] = help_text
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """
+        Increments a counter.
+
+        :param name: The counter's name (without the prefix and the _total suffix).
+        :param amount: The amount to increment the counter by.
+        :param labels: The counter's labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Records a value (e.g. a latency in seconds) in a histogram.
+
+        :param name: The histogram's name (without the prefix).
+        :param value: The value to record.
+        :param labels: The histogram's labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            histogram["buckets"][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Records how long the body of a `with` block takes in a histogram.
+
+        :param name: The histogram's name (without the prefix).
+        :param labels: The histogram's labels.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def set_gauge(self, name: str, function: Callable[[], float]):
+        """
+        Registers a gauge, whose value is read from a function whenever the metrics are rendered.
+
+        :param name: The gauge's name (without the prefix).
+        :param function: A function returning the gauge's current value.
+        """
+        with self._lock:
+            self._gauges[name] = function
+
+    def remove_gauge(self, name: str):
+        """
+        Unregisters a gauge.
+
+        :param name: The gauge's name (without the prefix).
+        """
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def counter_total(self, name: str) -> float:
+        """
+        Gets the total of a counter, across all of its labels.
+
+        :param name: The counter's name (without the prefix and the _total suffix).
+        :return: The counter's total, or 0 if it hasn't been incremented.
+        """
+        with self._lock:
+            return sum(
+                value for (counter_name, _), value in self._counters.items() if counter_name == name
+            )
+
+    def histogram_totals(self, name: str) -> tuple:
+        """
+        Gets the sum and count of a histogram, across all of its labels.
+
+        :param name: The histogram's name (without the prefix).
+        :return: A (sum, count) tuple, or (0, 0) if nothing has been recorded.
+        """
+        with self._lock:
+            histograms = [
+                histogram
+                for (histogram_name, _), histogram in self._histograms.items()
+                if histogram_name == name
+            ]
+            return (
+                sum(histogram["sum"] for histogram in histograms),
+                sum(histogram["count"] for histogram in histograms),
+            )
+
+    def render(self) -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+
+        :return: The rendered metrics.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: dict(histogram, buckets=list(histogram["buckets"]))
+                for key, histogram in self._histograms.items()
+            }
+            gauges = dict(self._gauges)
+
+        lines = []
+        described = set()
+
+        def header(name: str, metric_type: str, suffix: str = ""):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {self.prefix}_{name}{suffix} {self._help[name]}")
+                lines.append(f"# TYPE {self.prefix}_{name}{suffix} {metric_type}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name=name, metric_type="counter", suffix="_total")
+            lines.append(f"{self.prefix}_{name}_total{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            header(name=name, metric_type="histogram")
+            cumulative_count = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+                cumulative_count += count
+                bucket_labels = _format_labels(labels + (("le", bound),))
+                lines.append(f"{self.prefix}_{name}_bucket{bucket_labels} {cumulative_count}")
+            lines.append(f"{self.prefix}_{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{self.prefix}_{name}_count{_format_labels(labels)} {histogram['count']}")
+
+        for name, function in sorted(gauges.items()):
+            try:
+                value = function()
+            except Exception:
+                continue
+            header(name=name, metric_type="gauge")
+            lines.append(f"{self.prefix}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves metrics over HTTP (at /metrics), for Prometheus to scrape or to be watched with curl.
+    """
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1"):
+        """
+        :param metrics: The metrics to serve.
+        :param port: Port to listen on.
+        :param host: Address to listen on. Only the local host by default.
+        """
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Requests are not logged to the console
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops serving the metrics.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFileWriter:
+    """
+    Writes metrics to a file periodically (and once more when stopped), replacing the file atomically.
+    """
+
+    def __init__(self, metrics: Metrics, file_path: str, interval: float = 10):
+        """
+        :param metrics: The metrics to write.
+        :param file_path: Path to the metrics file.
+        :param interval: Seconds between writes.
+        """
+        self.metrics = metrics
+        self.file_path = file_path
+        self.interval = interval
+
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._stop_event = Event()
+        self._thread = Thread(target=self._write_periodically, daemon=True)
+        self._thread.start()
+
+    def write(self):
+        """
+        Writes the current metrics to the file.
+        """
+        temporary_path = f"{self.file_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.metrics.render())
+        os.replace(temporary_path, self.file_path)
+
+    def _write_periodically(self):
+        while not self._stop_event.wait(timeout=self.interval):
+            self.write()
+
+    def stop(self):
+        """
+        Stops the periodic writes, and writes the final metrics.
+        """
+        self._stop_event.set()
+        self._thread.join()
+        self.write()
@@ -0,0 +1,164 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Condition
+from typing import Callable
+
+from .dedup import perceptual_hash
+
+# File extensions and Pillow format names of the supported output formats
+IMAGE_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+
+
+def process_screenshot(
+    file_path: str,
+    image_format: str = "png",
+    quality: int = 80,
+    max_height: int = 0,
+    thumbnail_width: int = 0,
+) -> dict:
+    """
+    Recompresses, crops and thumbnails a screenshot. This runs in a worker process of the post-processing pool.
+
+    The processed screenshot replaces the original one only once it has been fully written.
+
+    :param file_path: Path to the PNG screenshot to process.
+    :param image_format: Format to save the screenshot in: "png", "webp" or "jpeg".
+    :param quality: Quality of lossy formats (1-100).
+    :param max_height: Height (in pixels) to crop the screenshot to. 0 doesn't crop.
+    :param thumbnail_width: Width (in pixels) of a thumbnail to generate. 0 doesn't generate one.
+    :return: A dictionary with the keys: file, thumbnail, phash, original_size, size and processing_time.
+    """
+    from PIL import Image
+
+    start_time = time.perf_counter()
+    original_size = os.path.getsize(file_path)
+
+    with Image.open(file_path) as image:
+        image.load()
+
+    if max_height and image.height > max_height:
+        image = image.crop((0, 0, image.width, max_height))
+
+    if image_format == "jpeg":
+        # JPEG doesn't support transparency
+        image = image.convert("RGB")
+
+    base_path = os.path.splitext(file_path)[0]
+    output_path = f"{base_path}.{image_format}"
+    temporary_path = f"{output_path}.tmp"
+
+    image.save(
+        temporary_path,
+        format=IMAGE_FORMATS[image_format],
+        quality=quality,
+        optimize=True,
+    )
+    os.replace(temporary_path, output_path)
+    if output_path != file_path:
+        os.remove(file_path)
+
+    thumbnail_path = None
+    if thumbnail_width:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((thumbnail_width, thumbnail_width * 4))
+        thumbnail_path = f"{base_path}.thumbnail.{image_format}"
+        thumbnail.save(
+            f"{thumbnail_path}.tmp", format=IMAGE_FORMATS[image_format], quality=quality
+        )
+        os.replace(f"{thumbnail_path}.tmp", thumbnail_path)
+
+    return {
+        "file": output_path,
+        "thumbnail": thumbnail_path,
+        "phash": perceptual_hash(image),
+        "original_size": original_size,
+        "size": os.path.getsize(output_path),
+        "processing_time": time.perf_counter() - start_time,
+    }
+
+
+class ScreenshotPostProcessor:
+    """
+    Post-processes screenshots in a pool of worker processes, so image encoding never holds up the browser workers.
+    """
+
+    def __init__(
+        self,
+        image_format: str = "png",
+        quality: int = 80,
+        max_height: int = 0,
+        thumbnail_width: int = 0,
+        max_workers: int = None,
+    ):
+        """
+        :param image_format: Format to save screenshots in: "png", "webp" or "jpeg".
+        :param quality: Quality of lossy formats (1-100).
+        :param max_height: Height (in pixels) to crop screenshots to. 0 doesn't crop.
+        :param thumbnail_width: Width (in pixels) of thumbnails to generate. 0 doesn't generate them.
+        :param max_workers: Number of worker processes. If None, the number of CPUs is used.
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Image format must be one of {', '.join(IMAGE_FORMATS)}, not {image_format!r}."
+            )
+
+        self.image_format = image_format
+        self.quality = quality
+        self.max_height = max_height
+        self.thumbnail_width = thumbnail_width
+
+        # Worker processes are spawned rather than forked, because the parent process runs many threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+        # Number of screenshots whose processing (or callback) hasn't finished yet
+        self._pending = 0
+        self._pending_condition = Condition()
+
+    def submit(self, file_path: str, callback: Callable[[Future], None] = None) -> Future:
+        """
+        Queues a screenshot for post-processing.
+
+        :param file_path: Path to the PNG screenshot to process.
+        :param callback: A function called with the future once the screenshot is processed.
+            wait() doesn't return before it has run.
+        :return: A future of process_screenshot()'s result.
+        """
+        with self._pending_condition:
+            self._pending += 1
+
+        def done(future: Future):
+            try:
+                if callback is not None:
+                    callback(future)
+            finally:
+                with self._pending_condition:
+                    self._pending -= 1
+                    self._pending_condition.notify_all()
+
+        future = self._executor.submit(
+            process_screenshot,
+            file_path,
+            self.image_format,
+            self.quality,
+            self.max_height,
+            self.thumbnail_width,
+        )
+        future.add_done_callback(done)
+        return future
+
+    def wait(self):
+        """
+        Waits for the queued screenshots to be processed and their callbacks to run, keeping the worker processes.
+        """
+        with self._pending_condition:
+            self._pending_condition.wait_for(lambda: self._pending == 0)
+
+    def shutdown(self):
+        """
+        Waits for the queued screenshots to be processed (and their callbacks to run), then stops the worker processes.
+        """
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,51 @@
+# Firefox preferences that keep heavy resources from being downloaded over Tor
+_LIGHT_PREFERENCES = {
+    # Don't download web fonts (pages are rendered with the local fonts)
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    # Don't play (or download) audio and video
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "media.preload.default": 0,
+    "media.preload.auto": 0,
+    "media.mediasource.enabled": False,
+    "media.ogg.enabled": False,
+    "media.opus.enabled": False,
+    "media.wave.enabled": False,
+    "media.webm.enabled": False,
+    "media.mp4.enabled": False,
+    "media.av1.enabled": False,
+    "media.peerconnection.enabled": False,
+    # Only load the onion's own images (not those of other onions), and don't animate them
+    "permissions.default.image": 3,
+    "image.animation_mode": "none",
+    # Don't render WebGL (its canvases aren't worth their GPU and memory cost in a screenshot)
+    "webgl.disabled": True,
+}
+
+# Firefox preferences of each render profile
+RENDER_PROFILES = {
+    # Pages are rendered as they are
+    "full": {},
+    # No media, fonts or autoplay, and no cross-site images
+    "light": _LIGHT_PREFERENCES,
+    # No JavaScript and no images at all
+    "text": {
+        **_LIGHT_PREFERENCES,
+        "javascript.enabled": False,
+        "permissions.default.image": 2,
+    },
+}
+
+
+def render_preferences(profile: str) -> dict:
+    """
+    :param profile: Name of the render profile ("full", "light" or "text").
+    :return: The Firefox preferences of the render profile.
+    :raise ValueError: If there is no such render profile.
+    """
+    if profile not in RENDER_PROFILES:
+        raise ValueError(
+            f"Render profile must be one of {', '.join(RENDER_PROFILES)}, not {profile!r}."
+        )
+    return RENDER_PROFILES[profile]
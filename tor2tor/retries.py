@@ -0,0 +1,290 @@
+import re
+import time
+import random
+import socket
+from collections import Counter
+from queue import Queue
+from threading import Lock, Timer
+from typing import NamedTuple, Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from .coreutils import log, CaptureTimeout
+
+# Firefox network error pages (about:neterror?e=...) that onion services commonly produce on a first attempt,
+# e.g. while their descriptor is being fetched or a circuit is being built.
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r"proxyConnectFailure|proxyResolveFailure|netTimeout|netReset|netInterrupt|connectionFailure"
+    r"|dnsNotFound|nssFailure|unknownSocketType|Timed out|timeout|Connection reset|Connection refused"
+    r"|Remote end closed|Max retries exceeded|TTL expired|Host unreachable",
+    re.IGNORECASE,
+)
+
+# Errors that will fail the same way on every attempt
+PERMANENT_ERROR_PATTERN = re.compile(
+    r"malformedURI|unknownProtocol|fileNotFound|notCached|blockedByPolicy|invalid argument",
+    re.IGNORECASE,
+)
+
+
+class CaptureTask(NamedTuple):
+    """
+    An onion to capture, and the number of the attempt it is on.
+    """
+
+    index: int
+    onion: str
+    attempt: int = 1
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classifies an error raised while capturing an onion.
+
+    :param error: The error.
+    :return: "transient" if the capture might succeed on another attempt, "permanent" otherwise.
+    """
+    message = str(error)
+    if PERMANENT_ERROR_PATTERN.search(message):
+        return "permanent"
+    if isinstance(error, (CaptureTimeout, TimeoutException, ConnectionError, TimeoutError)):
+        return "transient"
+    if isinstance(error, (WebDriverException, OSError)) and TRANSIENT_ERROR_PATTERN.search(
+        message
+    ):
+        return "transient"
+    return "permanent"
+
+
+class TorController:
+    """
+    A minimal client of the Tor control port, used to request new circuits (SIGNAL NEWNYM).
+    """
+
+    # Tor rate-limits NEWNYM, and ignores signals sent within this many seconds of the last one
+    NEWNYM_INTERVAL = 10
+
+    def __init__(self, host: str, port: int, password: str = None, timeout: float = 10):
+        """
+        :param host: Host of the Tor control port.
+        :param port: The Tor control port.
+        :param password: The control port password. If None, cookie or null authentication is used.
+        :param timeout: Seconds to wait for the control port to respond.
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+
+        self._lock = Lock()
+        self._last_newnym = None
+
+    @staticmethod
+    def _command(connection_file, command: str) -> list:
+        connection_file.write(f"{command}\r\n".encode())
+        connection_file.flush()
+
+        # Read the reply lines, until the final "<code> <text>" line
+        lines = []
+        while True:
+            line = connection_file.readline().decode(errors="replace").rstrip("\r\n")
+            if not line:
+                raise ConnectionError("The Tor control port closed the connection.")
+            lines.append(line)
+            if len(line) >= 4 and line[3] == " ":
+                break
+
+        if not lines[-1].startswith("250"):
+            raise ConnectionError(f"The Tor control port refused {command.split()[0]}: {lines[-1]}")
+        return lines
+
+    def _authenticate(self, connection_file):
+        if self.password is not None:
+            escaped_password = self.password.replace("\\", "\\\\").replace('"', '\\"')
+            self._command(connection_file, f'AUTHENTICATE "{escaped_password}"')
+            return
+
+        # Use cookie authentication if Tor offers it (and the cookie is readable), or null authentication
+        protocol_info = " ".join(self._command(connection_file, "PROTOCOLINFO 1"))
+        cookie_file = re.search(r'COOKIEFILE="((?:[^"\\]|\\.)*)"', protocol_info)
+        if "COOKIE" in protocol_info and cookie_file is not None:
+            try:
+                with open(cookie_file.group(1).replace('\\"', '"'), "rb") as file:
+                    self._command(connection_file, f"AUTHENTICATE {file.read().hex()}")
+                    return
+            except OSError:
+                pass
+        self._command(connection_file, "AUTHENTICATE")
+
+    def new_circuit(self) -> bool:
+        """
+        Asks Tor to use new circuits for new connections (SIGNAL NEWNYM).
+
+        :return: True if the signal was sent, False if it was skipped because of Tor's rate limit.
+        :raise ConnectionError: If the control port can't be reached or refuses the signal.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_newnym is not None and now - self._last_newnym < self.NEWNYM_INTERVAL:
+                return False
+
+            with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+                with connection.makefile("rwb") as connection_file:
+                    self._authenticate(connection_file)
+                    self._command(connection_file, "SIGNAL NEWNYM")
+                    connection_file.write(b"QUIT\r\n")
+                    connection_file.flush()
+
+            self._last_newnym = now
+            return True
+
+
+class RetryScheduler:
+    """
+    Re-enqueues onions whose capture failed with a transient error, after an exponential backoff with jitter.
+
+    A retried task stays counted as unfinished in the tasks queue until it has been re-enqueued,
+    so tasks_queue.join() doesn't return while retries are pending. After a number of consecutive
+    transient failures through a Tor client, new circuits are requested through that client's control port
+    (if one is configured), so one failing Tor instance doesn't renew the circuits of the others.
+    """
+
+    def __init__(
+        self,
+        tasks_queue: Queue,
+        max_retries: int = 2,
+        base_delay: float = 5,
+        max_delay: float = 120,
+        controllers: dict = None,
+        newnym_after: int = 3,
+    ):
+        """
+        :param tasks_queue: The queue failed tasks are re-enqueued to.
+        :param max_retries: Maximum number of retries of an onion (0 disables retries).
+        :param base_delay: Seconds to wait before the first retry. Each further retry waits twice as long.
+        :param max_delay: Maximum number of seconds to wait before a retry.
+        :param controllers: A dictionary mapping Tor SOCKS endpoints ((host, port) tuples) to the TorControllers
+            of their Tor clients, used to request new circuits. Endpoints without a controller aren't renewed.
+        :param newnym_after: Number of consecutive transient failures (through the same Tor client)
+            after which new circuits are requested.
+        """
+        self.tasks_queue = tasks_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.controllers = controllers or {}
+        self.newnym_after = newnym_after
+
+        self.retries = 0
+        self.circuit_renewals = 0
+
+        self._lock = Lock()
+        self._timers = set()
+        self._consecutive_failures = Counter()
+
+    def delay(self, attempt: int) -> float:
+        """
+        Gets the (jittered) number of seconds to wait before retrying a failed attempt.
+
+        :param attempt: Number of the attempt that failed.
+        :return: The delay in seconds.
+        """
+        backoff = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+
+        # Half of the backoff is randomised, so onions that failed together aren't all retried together
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def controller(self, endpoint: tuple = None) -> Optional[TorController]:
+        """
+        :param endpoint: The (host, port) tuple of the Tor SOCKS endpoint a capture went through, if known.
+        :return: The controller of the endpoint's Tor client, or None if it has none.
+            If the endpoint isn't known, the controller is only returned if all the endpoints share it.
+        """
+        if endpoint in self.controllers:
+            return self.controllers[endpoint]
+
+        controllers = set(self.controllers.values())
+        return controllers.pop() if len(controllers) == 1 else None
+
+    def record_success(self, endpoint: tuple = None):
+        """
+        Records a successful capture, which resets the count of consecutive failures of its Tor client.
+
+        :param endpoint: The (host, port) tuple of the Tor SOCKS endpoint the capture went through, if known.
+        """
+        with self._lock:
+            self._consecutive_failures.pop(self.controller(endpoint=endpoint), None)
+
+    def schedule(
+        self, task: CaptureTask, error: Exception, endpoint: tuple = None
+    ) -> Optional[float]:
+        """
+        Schedules a retry of a failed task, if its error is transient and it has retries left.
+
+        If the retry is scheduled, the caller must NOT mark the task as done in the tasks queue:
+        that is done once the retry has been enqueued.
+
+        :param task: The failed task.
+        :param error: The error the task failed with.
+        :param endpoint: The (host, port) tuple of the Tor SOCKS endpoint the task went through, if known.
+        :return: The number of seconds until the retry, or None if the task won't be retried.
+        """
+        if classify_error(error=error) != "transient":
+            return None
+
+        controller = self.controller(endpoint=endpoint)
+        with self._lock:
+            renew_circuits = False
+            if controller is not None:
+                self._consecutive_failures[controller] += 1
+                renew_circuits = self._consecutive_failures[controller] >= self.newnym_after
+                if renew_circuits:
+                    del self._consecutive_failures[controller]
+
+        if renew_circuits:
+            try:
+                if controller.new_circuit():
+                    with self._lock:
+                        self.circuit_renewals += 1
+                    log.info(
+                        f"Requested new Tor circuits (NEWNYM) on {controller.host}:{controller.port}."
+                    )
+            except (OSError, ConnectionError) as e:
+                log.warning(f"Failed to request new Tor circuits: [yellow]{e}[/]")
+
+        if task.attempt > self.max_retries:
+            return None
+
+        delay = self.delay(attempt=task.attempt)
+        retry_task = task._replace(attempt=task.attempt + 1)
+
+        def enqueue():
+            with self._lock:
+                if timer not in self._timers:
+                    # The retry has been cancelled
+                    return
+                self._timers.discard(timer)
+            self.tasks_queue.put(retry_task)
+            self.tasks_queue.task_done()
+
+        timer = Timer(interval=delay, function=enqueue)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+            self.retries += 1
+        timer.start()
+
+        return delay
+
+    def cancel(self):
+        """
+        Cancels the pending retries, marking their tasks as done.
+        """
+        with self._lock:
+            timers = list(self._timers)
+            self._timers.clear()
+
+        # The cancelled timers won't enqueue their tasks anymore, even if they have already fired
+        for timer in timers:
+            timer.cancel()
+            self.tasks_queue.task_done()
@@ -0,0 +1,154 @@
+import heapq
+import itertools
+from queue import Queue
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from .coreutils import add_http_to_link, canonical_onion, construct_output_name
+
+# Seconds a capture of an onion without history is expected to take, if the index has no durations at all
+DEFAULT_DURATION = 30.0
+
+
+def expected_cost(history: Optional[dict], default_duration: float) -> float:
+    """
+    Estimates the cost of capturing an onion, from the outcomes of its earlier captures: the expected
+    number of seconds spent per successful capture (mean duration / probability of success).
+
+    :param history: The onion's capture history (successes, failures and mean_duration), or None if it has none.
+    :param default_duration: Duration to assume for onions whose duration isn't known.
+    :return: The expected cost in seconds. Lower is better.
+    """
+    history = history or {}
+    successes = history.get("successes") or 0
+    failures = history.get("failures") or 0
+    duration = history.get("mean_duration") or default_duration
+
+    # Laplace smoothing, so onions without history have a success rate of 1/2
+    success_rate = (successes + 1) / (successes + failures + 2)
+    return duration / success_rate
+
+
+def onion_host(onion: str) -> str:
+    """
+    :param onion: An onion url.
+    :return: The onion's canonical name (so its subdomains count as the same host), or its hostname
+        if it isn't a valid onion url.
+    """
+    return canonical_onion(url=onion) or urlparse(add_http_to_link(link=onion)).hostname or onion
+
+
+class CaptureScheduler(Queue):
+    """
+    A tasks queue that hands out the onions that are likely to be fast and alive first, and caps
+    the number of concurrent loads of each onion host.
+
+    Onions are ordered by their expected cost (see expected_cost()), estimated from the capture history
+    in the capture index, and onions of equal cost keep the order they were queued in (so without any
+    history the queue is FIFO). Onions whose host is at its cap are held back until a load of the host is
+    released with release(). None (the workers' stop signal) is always handed out after the queued onions.
+    """
+
+    def __init__(
+        self,
+        history: Callable[[str], Optional[dict]] = None,
+        default_duration: float = DEFAULT_DURATION,
+        max_per_host: int = 1,
+    ):
+        """
+        :param history: A function returning the capture history of a capture key (e.g. CaptureIndex.history).
+            If None, onions are handed out in the order they were queued.
+        :param default_duration: Seconds a capture of an onion without history is expected to take.
+        :param max_per_host: Maximum number of onions of the same host that are handed out at the same time
+            (0 for no cap).
+        """
+        super().__init__()
+        self.history = history
+        self.default_duration = default_duration
+        self.max_per_host = max_per_host
+
+    # Queue calls _init() from its constructor, with the queue's maxsize
+    def _init(self, maxsize: int):
+        self._heap = []
+        self._held = {}
+        self._loads = {}
+        self._counter = itertools.count()
+
+    def _is_capped(self, host: Optional[str]) -> bool:
+        return (
+            host is not None
+            and self.max_per_host > 0
+            and self._loads.get(host, 0) >= self.max_per_host
+        )
+
+    def _qsize(self) -> int:
+        # Hold back the onions at the top of the heap whose hosts are at their cap,
+        # so the queue only counts as non-empty if its next onion can be handed out
+        while self._heap and self._is_capped(host=self._heap[0][2]):
+            entry = heapq.heappop(self._heap)
+            self._held.setdefault(entry[2], []).append(entry)
+        if self._held and self._heap and self._heap[0][3] is None:
+            # Stop signals wait for the held back onions too (they are put back in line on release())
+            return 0
+        return len(self._heap)
+
+    def _put(self, entry: tuple):
+        heapq.heappush(self._heap, entry)
+
+    def _get(self):
+        _, _, host, task = heapq.heappop(self._heap)
+        if host is not None:
+            self._loads[host] = self._loads.get(host, 0) + 1
+        return task
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        """
+        Queues an onion (a CaptureTask), prioritised by its capture history.
+
+        :param item: The task, or None to stop a worker.
+        """
+        if item is None:
+            entry = (float("inf"), next(self._counter), None, None)
+        else:
+            onion = item[1]
+            history = (
+                self.history(construct_output_name(url=add_http_to_link(link=onion)))
+                if self.history is not None
+                else None
+            )
+            entry = (
+                expected_cost(history=history, default_duration=self.default_duration),
+                next(self._counter),
+                onion_host(onion=onion),
+                item,
+            )
+        super().put(entry, block=block, timeout=timeout)
+
+    def release(self, task):
+        """
+        Releases the load of a task's host, once the task has been handled (successfully or not).
+
+        :param task: The task that was handed out by get().
+        """
+        if task is None:
+            return
+
+        host = onion_host(onion=task[1])
+        with self.mutex:
+            if self._loads.get(host, 0) > 1:
+                self._loads[host] -= 1
+            else:
+                self._loads.pop(host, None)
+
+            # Put the held back onions of the host back in line
+            for entry in self._held.pop(host, []):
+                heapq.heappush(self._heap, entry)
+            if self._heap:
+                self.not_empty.notify_all()
+
+    def queued(self) -> int:
+        """
+        :return: The number of queued onions, including those held back by the per-host cap.
+        """
+        with self.mutex:
+            return len(self._heap) + sum(len(entries) for entries in self._held.values())
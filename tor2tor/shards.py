@@ -0,0 +1,215 @@
+import os
+import time
+import shutil
+import subprocess
+from threading import Lock
+from typing import NamedTuple
+
+
+class TorShards:
+    """
+    Spreads WebDriver instances and link-extraction fetches across several Tor SOCKS endpoints,
+    so they don't all compete on the circuits of a single Tor client.
+    """
+
+    strategies = ["round-robin", "least-loaded"]
+
+    def __init__(self, endpoints: list, strategy: str = "round-robin"):
+        """
+        :param endpoints: A list of (host, port) tuples of the Tor SOCKS endpoints to use.
+        :param strategy: How endpoints are assigned: "round-robin" or "least-loaded".
+        """
+        if not endpoints:
+            raise ValueError("At least one Tor SOCKS endpoint is required.")
+        if strategy not in self.strategies:
+            raise ValueError(
+                f"Shard strategy must be one of {', '.join(self.strategies)}, not {strategy!r}."
+            )
+
+        self.endpoints = [(host, int(port)) for host, port in endpoints]
+        self.strategy = strategy
+
+        self._lock = Lock()
+        self._next_index = 0
+        self._loads = {endpoint: 0 for endpoint in self.endpoints}
+
+    def acquire(self) -> tuple:
+        """
+        Assigns an endpoint and counts it as being in use until it is released.
+
+        :return: A (host, port) tuple of the assigned endpoint.
+        """
+        with self._lock:
+            if self.strategy == "least-loaded":
+                # Ties are broken by the endpoints' order
+                endpoint = min(self.endpoints, key=lambda item: self._loads[item])
+            else:
+                endpoint = self.endpoints[self._next_index % len(self.endpoints)]
+                self._next_index += 1
+
+            self._loads[endpoint] += 1
+            return endpoint
+
+    def release(self, endpoint: tuple):
+        """
+        Marks an assigned endpoint as no longer in use.
+
+        :param endpoint: The (host, port) tuple of the endpoint to release.
+        """
+        with self._lock:
+            self._loads[endpoint] = max(self._loads[endpoint] - 1, 0)
+
+    def loads(self) -> dict:
+        """
+        :return: A dictionary mapping each endpoint to the number of users it currently has.
+        """
+        with self._lock:
+            return dict(self._loads)
+
+
+def parse_socks_ports(ports: str, host: str) -> list:
+    """
+    Parses a comma-separated list of SOCKS ports (or host:port pairs) into endpoints.
+
+    :param ports: The ports to parse, e.g. "9050,9052" or "10.0.0.2:9050,9052".
+    :param host: Host to use for entries that only specify a port.
+    :return: A list of (host, port) tuples.
+    """
+    endpoints = []
+    for entry in ports.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if ":" in entry:
+            entry_host, entry_port = entry.rsplit(":", 1)
+            endpoints.append((entry_host, int(entry_port)))
+        else:
+            endpoints.append((host, int(entry)))
+    return endpoints
+
+
+class TorInstance(NamedTuple):
+    """
+    A Tor client process launched by launch_tor_instances().
+    """
+
+    port: int
+    control_port: int
+    process: subprocess.Popen
+
+
+def launch_tor_instances(
+    count: int, base_port: int, data_directory: str, bootstrap_timeout: float = 120
+) -> list:
+    """
+    Launches Tor client processes, each listening on its own SOCKS port and control port.
+
+    The control ports follow the SOCKS ports (e.g. 9060-9061 for SOCKS and 9062-9063 for control, for 2 instances
+    from port 9060), and use cookie authentication, with the cookie in each instance's data directory.
+
+    :param count: Number of Tor instances to launch.
+    :param base_port: SOCKS port of the first instance. The rest use the ports that follow it.
+    :param data_directory: Directory under which each instance gets its own data directory.
+    :param bootstrap_timeout: Seconds to wait for the instances to finish bootstrapping.
+    :return: A list of the launched TorInstances.
+    :raise FileNotFoundError: If the tor binary cannot be found.
+    :raise RuntimeError: If an instance exits or doesn't bootstrap in time
+        (the instances that were launched are stopped).
+    """
+    tor_binary = shutil.which("tor")
+    if tor_binary is None:
+        raise FileNotFoundError("Could not find the tor binary in PATH.")
+
+    instances = []
+    # The log file of each instance that is still bootstrapping, by port
+    bootstrapping = {}
+    try:
+        for instance_index in range(count):
+            port = base_port + instance_index
+            control_port = base_port + count + instance_index
+            instance_directory = os.path.join(data_directory, f"tor-{port}")
+            os.makedirs(instance_directory, exist_ok=True)
+
+            # Tor's output goes to a log file, which is watched for the bootstrap message
+            log_path = os.path.join(instance_directory, "tor.log")
+            with open(log_path, "w") as log_file:
+                process = subprocess.Popen(
+                    [
+                        tor_binary,
+                        "--SocksPort",
+                        str(port),
+                        "--DataDirectory",
+                        instance_directory,
+                        "--ControlPort",
+                        str(control_port),
+                        "--CookieAuthentication",
+                        "1",
+                        "--CookieAuthFile",
+                        os.path.join(instance_directory, "control_auth_cookie"),
+                    ],
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                )
+            instances.append(
+                TorInstance(port=port, control_port=control_port, process=process)
+            )
+            bootstrapping[port] = log_path
+
+        # Wait for the instances to bootstrap (they bootstrap in parallel)
+        deadline = time.monotonic() + bootstrap_timeout
+        while bootstrapping:
+            for port, _, process in instances:
+                log_path = bootstrapping.get(port)
+                if log_path is None:
+                    continue
+                with open(log_path) as log_file:
+                    if "Bootstrapped 100%" in log_file.read():
+                        del bootstrapping[port]
+                        continue
+                if process.poll() is not None:
+                    raise RuntimeError(
+                        f"The Tor instance on port {port} exited with code {process.returncode}:\n"
+                        f"{tail_log(log_path=log_path)}"
+                    )
+
+            if bootstrapping and time.monotonic() >= deadline:
+                port, log_path = next(iter(bootstrapping.items()))
+                raise RuntimeError(
+                    f"The Tor instance on port {port} didn't bootstrap in {bootstrap_timeout:g} seconds:\n"
+                    f"{tail_log(log_path=log_path)}"
+                )
+            time.sleep(0.5)
+    except BaseException:
+        stop_tor_instances(instances=instances)
+        raise
+
+    return instances
+
+
+def tail_log(log_path: str, lines: int = 10) -> str:
+    """
+    :param log_path: Path to a log file.
+    :param lines: Number of lines to read from the end of the log file.
+    :return: The last lines of the log file (or a note that it can't be read).
+    """
+    try:
+        with open(log_path, errors="replace") as log_file:
+            return "".join(log_file.readlines()[-lines:]).rstrip()
+    except OSError as e:
+        return f"(could not read {log_path}: {e})"
+
+
+def stop_tor_instances(instances: list):
+    """
+    Stops Tor client processes launched with launch_tor_instances().
+
+    :param instances: A list of the TorInstances to stop.
+    """
+    for instance in instances:
+        instance.process.terminate()
+
+    for instance in instances:
+        try:
+            instance.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            instance.process.kill()
@@ -0,0 +1,222 @@
+import os
+import abc
+import csv
+import json
+import time
+from typing import Iterator
+
+from .coreutils import log
+
+# Fields of a result, in the order they are written to CSV files
+RESULT_FIELDS = [
+    "index",
+    "onion",
+    "seed",
+    "status",
+    "file",
+    "thumbnail",
+    "processing_time",
+    "phash",
+    "duplicate_of",
+    "already_captured",
+    "attempts",
+    "render_profile",
+    "reason",
+    "timestamp",
+]
+
+SINK_FORMATS = ["jsonl", "csv"]
+
+
+class ResultSink(abc.ABC):
+    """
+    Writes results to a file as they are produced, in batches, so a crawl's record survives a crash
+    and memory use doesn't grow with the number of results.
+
+    Results are appended to the file, and the offset where the current sink started writing
+    is kept in `start_offset`, so the results of a single run can be read back with iter_results().
+    An existing file the results can't be appended to (see is_compatible()) is moved aside first.
+    """
+
+    def __init__(self, file_path: str, batch_size: int = 100, flush_interval: float = 1.0):
+        """
+        :param file_path: Path to the file to write results to.
+        :param batch_size: Number of results to buffer before writing them.
+        :param flush_interval: Maximum number of seconds a result is buffered for.
+        """
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(file_path) and not self.is_compatible():
+            # Keep the existing results in a file of their own, named after the time they were last written
+            root, extension = os.path.splitext(file_path)
+            modified_at = time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(file_path)))
+            rotated_path = f"{root}-{modified_at}{extension}"
+            os.replace(file_path, rotated_path)
+            log.warning(
+                f"{file_path} was written with different fields, so it was moved to [italic]{rotated_path}[/]"
+            )
+
+        self._file = open(file_path, "a", newline="", encoding="utf-8")
+        self._batch = []
+        self._last_flush = time.monotonic()
+
+        self.write_header()
+        self._file.flush()
+        self.start_offset = self._file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def is_compatible(self) -> bool:
+        """
+        Checks whether results can be appended to the existing file.
+
+        :return: True, unless the format has a header that doesn't match the current one.
+        """
+        return True
+
+    def write_header(self):
+        """
+        Writes the file's header, if the format has one and the file is empty.
+        """
+
+    @abc.abstractmethod
+    def write_batch(self, results: list):
+        """
+        Writes a batch of results to the file.
+
+        :param results: The results to write.
+        """
+
+    def write(self, result: dict):
+        """
+        Buffers a result, and writes the buffered results once the batch is full or the flush interval has passed.
+
+        :param result: The result to write.
+        """
+        self._batch.append(result)
+        if (
+            len(self._batch) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered results to the file.
+        """
+        if self._batch:
+            self.write_batch(results=self._batch)
+            self._batch = []
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Writes the buffered results and closes the file.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class JSONLSink(ResultSink):
+    """
+    Writes results as JSON lines.
+    """
+
+    def write_batch(self, results: list):
+        self._file.write(
+            "".join(json.dumps(result, default=str) + "\n" for result in results)
+        )
+
+
+class CSVSink(ResultSink):
+    """
+    Writes results as CSV rows, with a header row of the RESULT_FIELDS.
+    """
+
+    def is_compatible(self) -> bool:
+        # Rows written with other fields (e.g. by an older version) would be misaligned with the new ones
+        with open(self.file_path, newline="", encoding="utf-8") as file:
+            header = next(csv.reader([file.readline()]), [])
+        return not header or header == RESULT_FIELDS
+
+    def write_header(self):
+        self._writer = csv.DictWriter(
+            self._file, fieldnames=RESULT_FIELDS, extrasaction="ignore"
+        )
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def write_batch(self, results: list):
+        self._writer.writerows(results)
+
+
+def detect_sink_format(file_path: str, sink_format: str = None) -> str:
+    """
+    Gets the format of a results file.
+
+    :param file_path: Path to the results file.
+    :param sink_format: The format, if it was given explicitly ("jsonl" or "csv").
+    :return: The given format, or the format matching the file's extension (JSONL if it is neither).
+    """
+    if sink_format is not None:
+        return sink_format
+    return "csv" if file_path.lower().endswith(".csv") else "jsonl"
+
+
+def open_sink(file_path: str, sink_format: str = None, **kwargs) -> ResultSink:
+    """
+    Opens a results file for writing.
+
+    :param file_path: Path to the results file.
+    :param sink_format: Format of the file ("jsonl" or "csv"). If None, the file's extension decides.
+    :param kwargs: Keyword arguments passed to the sink (batch_size, flush_interval).
+    :return: The result sink.
+    """
+    if detect_sink_format(file_path=file_path, sink_format=sink_format) == "csv":
+        return CSVSink(file_path=file_path, **kwargs)
+    return JSONLSink(file_path=file_path, **kwargs)
+
+
+def iter_results(file_path: str, sink_format: str = None, offset: int = 0) -> Iterator[dict]:
+    """
+    Reads results back from a results file, one at a time.
+
+    :param file_path: Path to the results file.
+    :param sink_format: Format of the file ("jsonl" or "csv"). If None, the file's extension decides.
+    :param offset: Offset in the file to start reading from (e.g. a sink's start_offset).
+    :return: A generator yielding a dictionary for each result.
+    """
+    is_csv = detect_sink_format(file_path=file_path, sink_format=sink_format) == "csv"
+
+    with open(file_path, newline="", encoding="utf-8") as file:
+        if not is_csv:
+            file.seek(offset)
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        # CSV values are strings, so the non-string fields are converted back
+        header = next(csv.reader([file.readline()]), RESULT_FIELDS)
+        file.seek(max(offset, file.tell()))
+        for row in csv.DictReader(file, fieldnames=header):
+            result = {field: value if value != "" else None for field, value in row.items()}
+            result["index"] = int(result["index"])
+            result["already_captured"] = result["already_captured"] == "True"
+            if result.get("attempts") is not None:
+                result["attempts"] = int(result["attempts"])
+            if result["processing_time"] is not None:
+                result["processing_time"] = float(result["processing_time"])
+            yield result
@@ -0,0 +1,209 @@
+import io
+import os
+import json
+import time
+import shutil
+import tarfile
+from threading import Lock
+
+from .coreutils import get_file_hash
+
+# Layouts screenshots can be stored in
+STORAGE_LAYOUTS = ("flat", "sharded")
+
+# Number of manifest entries written to the archive at once
+MANIFEST_BATCH_SIZE = 100
+
+
+class ScreenshotStore:
+    """
+    Stores finished screenshots (and thumbnails), and optionally appends them to an archive.
+
+    In the flat layout, screenshots stay where they were saved: one file per onion in the seed's directory.
+    In the sharded layout, screenshots are content-addressed: each one is moved to a blob named by its SHA-256
+    hash, in two levels of subdirectories named by the hash's first characters (e.g. blobs/ab/cd/abcd....png),
+    so no directory grows past a few hundred files, and identical screenshots are only stored once.
+    The capture index maps each onion to its blob.
+
+    The optional archive is a tar file that blobs are appended to (once per hash), together with a manifest
+    of the captures stored in each session (written in parts, as it grows), so a crawl's screenshots
+    can be transferred as a single file. Each member's header is only written once its data is, so the archive
+    is readable up to its last complete member even if a run is killed halfway through writing one
+    (and the partly written member is dropped when the archive is next opened).
+    """
+
+    def __init__(self, root: str, layout: str = "flat", archive_path: str = None):
+        """
+        :param root: Directory of the sharded layout's blobs (and the staging directory screenshots are saved to).
+        :param layout: "flat" or "sharded".
+        :param archive_path: Path to a tar archive to append the stored screenshots to, if set.
+        :raise ValueError: If the layout is unknown.
+        """
+        if layout not in STORAGE_LAYOUTS:
+            raise ValueError(
+                f"Storage layout must be one of {', '.join(STORAGE_LAYOUTS)}, not {layout!r}."
+            )
+
+        self.root = root
+        self.layout = layout
+        self.archive_path = archive_path
+
+        self._lock = Lock()
+
+        # The archive file (opened when it is first appended to, and kept open until close()), the names in it,
+        # and the manifest entries that haven't been written to it yet
+        self._archive_file = None
+        self._archived = set()
+        self._manifest = []
+        self._manifest_parts = 0
+        self._session = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == "sharded"
+
+    @property
+    def staging_directory(self) -> str:
+        """
+        :return: The directory screenshots are saved to before they are stored as blobs (in the sharded layout).
+        """
+        return os.path.join(self.root, "staging")
+
+    def blob_path(self, sha256: str, extension: str) -> str:
+        """
+        :param sha256: The hex digest of the blob's SHA-256 hash.
+        :param extension: The blob's file extension (e.g. ".png").
+        :return: Path to the blob in the sharded layout.
+        """
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}{extension}")
+
+    def put(self, file_path: str, key: str = None) -> tuple:
+        """
+        Stores a finished screenshot.
+
+        :param file_path: Path to the screenshot.
+        :param key: The capture key (output name) of the screenshot's onion, recorded in the archive's manifest.
+        :return: A tuple containing the screenshot's stored path and the hex digest of its SHA-256 hash:
+            (file_path, sha256).
+        """
+        sha256 = get_file_hash(filename=file_path)
+        extension = os.path.splitext(file_path)[1]
+
+        if self.sharded:
+            blob_path = self.blob_path(sha256=sha256, extension=extension)
+            if os.path.abspath(blob_path) != os.path.abspath(file_path):
+                if os.path.exists(blob_path):
+                    # The same content is already stored
+                    os.remove(file_path)
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    # Renaming is atomic, so a blob is either complete or absent
+                    os.replace(file_path, blob_path)
+            file_path = blob_path
+
+        if self.archive_path is not None:
+            self.archive(file_path=file_path, sha256=sha256, key=key)
+
+        return file_path, sha256
+
+    def archive(self, file_path: str, sha256: str, key: str = None):
+        """
+        Appends a screenshot to the archive, unless a screenshot with the same hash is already in it.
+
+        :param file_path: Path to the screenshot.
+        :param sha256: The hex digest of the screenshot's SHA-256 hash.
+        :param key: The capture key (output name) of the screenshot's onion.
+        """
+        name = f"blobs/{sha256}{os.path.splitext(file_path)[1]}"
+        with self._lock:
+            if self._archive_file is None:
+                self._open_archive()
+
+            if name not in self._archived:
+                member = tarfile.TarInfo(name=name)
+                member.size = os.path.getsize(file_path)
+                member.mtime = int(os.path.getmtime(file_path))
+                with open(file_path, "rb") as source:
+                    self._append(member=member, data=source)
+                self._archived.add(name)
+
+            if key is not None:
+                self._manifest.append({"key": key, "blob": name, "archived_at": time.time()})
+                if len(self._manifest) >= MANIFEST_BATCH_SIZE:
+                    self._write_manifest()
+
+    def _open_archive(self):
+        directory = os.path.dirname(self.archive_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Find the end of the last complete member, reading the names in the archive on the way
+        self._archived = set()
+        end = 0
+        if os.path.exists(self.archive_path):
+            size = os.path.getsize(self.archive_path)
+            try:
+                with tarfile.open(self.archive_path, mode="r:") as archive:
+                    for member in archive:
+                        blocks = -(-member.size // tarfile.BLOCKSIZE)
+                        member_end = member.offset_data + blocks * tarfile.BLOCKSIZE
+                        if member_end > size:
+                            break
+                        self._archived.add(member.name)
+                        end = member_end
+            except tarfile.ReadError:
+                # The rest of the archive is unreadable (e.g. a header torn by a killed run)
+                pass
+
+        # New members follow the last complete one, over the end-of-archive marker and any partly written member
+        self._archive_file = open(self.archive_path, "r+b" if end else "wb")
+        self._archive_file.truncate(end)
+        self._archive_file.seek(end)
+
+    def _append(self, member: tarfile.TarInfo, data):
+        """
+        Appends a member to the archive, followed by an end-of-archive marker (which the next member overwrites).
+
+        :param member: The member's header, with its size.
+        :param data: A file object the member's data is read from.
+        """
+        archive_file = self._archive_file
+        start = archive_file.tell()
+
+        # A zero block stands in for the header while the data is written: readers take it as the end of the archive,
+        # so a member is never read with missing data
+        archive_file.write(tarfile.NUL * tarfile.BLOCKSIZE)
+        # (Screenshots are already compressed, so they are stored as they are)
+        shutil.copyfileobj(data, archive_file, 1024 * 1024)
+        padding = -member.size % tarfile.BLOCKSIZE
+        archive_file.write(tarfile.NUL * (padding + 2 * tarfile.BLOCKSIZE))
+        archive_file.flush()
+
+        archive_file.seek(start)
+        archive_file.write(member.tobuf(format=tarfile.USTAR_FORMAT))
+        archive_file.flush()
+        archive_file.seek(start + tarfile.BLOCKSIZE + member.size + padding)
+
+    def _write_manifest(self):
+        if not self._manifest:
+            return
+
+        self._manifest_parts += 1
+        data = "".join(json.dumps(entry) + "\n" for entry in self._manifest).encode("utf-8")
+        member = tarfile.TarInfo(name=f"manifests/{self._session}-{self._manifest_parts:04d}.jsonl")
+        member.size = len(data)
+        member.mtime = int(time.time())
+        self._append(member=member, data=io.BytesIO(data))
+        self._manifest = []
+
+    def close(self):
+        """
+        Writes the remaining entries of the session's manifest to the archive, and closes it.
+        The store can still be used afterwards (e.g. by the next session of a daemon), which reopens the archive.
+        """
+        with self._lock:
+            if self._archive_file is None:
+                return
+            self._write_manifest()
+            self._archive_file.close()
+            self._archive_file = None
@@ -1,75 +1,444 @@
 import os
-import re
 import sys
+import json
 import time
+import shutil
+import signal
+import tempfile
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Iterator, Optional
 from datetime import datetime
-from queue import Queue
-from threading import Lock, Thread
+from collections import Counter, deque
+from queue import Empty, Queue
+from threading import Event, Lock, RLock, Thread
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-import requests
 from rich import print
-from rich.table import Table
+import urllib3
 from bs4 import BeautifulSoup
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
 
 from . import __version__
+from .cache import ResponseCache
+from .captures import CaptureIndex
+from .fetcher import OnionFetcher, LivenessProber
+from .extractor import iter_onion_links
+from .postprocess import ScreenshotPostProcessor
+from .storage import ScreenshotStore
+from .sinks import RESULT_FIELDS, detect_sink_format, open_sink, iter_results
+from .metrics import Metrics, MetricsServer, MetricsFileWriter
+from .retries import CaptureTask, RetryScheduler, TorController
+from .scheduler import CaptureScheduler, DEFAULT_DURATION
+from .autoscale import Autoscaler
+from .render import render_preferences
+from .daemon import JobManager, DaemonServer
+from .distributed import (
+    DEFAULT_LEASE_SECONDS,
+    LeasedTask,
+    LeaseQueue,
+    PublishingQueue,
+    default_worker_id,
+)
+from .dedup import (
+    DuplicateIndex,
+    DEFAULT_THRESHOLD,
+    DUPLICATE_ACTIONS,
+    link_duplicate,
+    perceptual_hash,
+)
+from .shards import (
+    TorShards,
+    parse_socks_ports,
+    launch_tor_instances,
+    stop_tor_instances,
+)
 from .coreutils import (
     log,
-    args,
     tor_service,
     create_table,
     load_settings,
     get_file_info,
-    is_valid_onion,
+    get_file_hash,
     PROGRAM_DIRECTORY,
+    VisitedSet,
+    CaptureTimeout,
+    ContentUnchanged,
+    get_content_hash,
     add_http_to_link,
+    canonical_url,
     construct_output_name,
     convert_timestamp_to_datetime,
-    check_updates,
+    path_finder,
 )
 
 
 class Tor2Tor:
-    def __init__(self):
-        # Initialise locks for logging and table updates
+    def __init__(
+        self,
+        headless: bool = False,
+        log_skipped: bool = False,
+        page_load_strategy: str = "normal",
+        render_profile: str = "full",
+        viewport_only: bool = False,
+        navigate_timeout: float = 60,
+        settle_timeout: float = 10,
+        screenshot_timeout: float = 30,
+        tor_instances: int = 0,
+        tor_base_port: int = 9060,
+        socks_ports: str = None,
+        shard_strategy: str = "round-robin",
+        fetch_concurrency: int = 8,
+        max_page_size: float = 10,
+        connect_timeout: float = 30,
+        read_timeout: float = 60,
+        probe_timeout: float = 15,
+        probe_concurrency: int = 32,
+        cache: bool = True,
+        cache_ttl: float = 3600,
+        cache_size: float = 256,
+        image_format: str = "png",
+        image_quality: int = 80,
+        max_height: int = 0,
+        thumbnail_width: int = 0,
+        postprocess_workers: int = None,
+        duplicates: str = "keep",
+        duplicate_threshold: int = DEFAULT_THRESHOLD,
+        storage: str = "flat",
+        archive_file: str = None,
+        incremental: str = None,
+        metrics_port: int = None,
+        metrics_file: str = None,
+        metrics_interval: float = 10,
+        max_retries: int = 2,
+        retry_delay: float = 5,
+        tor_control_port: int = None,
+        tor_control_password: str = None,
+        newnym_after: int = 3,
+        max_per_host: int = 1,
+        autoscale: bool = False,
+        min_pool_size: int = 1,
+        max_pool_size: int = None,
+        autoscale_interval: float = 15,
+        settings: dict = None,
+    ):
+        """
+        :param headless: If True, Firefox WebDriver instances are run in headless mode.
+        :param log_skipped: If True, skipped onions are logged.
+        :param page_load_strategy: When navigation to an onion is considered done: "normal", "eager" or "none".
+        :param render_profile: Which resources pages are rendered with: "full" (everything), "light"
+            (no media, web fonts, autoplay or cross-site images) or "text" (no JavaScript and no images).
+        :param viewport_only: If True, only the viewport is captured, instead of the full page.
+        :param navigate_timeout: Seconds to wait for an onion to load in the browser.
+        :param settle_timeout: Seconds to wait for a loaded onion to settle before capturing it.
+        :param screenshot_timeout: Seconds to wait for a screenshot to be taken.
+        :param tor_instances: Number of Tor instances to launch and shard across (0 uses the configured endpoint).
+        :param tor_base_port: SOCKS port of the first launched Tor instance.
+        :param socks_ports: Comma-separated Tor SOCKS ports (or host:port pairs) to shard across.
+        :param shard_strategy: How Tor SOCKS endpoints are assigned: "round-robin" or "least-loaded".
+        :param fetch_concurrency: Number of pages to fetch at once while crawling.
+        :param max_page_size: Maximum size (in MiB) of a page to read links from.
+        :param connect_timeout: Seconds to wait for a connection when fetching pages.
+        :param read_timeout: Seconds to wait for data when fetching pages.
+        :param probe_timeout: Seconds a crawled onion has to respond to a liveness probe before a WebDriver
+            instance is spent on it. 0 disables the probes.
+        :param probe_concurrency: Number of onions to probe at once (independently of the WebDriver pool).
+        :param cache: If True, crawled pages (and the links extracted from them) are cached on disk.
+        :param cache_ttl: Seconds a cached page is used before its server is asked whether it has changed.
+        :param cache_size: Maximum size (in MiB) of the page cache.
+        :param image_format: Format to save screenshots in: "png", "webp" or "jpeg".
+        :param image_quality: Quality of lossy screenshot formats (1-100).
+        :param max_height: Height (in pixels) to crop screenshots to. 0 doesn't crop.
+        :param thumbnail_width: Width (in pixels) of screenshot thumbnails to generate. 0 doesn't generate them.
+        :param postprocess_workers: Number of screenshot post-processing processes. If None, the number of CPUs is used.
+        :param duplicates: What to do with near-duplicate screenshots: "keep", "hardlink" or "drop".
+        :param duplicate_threshold: Maximum number of differing perceptual hash bits (out of 64) for near-duplicates.
+        :param storage: How screenshots are stored: "flat" (one file per onion in the seed's directory) or "sharded"
+            (content-addressed blobs in hash-sharded directories, mapped to onions by the capture index).
+        :param archive_file: Path to a tar archive the stored screenshots are also appended to, if set.
+        :param incremental: If set, captured onions are only captured again if their content changed, comparing
+            content hashes of their rendered DOM ("dom") or of an HTTP prefetch ("http").
+        :param metrics_port: If set, metrics are served on this local port (at /metrics) during runs.
+        :param metrics_file: If set, metrics are written to this file periodically during runs.
+        :param metrics_interval: Seconds between writes of the metrics file.
+        :param max_retries: Maximum number of times an onion that failed with a transient error is retried.
+        :param retry_delay: Seconds to wait before the first retry of an onion (doubled for each further retry).
+        :param tor_control_port: If set, new Tor circuits are requested through this control port
+            after repeated transient failures (launched Tor instances use their own control ports instead).
+        :param tor_control_password: Password of the Tor control port (cookie or null authentication if None).
+        :param newnym_after: Number of consecutive transient failures after which new Tor circuits are requested.
+        :param max_per_host: Maximum number of concurrent loads of the same onion host (0 for no cap).
+        :param autoscale: If True, the WebDriver pool (and the worker threads with it) is grown or shrunk
+            during runs, based on throughput, borrow wait times, CPU load and available memory.
+        :param min_pool_size: Minimum size of the autoscaled WebDriver pool.
+        :param max_pool_size: Maximum size of the autoscaled WebDriver pool
+            (default: the larger of the initial pool size and the number of CPUs).
+        :param autoscale_interval: Seconds between autoscaling decisions.
+        :param settings: The program's settings. If None, they are loaded from settings.json.
+        """
+        self.headless = headless
+        self.log_skipped = log_skipped
+        self.page_load_strategy = page_load_strategy
+        self.render_profile = render_profile
+        self.render_preferences = render_preferences(profile=render_profile)
+        self.viewport_only = viewport_only
+        self.navigate_timeout = navigate_timeout
+        self.settle_timeout = settle_timeout
+        self.screenshot_timeout = screenshot_timeout
+        self.tor_base_port = tor_base_port
+        self.incremental = incremental
+
+        # Initialise the screenshot post-processing options (the post-processor itself is started by each run)
+        self.postprocess_options = dict(
+            image_format=image_format,
+            quality=image_quality,
+            max_height=max_height,
+            thumbnail_width=thumbnail_width,
+            max_workers=postprocess_workers,
+        )
+        # The post-processor is only started if it changes the screenshots at all
+        self.postprocess_enabled = image_format != "png" or bool(
+            max_height or thumbnail_width
+        )
+        self.post_processor = None
+
+        # Initialise a lock for logging
         self.log_lock = Lock()
-        self.table_lock = Lock()
 
-        # Initialise queues for storing captured and skipped onions
-        self.captured_onions_queue = Queue()
-        self.skipped_onions_queue = Queue()
+        # Initialise the number of results of the current run, by status (results are streamed, not stored)
+        self.results_counts = Counter()
+
+        # Initialise the run's metrics (per-stage timings, counters and live gauges) and how they are exposed
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.describe_metrics()
+
+        # Initialise the retry settings (the retry scheduler itself is created by each run)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.newnym_after = newnym_after
+        self.retry_scheduler = None
+
+        # Initialise the capture scheduling settings
+        self.max_per_host = max_per_host
+
+        # Initialise the autoscaling settings, and the number of workers waiting to be retired by it
+        self.autoscale = autoscale
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.autoscale_interval = autoscale_interval
+        self.scaling_lock = RLock()
+        self.workers_to_retire = 0
+
+        # Initialise the event that stops the current run, when it is no longer being consumed
+        # or is stopped with stop() (each run replaces it with its own, see run_seed())
+        self.stop_event = Event()
+
+        # Initialise the directory where the screenshots of the current run are saved
+        self.output_directory = PROGRAM_DIRECTORY
+
+        # Initialise the on-disk index of captured onions
+        self.capture_index = CaptureIndex(
+            database_path=os.path.join(PROGRAM_DIRECTORY, "captures.db")
+        )
+
+        # Initialise the screenshot storage
+        self.screenshot_store = ScreenshotStore(
+            root=os.path.join(PROGRAM_DIRECTORY, "blobs"),
+            layout=storage,
+            archive_path=archive_file,
+        )
+        if self.screenshot_store.sharded:
+            os.makedirs(self.screenshot_store.staging_directory, exist_ok=True)
+
+        # Initialise the near-duplicate index (the hashes of previous captures are loaded by the first run)
+        if duplicates not in DUPLICATE_ACTIONS:
+            raise ValueError(
+                f"Duplicate action must be one of {', '.join(DUPLICATE_ACTIONS)}, not {duplicates!r}."
+            )
+        self.duplicates = duplicates
+        self.duplicate_index = None
+        self.duplicate_threshold = duplicate_threshold
+
+        # Initialise the WebDriver pool's launcher, cloned profiles, current size and measured warm-up time
+        self.pool_launcher = None
+        self.profile_templates = {}
+        self.profile_directories = []
+        self.driver_endpoints = {}
+        self.launched_instances = 0
+        self.pool_size = 0
+        self.initial_pool_size = 0
+        self.pool_warmup_time = None
+
+        # Initialise the resources of the open session (see open_session())
+        self.firefox_pool = None
+        self.metrics_exporters = []
+
+        # Initialise tor proxy settings (the settings are only loaded once)
+        socks5_settings = (settings or load_settings()).get("proxy").get("socks5")
+        self.socks_host = socks5_settings.get("host")
+        self.socks_port = socks5_settings.get("port")
+        self.socks_type = socks5_settings.get("type")
+        self.socks_version = socks5_settings.get("version")
+
+        # Initialise the Tor SOCKS endpoints that WebDriver instances and fetches are spread across
+        self.tor_instances_count = tor_instances
+        if tor_instances:
+            endpoints = [
+                (self.socks_host, tor_base_port + instance_index)
+                for instance_index in range(tor_instances)
+            ]
+        elif socks_ports:
+            endpoints = parse_socks_ports(ports=socks_ports, host=self.socks_host)
+        else:
+            endpoints = [(self.socks_host, self.socks_port)]
+        self.tor_shards = TorShards(endpoints=endpoints, strategy=shard_strategy)
+        self.tor_instances = []
+
+        # Initialise the Tor controllers used to request new circuits, by Tor SOCKS endpoint
+        # (the controllers of launched Tor instances are added once they are launched)
+        self.tor_controllers = {}
+        if tor_control_port and not tor_instances:
+            tor_controller = TorController(
+                host=self.socks_host,
+                port=tor_control_port,
+                password=tor_control_password,
+            )
+            self.tor_controllers = dict.fromkeys(self.tor_shards.endpoints, tor_controller)
+
+        # Initialise the on-disk cache of crawled pages
+        self.page_cache = (
+            ResponseCache(
+                database_path=os.path.join(PROGRAM_DIRECTORY, "page-cache.db"),
+                ttl=cache_ttl,
+                max_size=int(cache_size * 1024 * 1024),
+            )
+            if cache
+            else None
+        )
+
+        # Initialise the fetcher used for link extraction
+        self.fetcher = OnionFetcher(
+            tor_shards=self.tor_shards,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            concurrency=fetch_concurrency,
+            max_bytes=int(max_page_size * 1024 * 1024),
+            metrics=self.metrics,
+            cache=self.page_cache,
+        )
 
-        # Initialise tor proxy settings
-        self.socks_host = load_settings().get("proxy").get("socks5").get("host")
-        self.socks_port = load_settings().get("proxy").get("socks5").get("port")
-        self.socks_type = load_settings().get("proxy").get("socks5").get("type")
-        self.socks_version = load_settings().get("proxy").get("socks5").get("version")
+        # Initialise the liveness probe settings (the prober itself is started by each run)
+        self.probe_timeout = probe_timeout
+        self.probe_concurrency = probe_concurrency
 
-    def firefox_options(self, instance_index: int) -> Options:
+    def describe_metrics(self):
+        """
+        Sets the help texts of the metrics recorded by Tor2Tor.
+        """
+        for name, help_text in [
+            ("fetches", "Pages fetched over HTTP while crawling, by status."),
+            ("fetch_seconds", "Latency of HTTP fetches through Tor."),
+            ("extract_seconds", "Time spent extracting links from fetched pages."),
+            ("cache_lookups", "Page cache lookups, by result (hit, revalidated or miss)."),
+            ("probes", "Liveness probes of crawled onions, by outcome (alive or dead)."),
+            ("probe_seconds", "Latency of liveness probes through Tor."),
+            ("pool_wait_seconds", "Time workers waited to borrow a WebDriver instance."),
+            ("navigate_seconds", "Time spent loading onions in the browser (driver.get)."),
+            ("settle_seconds", "Time spent waiting for loaded onions to settle."),
+            ("screenshot_seconds", "Time spent taking and encoding screenshots in the browser."),
+            ("file_write_seconds", "Time spent writing screenshots to disk."),
+            ("postprocess_seconds", "Time spent post-processing screenshots."),
+            ("results", "Results of the onions, by status."),
+            ("retries", "Captures that failed with a transient error and were scheduled for a retry."),
+            ("pool_size", "Number of WebDriver instances in the pool."),
+            ("pool_in_use", "Number of WebDriver instances currently borrowed by workers."),
+            ("pool_utilization", "Fraction of the WebDriver pool currently in use."),
+            ("tasks_queue_depth", "Number of onions waiting to be captured."),
+            ("results_queue_depth", "Number of results waiting to be consumed."),
+            ("tor_streams_in_use", "Number of fetches and WebDriver instances using the Tor SOCKS endpoints."),
+        ]:
+            self.metrics.describe(name=name, help_text=help_text)
+
+    def firefox_profile_template(self, endpoint: tuple) -> str:
+        """
+        Builds (or reuses) a Firefox profile template with the Tor proxy preferences already applied.
+
+        WebDriver instances are started from clones of this template,
+        instead of building a fresh profile from preferences every time.
+
+        :param endpoint: The (host, port) tuple of the Tor SOCKS endpoint the profile should use.
+        :return: Path to the profile template directory.
+        """
+        socks_host, socks_port = endpoint
+        template_directory = os.path.join(
+            PROGRAM_DIRECTORY,
+            f"profile-template-{self.render_profile}-{socks_host}-{socks_port}",
+        )
+        user_js_path = os.path.join(template_directory, "user.js")
+
+        preferences = {
+            "network.proxy.type": self.socks_type,
+            "network.proxy.socks": socks_host,  # "127.0.0.1"
+            "network.proxy.socks_port": socks_port,
+            "network.proxy.socks_version": self.socks_version,
+            "network.proxy.socks_remote_dns": True,
+            "network.dns.blockDotOnion": False,
+            # The render profile's preferences (e.g. to block heavy resources)
+            **self.render_preferences,
+        }
+        user_js = "".join(
+            f"user_pref({json.dumps(name)}, {json.dumps(value)});\n"
+            for name, value in preferences.items()
+        )
+
+        # Only (re)write the template if the preferences have changed since it was last built
+        current_user_js = None
+        if os.path.exists(user_js_path):
+            with open(user_js_path) as file:
+                current_user_js = file.read()
+
+        if current_user_js != user_js:
+            os.makedirs(template_directory, exist_ok=True)
+            with open(user_js_path, "w") as file:
+                file.write(user_js)
+
+        return template_directory
+
+    def firefox_options(self, instance_index: int, profile_template: str) -> Options:
         """
         Configure Firefox options for web scraping with a headless browser and Tor network settings.
 
         :param instance_index: Index of the opened WebDriver instance in the firefox_pool.
+        :param profile_template: Path to the profile template to clone the instance's profile from.
         :returns: A Selenium WebDriver Options object with preset configurations.
         """
+        # Clone the profile template, so each instance gets its own profile directory
+        profile_directory = tempfile.mkdtemp(prefix=f"tor2tor-profile-{instance_index}-")
+        shutil.copytree(profile_template, profile_directory, dirs_exist_ok=True)
+        self.profile_directories.append(profile_directory)
+
         options = Options()
         options.add_argument("--incognito")
-        if args.headless:
+        if self.headless:
             options.add_argument("--headless")
             log.info(f"Running headless on WebDriver instance {instance_index}...")
-        options.set_preference("network.proxy.type", self.socks_type)
-        options.set_preference("network.proxy.socks", self.socks_host)  # "127.0.0.1"
-        options.set_preference("network.proxy.socks_port", self.socks_port)
-        options.set_preference("network.proxy.socks_version", self.socks_version)
-        options.set_preference("network.proxy.socks_remote_dns", True)
-        options.set_preference("network.dns.blockDotOnion", False)
+        options.add_argument("-profile")
+        options.add_argument(profile_directory)
+        options.page_load_strategy = self.page_load_strategy
         return options
 
     def open_firefox_pool(self, pool_size: int) -> Queue:
         """
         Initializes a queue of Firefox WebDriver instances for future use.
 
+        The instances are launched concurrently, and each one is added to the queue as soon as it is ready.
+        This method returns once the first instance is ready, while the rest keep launching in the background.
+
         :param pool_size: The number of Firefox instances to create.
         :return: A queue containing the created Firefox instances.
         """
@@ -78,117 +447,697 @@ class Tor2Tor:
 
         log.info(f"Opening WebDriver pool with {pool_size} instances...")
 
+        self.profile_templates = {
+            endpoint: self.firefox_profile_template(endpoint=endpoint)
+            for endpoint in self.tor_shards.endpoints
+        }
+        self.launched_instances = pool_size
+        self.pool_size = pool_size
+        start_time = time.perf_counter()
+        ready_instances = []
+
+        def launch_instance(instance_index: int):
+            self.launch_firefox_instance(pool=pool, instance_index=instance_index)
+
+            with self.log_lock:
+                ready_instances.append(instance_index)
+                if len(ready_instances) == pool_size:
+                    self.pool_warmup_time = time.perf_counter() - start_time
+                    log.info(
+                        f"WebDriver pool warmed up in {self.pool_warmup_time:.2f} seconds."
+                    )
+
         # Populate the pool with Firefox instances.
-        for instance_index, webdriver_instance in enumerate(
-            range(pool_size), start=1
-        ):  # Create 3 (default) instances
-            driver = webdriver.Firefox(
-                options=self.firefox_options(instance_index=instance_index),
+        self.pool_launcher = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="tor2tor-webdriver"
+        )
+        pending_launches = {
+            self.pool_launcher.submit(launch_instance, instance_index)
+            for instance_index in range(1, pool_size + 1)  # Create 3 (default) instances
+        }
+
+        # Wait until the first instance is ready, so workers can start capturing straight away
+        while pending_launches:
+            done_launches, pending_launches = wait(
+                pending_launches, return_when=FIRST_COMPLETED
             )
-            pool.put(driver)
+            for launch in done_launches:
+                if launch.exception() is not None:
+                    log.error(
+                        f"Failed to open WebDriver instance: [red]{launch.exception()}[/]"
+                    )
+                    with self.scaling_lock:
+                        self.pool_size -= 1
+            if not pool.empty():
+                break
+        else:
+            if pool.empty():
+                raise RuntimeError("None of the WebDriver instances could be opened.")
 
+        log.info(
+            f"First WebDriver instance ready in {time.perf_counter() - start_time:.2f} seconds."
+        )
         return pool
 
-    @staticmethod
-    def close_firefox_pool(pool: Queue):
+    def launch_firefox_instance(self, pool: Queue, instance_index: int):
+        """
+        Launches a Firefox WebDriver instance and adds it to the pool.
+
+        :param pool: The pool to add the instance to.
+        :param instance_index: Index of the instance, used in its profile directory's name.
+        """
+        # Each instance keeps the Tor SOCKS endpoint it is assigned for as long as it is open
+        endpoint = self.tor_shards.acquire()
+        log.debug(
+            f"WebDriver instance {instance_index} uses the Tor SOCKS endpoint {endpoint[0]}:{endpoint[1]}"
+        )
+
+        try:
+            driver = webdriver.Firefox(
+                options=self.firefox_options(
+                    instance_index=instance_index,
+                    profile_template=self.profile_templates[endpoint],
+                ),
+            )
+        except Exception:
+            self.tor_shards.release(endpoint=endpoint)
+            raise
+        driver.set_page_load_timeout(self.navigate_timeout)
+        self.driver_endpoints[driver] = endpoint
+        pool.put(driver)
+
+    def close_firefox_instance(self, driver):
+        """
+        Closes a Firefox WebDriver instance, and releases its Tor SOCKS endpoint.
+
+        :param driver: The WebDriver instance to close.
+        """
+        driver.quit()
+        endpoint = self.driver_endpoints.pop(driver, None)
+        if endpoint is not None:
+            self.tor_shards.release(endpoint=endpoint)
+
+    def resize_firefox_pool(self, pool: Queue, size: int):
+        """
+        Grows or shrinks the pool of Firefox instances towards a given size.
+
+        New instances are launched in the background. Only idle instances are closed,
+        so a pool whose instances are all borrowed shrinks on a later call.
+
+        :param pool: The pool of Firefox WebDriver instances.
+        :param size: The size to resize the pool to.
+        """
+
+        def launch_done(launch: Future):
+            if launch.exception() is not None:
+                log.error(f"Failed to open WebDriver instance: [red]{launch.exception()}[/]")
+                with self.scaling_lock:
+                    self.pool_size -= 1
+
+        with self.scaling_lock:
+            while self.pool_size < size:
+                self.pool_size += 1
+                self.launched_instances += 1
+                self.pool_launcher.submit(
+                    self.launch_firefox_instance, pool, self.launched_instances
+                ).add_done_callback(launch_done)
+
+            while self.pool_size > size:
+                try:
+                    driver = pool.get_nowait()
+                except Empty:
+                    break
+                self.close_firefox_instance(driver=driver)
+                self.pool_size -= 1
+
+    def close_firefox_pool(self, pool: Queue):
         """
         Closes all the Firefox instances in the pool.
 
         :param pool: The pool containing Firefox WebDriver instances to close.
         """
         log.info("Closing WebDriver pool...")
+
+        # Wait for instances that are still launching, so they are closed as well
+        if self.pool_launcher is not None:
+            self.pool_launcher.shutdown(wait=True)
+
         while not pool.empty():
             driver = pool.get()
-            driver.quit()
+            self.close_firefox_instance(driver=driver)
+        self.pool_size = 0
 
-    def worker(self, tasks_queue: Queue, screenshots_table: Table, firefox_pool: Queue):
+        # Remove the instances' cloned profiles
+        for profile_directory in self.profile_directories:
+            shutil.rmtree(profile_directory, ignore_errors=True)
+        self.profile_directories.clear()
+
+    def worker(
+        self,
+        tasks_queue: CaptureScheduler,
+        firefox_pool: Queue,
+        results_queue: Queue,
+    ):
         """
         Worker function to capture screenshots of websites.
 
         This function is intended to be used as a target for a Thread. It captures screenshots
-        of websites as tasks are fed via the queue. The function borrows a Firefox instance from
-        the pool for each task and returns it after the task is complete.
+        of websites as tasks are fed via the queue, until it receives a None task. The function borrows
+        a Firefox instance from the pool for each task and returns it after the task is complete.
 
-        :param tasks_queue: The queue containing tasks (websites to capture).
-        :param screenshots_table: A table where captured screenshot metadata is stored.
+        :param tasks_queue: The scheduler containing tasks (websites to capture).
         :param firefox_pool: The pool of Firefox WebDriver instances.
+        :param results_queue: The queue where the result of each task is added.
         """
-        onion_index = None
-        driver = None
-        onion = None
+        # Continue working until a None task is received (or the worker is retired by the autoscaler)
+        while True:
+            with self.scaling_lock:
+                if self.workers_to_retire > 0:
+                    self.workers_to_retire -= 1
+                    break
+
+            # Get a new task from the queue
+            task = tasks_queue.get()
+            if task is None:
+                tasks_queue.task_done()
+                break
+
+            task = CaptureTask(*task)
+            onion_index, onion, attempt = task
+            driver = None
+            retry_scheduled = False
+            capture_key = construct_output_name(url=add_http_to_link(link=onion))
+            filename, file_path = self.screenshot_path(onion_url=onion)
+            started_at = time.time()
+            already_captured = False
+            content_hash = None
+
+            if self.stop_event.is_set():
+                # The run has been stopped, so the remaining tasks are dropped
+                tasks_queue.release(task=task)
+                tasks_queue.task_done()
+                continue
 
-        # Continue working as long as the queue is not empty
-        while not tasks_queue.empty():
             try:
-                # Get a new task from the queue
-                onion_index, onion = tasks_queue.get()
+                # In incremental mode, captured onions are checked for changes against their last content hash
+                previous_content_hash = (
+                    self.previous_content_hash(key=capture_key, file_path=file_path)
+                    if self.incremental
+                    else None
+                )
 
-                driver = firefox_pool.get()
+                # Check the capture index before borrowing a Firefox instance,
+                # so an onion that is already captured does not cost a page load.
+                # (In incremental mode, captures without a content hash are captured again to get one.)
+                if not self.incremental and self.capture_index.is_captured(
+                    key=capture_key, file_path=file_path
+                ):
+                    log.info(
+                        f"{onion_index} [yellow][italic]{filename}[/][/] already exists."
+                    )
+                    already_captured = True
+                else:
+                    if self.incremental == "http":
+                        # Compare the hash of a cheap HTTP prefetch before borrowing a Firefox instance
+                        content_hash = self.prefetch_content_hash(onion_url=onion)
+                        if content_hash == previous_content_hash:
+                            raise ContentUnchanged(content_hash=content_hash)
+
+                    with self.metrics.timer("pool_wait_seconds"):
+                        driver = firefox_pool.get()
+                    started_at = time.time()
+
+                    # Capture the screenshot
+                    _, page_content_hash = self.capture_onion(
+                        onion_url=onion,
+                        onion_index=onion_index,
+                        driver=driver,
+                        previous_content_hash=previous_content_hash,
+                    )
+                    content_hash = content_hash or page_content_hash
+                    self.retry_scheduler.record_success(
+                        endpoint=self.driver_endpoints.get(driver)
+                    )
 
-                # Capture the screenshot
-                self.capture_onion(
-                    onion_url=onion,
+                capture = dict(
+                    results_queue=results_queue,
                     onion_index=onion_index,
-                    driver=driver,
-                    screenshots_table=screenshots_table,
-                )
-                self.captured_onions_queue.put(
-                    (
-                        onion_index,
-                        onion,
-                        convert_timestamp_to_datetime(timestamp=time.time()),
-                    )
+                    onion=onion,
+                    capture_key=capture_key,
+                    file_path=file_path,
+                    started_at=started_at,
+                    finished_at=time.time(),
+                    already_captured=already_captured,
+                    content_hash=content_hash,
+                    attempts=attempt,
                 )
 
-                # On successful capture, return the Firefox instance back to the pool and mark the task as done
-                # Do the same on exception.
-                firefox_pool.put(driver)
-                tasks_queue.task_done()
+                if self.post_processor is not None and not already_captured:
+                    # Post-process the screenshot in the process pool, and record the capture once it is processed
+                    self.post_processor.submit(
+                        file_path=file_path,
+                        callback=lambda processing, capture=capture: self.record_capture(
+                            processing=processing, **capture
+                        ),
+                    )
+                else:
+                    self.record_capture(**capture)
 
+            except ContentUnchanged:
+                self.record_unchanged(
+                    results_queue=results_queue,
+                    onion_index=onion_index,
+                    onion=onion,
+                    capture_key=capture_key,
+                    attempts=attempt,
+                )
             except KeyboardInterrupt:
                 log.warning("User interruption detected ([yellow]Ctrl+C[/])")
                 sys.exit()
             except Exception as e:
-                if args.log_skipped:
+                # Every failed attempt counts in the onion's history, which the scheduler prioritises onions by
+                self.capture_index.mark_failed(
+                    key=capture_key, started_at=started_at, finished_at=time.time()
+                )
+
+                # Onions that failed with a transient error are retried later, unless the run has been stopped
+                retry_delay = (
+                    self.retry_scheduler.schedule(
+                        task=task,
+                        error=e,
+                        endpoint=self.driver_endpoints.get(driver),
+                    )
+                    if not self.stop_event.is_set()
+                    else None
+                )
+                if retry_delay is not None:
+                    retry_scheduled = True
+                    self.metrics.increment("retries")
+                    log.info(
+                        f"{onion_index} Retrying {onion} in {retry_delay:.0f} seconds "
+                        f"(attempt {attempt + 1}/{self.max_retries + 1}): [yellow]{e}[/]"
+                    )
+                    continue
+
+                if self.log_skipped:
                     log.error(f"{onion_index} [yellow]{e}[/]")
 
+                self.capture_index.mark_skipped(
+                    key=capture_key,
+                    reason=str(e),
+                    started_at=started_at,
+                    finished_at=time.time(),
+                )
+
                 # Add the skipped onion index, the onion itself, the time it was skipped, and the reason it was skipped
-                self.skipped_onions_queue.put(
-                    (
-                        onion_index,
-                        onion,
-                        f"[yellow]{e}[/]",
-                        convert_timestamp_to_datetime(timestamp=time.time()),
-                    )
+                skipped_at = convert_timestamp_to_datetime(timestamp=time.time())
+                results_queue.put(
+                    {
+                        "index": onion_index,
+                        "onion": onion,
+                        "status": "skipped",
+                        "file": None,
+                        "thumbnail": None,
+                        "processing_time": None,
+                        "phash": None,
+                        "duplicate_of": None,
+                        "already_captured": False,
+                        "attempts": attempt,
+                        "render_profile": self.render_profile,
+                        "reason": str(e),
+                        "timestamp": skipped_at,
+                    }
                 )
+            finally:
+                # Return the Firefox instance back to the pool, release the onion's host,
+                # and mark the task as done (a retried task is marked as done by the retry scheduler,
+                # once it has been re-enqueued)
+                if driver is not None:
+                    firefox_pool.put(driver)
+                tasks_queue.release(task=task)
+                if not retry_scheduled:
+                    tasks_queue.task_done()
+
+    def record_capture(
+        self,
+        results_queue: Queue,
+        onion_index: int,
+        onion: str,
+        capture_key: str,
+        file_path: str,
+        started_at: float,
+        finished_at: float,
+        already_captured: bool,
+        content_hash: str = None,
+        attempts: int = 1,
+        processing: Future = None,
+    ):
+        """
+        Records a captured onion in the capture index and the results queue.
+
+        :param results_queue: The queue where the capture's result is added.
+        :param onion_index: Index of the onion from the scraper task.
+        :param onion: The onion url.
+        :param capture_key: The capture key (output name) of the onion.
+        :param file_path: Path to the onion's screenshot.
+        :param started_at: Unix timestamp of when the capture started.
+        :param finished_at: Unix timestamp of when the capture finished.
+        :param already_captured: True if the onion had been captured before, so nothing new was captured.
+        :param content_hash: Hash of the onion's normalised content, if it was computed (in incremental mode).
+        :param attempts: Number of attempts it took to capture the onion.
+        :param processing: The future of the screenshot's post-processing, if it was post-processed.
+        """
+        thumbnail_path = None
+        processing_time = None
+        phash = None
+        duplicate_of = None
 
-                firefox_pool.put(driver)
-                tasks_queue.task_done()
+        if processing is not None:
+            try:
+                processed = processing.result()
+                file_path = processed.get("file")
+                thumbnail_path = processed.get("thumbnail")
+                processing_time = processed.get("processing_time")
+                phash = processed.get("phash")
+                self.metrics.observe("postprocess_seconds", processing_time)
+            except Exception as e:
+                # The original screenshot is kept if it could not be processed
+                log.warning(
+                    f"{onion_index} Failed to post-process {os.path.basename(file_path)}: [yellow]{e}[/]"
+                )
+
+        if not already_captured:
+            try:
+                if phash is None:
+                    phash = perceptual_hash(image=file_path)
+            except Exception as e:
+                log.warning(
+                    f"{onion_index} Failed to hash {os.path.basename(file_path)}: [yellow]{e}[/]"
+                )
+
+            # Store the finished screenshot (as a content-addressed blob, in the sharded layout)
+            file_path, sha256 = self.screenshot_store.put(file_path=file_path, key=capture_key)
+            if thumbnail_path is not None:
+                thumbnail_path, _ = self.screenshot_store.put(file_path=thumbnail_path)
+
+            if phash is not None:
+                file_path, thumbnail_path, duplicate_of = self.deduplicate_capture(
+                    onion_index=onion_index,
+                    capture_key=capture_key,
+                    file_path=file_path,
+                    thumbnail_path=thumbnail_path,
+                    phash=phash,
+                )
+                if duplicate_of is not None:
+                    # The screenshot may have been replaced by (or pointed at) its canonical copy
+                    sha256 = get_file_hash(filename=file_path)
+
+            self.capture_index.mark_captured(
+                key=capture_key,
+                file_path=file_path,
+                sha256=sha256,
+                started_at=started_at,
+                finished_at=finished_at,
+                phash=phash,
+                duplicate_of=duplicate_of,
+                content_hash=content_hash,
+                render_profile=self.render_profile,
+            )
+
+        captured_at = convert_timestamp_to_datetime(timestamp=time.time())
+        results_queue.put(
+            {
+                "index": onion_index,
+                "onion": onion,
+                "status": "captured",
+                "file": file_path,
+                "thumbnail": thumbnail_path,
+                "processing_time": processing_time,
+                "phash": f"{phash:016x}" if phash is not None else None,
+                "duplicate_of": duplicate_of,
+                "already_captured": already_captured,
+                "attempts": attempts,
+                "render_profile": self.render_profile,
+                "reason": None,
+                "timestamp": captured_at,
+            }
+        )
+
+    def record_unchanged(
+        self,
+        results_queue: Queue,
+        onion_index: int,
+        onion: str,
+        capture_key: str,
+        attempts: int = 1,
+    ):
+        """
+        Records an onion whose content hasn't changed since it was last captured.
+
+        :param results_queue: The queue where the onion's result is added.
+        :param onion_index: Index of the onion from the scraper task.
+        :param onion: The onion url.
+        :param capture_key: The capture key (output name) of the onion.
+        :param attempts: Number of attempts it took to check the onion.
+        """
+        self.capture_index.mark_unchanged(key=capture_key, checked_at=time.time())
+        entry = self.capture_index.get(key=capture_key) or {}
+
+        log.info(f"{onion_index} [dim]{onion}[/] is unchanged.")
+
+        checked_at = convert_timestamp_to_datetime(timestamp=time.time())
+        results_queue.put(
+            {
+                "index": onion_index,
+                "onion": onion,
+                "status": "unchanged",
+                "file": entry.get("file"),
+                "thumbnail": None,
+                "processing_time": None,
+                "phash": entry.get("phash"),
+                "duplicate_of": entry.get("duplicate_of"),
+                "already_captured": True,
+                "attempts": attempts,
+                "render_profile": self.render_profile,
+                "reason": None,
+                "timestamp": checked_at,
+            }
+        )
+
+    def record_probe_failure(
+        self, results_queue: Queue, task: CaptureTask, error: Exception, started_at: float
+    ):
+        """
+        Records an onion that failed its liveness probe as skipped, without capturing it.
+
+        :param results_queue: The queue where the onion's result is added.
+        :param task: The onion's task.
+        :param error: The error the probe failed with.
+        :param started_at: Unix timestamp of when the probe started.
+        """
+        # Timeouts have no message, so they are described by their type
+        reason = f"probe failed: {str(error) or type(error).__name__}"
+        if self.log_skipped:
+            log.error(f"{task.index} [yellow]{task.onion} {reason}[/]")
+
+        self.capture_index.mark_skipped(
+            key=construct_output_name(url=add_http_to_link(link=task.onion)),
+            reason=reason,
+            started_at=started_at,
+            finished_at=time.time(),
+        )
+
+        skipped_at = convert_timestamp_to_datetime(timestamp=time.time())
+        results_queue.put(
+            {
+                "index": task.index,
+                "onion": task.onion,
+                "status": "skipped",
+                "file": None,
+                "thumbnail": None,
+                "processing_time": None,
+                "phash": None,
+                "duplicate_of": None,
+                "already_captured": False,
+                "attempts": 0,
+                "render_profile": self.render_profile,
+                "reason": reason,
+                "timestamp": skipped_at,
+            }
+        )
+
+    def previous_content_hash(self, key: str, file_path: str) -> Optional[str]:
+        """
+        Gets the content hash an onion had when it was last captured.
+
+        :param key: The capture key (output name) of the onion.
+        :param file_path: Path where the onion's screenshot is expected to be.
+        :return: The content hash, or None if the onion has no capture (or no content hash) to compare to.
+        """
+        if not self.capture_index.is_captured(key=key, file_path=file_path):
+            return None
+        entry = self.capture_index.get(key=key)
+        return entry.get("content_hash") if entry is not None else None
+
+    def prefetch_content_hash(self, onion_url: str) -> str:
+        """
+        Fetches an onion over HTTP (without rendering it) and hashes its normalised content.
+
+        :param onion_url: The onion URL to fetch.
+        :return: The content hash of the onion.
+        """
+        response = self.fetcher.get(url=add_http_to_link(link=onion_url), stream=True)
+        with response:
+            # Read at most the maximum page size, like the link extractor does
+            content = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                content += chunk
+                if len(content) >= self.fetcher.max_bytes:
+                    break
+
+        page_source = bytes(content[: self.fetcher.max_bytes]).decode(
+            response.encoding or "utf-8", errors="replace"
+        )
+        return get_content_hash(page_source=page_source)
+
+    def deduplicate_capture(
+        self,
+        onion_index: int,
+        capture_key: str,
+        file_path: str,
+        thumbnail_path: Optional[str],
+        phash: int,
+    ) -> tuple:
+        """
+        Adds a screenshot to the near-duplicate index, and keeps, hardlinks or drops it if it is a near-duplicate.
+
+        :param onion_index: Index of the onion from the scraper task.
+        :param capture_key: The capture key (output name) of the onion.
+        :param file_path: Path to the onion's screenshot.
+        :param thumbnail_path: Path to the screenshot's thumbnail, if one was generated.
+        :param phash: Perceptual hash of the screenshot.
+        :return: A tuple containing the screenshot's (possibly canonical) file path, its thumbnail path
+            and the capture key of the onion it is a near-duplicate of: (file_path, thumbnail_path, duplicate_of).
+        """
+        canonical = self.duplicate_index.add(
+            key=capture_key, file_path=file_path, phash=phash
+        )
+        if canonical is None:
+            return file_path, thumbnail_path, None
+
+        canonical_key, canonical_path = canonical
+        log.info(
+            f"{onion_index} [yellow][italic]{os.path.basename(file_path)}[/][/] is a near-duplicate of "
+            f"[italic]{os.path.basename(canonical_path)}[/]."
+        )
+
+        # Blobs of the sharded layout aren't named per onion, so hardlinking one amounts to dropping it
+        drop = self.duplicates == "drop" or (
+            self.duplicates == "hardlink" and self.screenshot_store.sharded
+        )
+        if drop and os.path.exists(canonical_path) and canonical_path != file_path:
+            # Point the capture at the canonical copy instead of keeping its own screenshot
+            # (unless, in the sharded layout, other captures use the same blob)
+            if not self.screenshot_store.sharded or not self.capture_index.file_references(
+                file_path=file_path, exclude_key=capture_key
+            ):
+                os.remove(file_path)
+                if thumbnail_path is not None and os.path.exists(thumbnail_path):
+                    os.remove(thumbnail_path)
+            return canonical_path, None, canonical_key
+
+        if self.duplicates == "hardlink":
+            try:
+                link_duplicate(file_path=file_path, canonical_path=canonical_path)
+            except OSError as e:
+                log.warning(
+                    f"{onion_index} Failed to hardlink {os.path.basename(file_path)}: [yellow]{e}[/]"
+                )
+
+        return file_path, thumbnail_path, canonical_key
 
     def execute_worker(
         self,
         worker_threads: int,
         tasks_queue: Queue,
-        screenshots_table: Table,
         firefox_pool: Queue,
-    ):
+        results_queue: Queue,
+    ) -> list:
         """
-        Executes the worker method.
+        Starts the worker method in n number of threads.
+
+        The workers keep running until they are stopped with stop_workers(), so tasks can be added
+        to the queue while they are already capturing.
 
         :param worker_threads: Number of threads to execute the worker with.
         :param tasks_queue: The queue containing tasks (websites to capture).
-        :param screenshots_table: The table where captured screenshots will be added.
         :param firefox_pool: A pool containing n number of firefox instances.
+        :param results_queue: The queue where the workers add the result of each task.
+        :return: A list of the started worker threads.
         """
         # Initialize threads
         threads = []
         for _ in range(worker_threads):  # create 3 (default) worker threads
             t = Thread(
-                target=self.worker, args=(tasks_queue, screenshots_table, firefox_pool)
+                target=self.worker, args=(tasks_queue, firefox_pool, results_queue)
             )
             t.start()
             threads.append(t)
 
+        return threads
+
+    def resize_workers(
+        self,
+        threads: list,
+        size: int,
+        tasks_queue: Queue,
+        firefox_pool: Queue,
+        results_queue: Queue,
+    ):
+        """
+        Starts or retires worker threads, so a given number of them are running.
+
+        Retired workers finish their current task first. They stay in the threads list,
+        so stop_workers() still joins them.
+
+        :param threads: The started worker threads. New threads are appended to it.
+        :param size: The number of workers to run.
+        :param tasks_queue: The queue containing tasks (websites to capture).
+        :param firefox_pool: A pool containing n number of firefox instances.
+        :param results_queue: The queue where the workers add the result of each task.
+        """
+        with self.scaling_lock:
+            running = sum(thread.is_alive() for thread in threads) - self.workers_to_retire
+
+            if size < running:
+                self.workers_to_retire += running - size
+                return
+
+            # Cancel pending retirements before starting new threads
+            cancelled = min(self.workers_to_retire, size - running)
+            self.workers_to_retire -= cancelled
+            for _ in range(size - running - cancelled):
+                thread = Thread(
+                    target=self.worker, args=(tasks_queue, firefox_pool, results_queue)
+                )
+                thread.start()
+                threads.append(thread)
+
+    @staticmethod
+    def stop_workers(threads: list, tasks_queue: Queue):
+        """
+        Waits for all queued tasks to be processed, then stops the worker threads.
+
+        :param threads: The worker threads to stop.
+        :param tasks_queue: The queue the workers are consuming tasks from.
+        """
+        # Wait for all the queued tasks to be done
+        tasks_queue.join()
+
+        # Send a None task to each worker, so it breaks out of its loop
+        for _ in threads:
+            tasks_queue.put(None)
+
         # Wait for all threads to finish
         for thread in threads:
             thread.join()
@@ -201,120 +1150,769 @@ class Tor2Tor:
         :return: A BeautifulSoup object containing the parsed HTML content.
         """
 
-        # Define the SOCKS5 proxy settings
-        proxies = {
-            "http": f"socks5h://{self.socks_host}:{self.socks_port}",
-            "https": f"socks5h://{self.socks_host}:{self.socks_port}",
-        }
-
-        # Perform the HTTP GET request
-        response = requests.get(onion_url, proxies=proxies)
+        # Perform the HTTP GET request over the fetcher's pooled connections (or get the page from the cache)
+        page_content = self.fetcher.fetch(url=onion_url)
 
         # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = BeautifulSoup(page_content, "html.parser")
 
         return soup
 
-    def get_onions_on_page(self, onion_url: str) -> list:
+    def get_onions_on_page(self, onion_url: str, page_content: bytes = None) -> list:
         """
         Scrapes a given onion URL and extracts all valid URLs found in <a> tags.
 
+        The page is streamed through the extractor in a single pass, and reading stops at the page size cap.
+
         :param onion_url: The onion URL to scrape.
+        :param page_content: The page's already fetched HTML content. If None, the page is fetched.
         :return: A list of valid URLs found on the page.
-
-        Regex Explanation:
-        -----------------
-        - `https?`: Matches either 'http' or 'https'.
-        - `://`: Matches the '://' that follows the protocol.
-        - `\\S+`: Matches one or more non-whitespace characters.
         """
+        max_bytes = self.fetcher.max_bytes
 
-        # Initialize an empty list to store valid URLs
-        valid_onions = []
-
-        # Fetch the page content
-        page_content = self.get_onion_response(onion_url=onion_url)
+        if self.page_cache is not None:
+            if page_content is None:
+                page_content = self.fetcher.fetch(url=onion_url)
 
-        # Define the regex pattern to match URLs
-        url_pattern = re.compile(r"https?://\S+")
+            # The links of a page that hasn't changed since it was cached don't have to be extracted again
+            cached_onions = self.page_cache.links(url=onion_url)
+            if cached_onions is not None:
+                log.info(f"Found {len(cached_onions)} links on {onion_url} (cached)")
+                return cached_onions
 
-        # Find all <a> tags in the HTML content
-        found_onions = page_content.find_all("a")
+        if page_content is None:
+            # Stream the page content from the response
+            response = self.fetcher.get(url=onion_url, stream=True)
+            try:
+                # (This includes the time spent streaming the page)
+                with self.metrics.timer("extract_seconds"):
+                    valid_onions = list(
+                        iter_onion_links(
+                            chunks=response.iter_content(chunk_size=64 * 1024),
+                            max_bytes=max_bytes,
+                        )
+                    )
+            finally:
+                response.close()
+        else:
+            with self.metrics.timer("extract_seconds"):
+                valid_onions = list(
+                    iter_onion_links(chunks=[page_content], max_bytes=max_bytes)
+                )
 
-        # Loop through each <a> tag and extract the href attribute
-        for onion_index, onion in enumerate(found_onions, start=1):
-            href = onion.get("href")
-            # Check if the 'href' attribute exists and is not None
-            if href:
-                # Find all URLs in the 'href' attribute using the regex pattern
-                urls = url_pattern.findall(href)
-                # Loop through each URL found in the 'href' attribute
-                for url in urls:
-                    # Check if the URL is a valid Onion URL
-                    if is_valid_onion(url):
-                        # Append the valid Onion URL to the list of valid_onion_urls
-                        valid_onions.append(url)
+        if self.page_cache is not None:
+            self.page_cache.store_links(url=onion_url, links=valid_onions)
 
         log.info(f"Found {len(valid_onions)} links on {onion_url}")
         return valid_onions
 
+    def crawl_onions(
+        self,
+        seed_onion: str,
+        depth: int,
+        limit: int,
+        tasks_queue: Queue,
+        resume: bool = False,
+    ) -> int:
+        """
+        Crawls onion links breadth-first, starting from a seed onion, and adds newly found
+        onions to the tasks queue.
+
+        Onions are deduplicated across hops, so an onion that is linked more than once is only queued once.
+
+        :param seed_onion: The onion to start crawling from.
+        :param depth: Number of hops to crawl away from the seed onion (1 only crawls the seed page).
+        :param limit: Maximum number of onions to add to the tasks queue. If the tasks queue is a LivenessProber,
+            the onions that fail their liveness probe don't count.
+        :param tasks_queue: The queue where onions to capture will be added.
+        :param resume: If True, onions left pending by a previous (interrupted) run of the seed are queued first.
+        :return: The number of onions added to the tasks queue (that passed their liveness probe, if probed).
+        """
+        seed_url = add_http_to_link(link=seed_onion)
+        seed_key = construct_output_name(url=seed_url)
+
+        # Pages whose links have been (or will be) extracted, and onions that have been queued for capture.
+        # Both are keyed canonically, so a page or service reached through different urls is only visited once.
+        crawled_pages = VisitedSet()
+        queued_onions = VisitedSet()
+        crawled_pages.add(key=canonical_url(url=seed_url))
+
+        # Each frontier entry holds a page url and the number of hops it is away from the seed
+        frontier = deque([(seed_url, 0)])
+        onion_index = 0
+        probed = isinstance(tasks_queue, LivenessProber)
+
+        def queued() -> int:
+            # Onions that failed their liveness probe never reach the workers, so they don't count
+            return onion_index - (tasks_queue.dead if probed else 0)
+
+        def below_limit() -> bool:
+            if queued() < limit:
+                return True
+            if probed:
+                # The limit is reached if every probe in flight succeeds: wait for them, to know whether they did
+                tasks_queue.join()
+                return queued() < limit
+            return False
+
+        if resume:
+            pending_onions = self.capture_index.pending(seed=seed_key)
+            log.info(f"Resuming {len(pending_onions)} pending onions of {seed_url}...")
+            for capture_key, onion in pending_onions:
+                if not below_limit():
+                    break
+                queued_onions.add(key=capture_key)
+                onion_index += 1
+                tasks_queue.put(CaptureTask(index=onion_index, onion=onion))
+
+        while frontier and below_limit() and not self.stop_event.is_set():
+            # Fetch the next batch of frontier pages concurrently
+            batch = [
+                frontier.popleft()
+                for _ in range(min(len(frontier), self.fetcher.concurrency))
+            ]
+            responses = self.fetcher.fetch_many(urls=[page_url for page_url, _ in batch])
+
+            for (page_url, page_depth), (_, page_content) in zip(batch, responses):
+                if not below_limit():
+                    break
+
+                try:
+                    if isinstance(page_content, Exception):
+                        raise page_content
+                    onions = self.get_onions_on_page(
+                        onion_url=page_url, page_content=page_content
+                    )
+                except Exception as e:
+                    if page_depth == 0:
+                        # There is nothing to crawl if the seed page cannot be fetched
+                        raise
+                    log.warning(f"Failed to crawl {page_url}: [yellow]{e}[/]")
+                    continue
+
+                for onion in onions:
+                    capture_key = construct_output_name(url=onion)
+                    if queued_onions.add(key=capture_key):
+                        self.capture_index.mark_pending(
+                            key=capture_key, url=onion, seed=seed_key
+                        )
+                        onion_index += 1
+                        tasks_queue.put(CaptureTask(index=onion_index, onion=onion))
+
+                        if not below_limit():
+                            # If the number of queued onions is equal to the limit set in -l/--limit, stop crawling.
+                            break
+
+                    # Only crawl the onion's page if it is within the set depth
+                    if page_depth + 1 < depth and crawled_pages.add(key=canonical_url(url=onion)):
+                        frontier.append((onion, page_depth + 1))
+
+        if probed:
+            tasks_queue.join()
+        log.info(f"Queued {queued()} onions for capture.")
+        return queued()
+
+    def screenshot_path(self, onion_url: str) -> tuple:
+        """
+        Constructs the filename and the full file path of a given onion's screenshot.
+
+        :param onion_url: The onion URL to construct the screenshot path for.
+        :return: A tuple containing the filename and the full file path: (filename, file_path).
+        """
+        # Construct the filename for the screenshot from the onion link
+        filename = construct_output_name(url=add_http_to_link(link=onion_url)) + ".png"
+
+        # Construct the full file path (in the sharded layout, screenshots are staged until they are stored as blobs)
+        directory = (
+            self.screenshot_store.staging_directory
+            if self.screenshot_store.sharded
+            else self.output_directory
+        )
+        file_path = os.path.join(directory, filename)
+
+        return filename, file_path
+
+    def save_screenshot(self, driver: webdriver, file_path: str, full_page: bool):
+        """
+        Saves a screenshot of the current page within the screenshot deadline.
+
+        :param driver: The webdriver instance to take the screenshot with.
+        :param file_path: Path to save the screenshot to.
+        :param full_page: If True, the full page is captured. Otherwise, only the viewport is captured.
+        :raise CaptureTimeout: If the screenshot is not taken within the screenshot deadline.
+        """
+        # Bound the screenshot command by temporarily lowering the driver's command timeout
+        client_config = driver.command_executor.client_config
+        command_timeout = client_config.timeout
+        client_config.timeout = self.screenshot_timeout
+
+        try:
+            with self.metrics.timer("screenshot_seconds"):
+                if full_page:
+                    png = driver.get_full_page_screenshot_as_png()
+                else:
+                    png = driver.get_screenshot_as_png()
+        except urllib3.exceptions.TimeoutError:
+            raise CaptureTimeout(phase="screenshot")
+        finally:
+            client_config.timeout = command_timeout
+
+        # Write to a temporary file first, so a killed run never leaves a truncated screenshot behind
+        with self.metrics.timer("file_write_seconds"):
+            temporary_path = f"{file_path}.tmp"
+            with open(temporary_path, "wb") as screenshot_file:
+                screenshot_file.write(png)
+            os.replace(temporary_path, file_path)
+
+    def save_partial_capture(self, driver: webdriver, file_path: str) -> Optional[str]:
+        """
+        Stops loading the current page and captures what has been rendered so far.
+
+        :param driver: The webdriver instance to take the screenshot with.
+        :param file_path: Path to save the partial capture to.
+        :return: Path to the partial capture, or None if it could not be taken.
+        """
+        try:
+            driver.execute_script("window.stop();")
+            self.save_screenshot(driver=driver, file_path=file_path, full_page=False)
+            return file_path
+        except Exception as e:
+            log.debug(f"Failed to take a partial capture: {e}")
+            return None
+
     def capture_onion(
-        self, onion_url: str, onion_index, driver: webdriver, screenshots_table: Table
-    ):
+        self,
+        onion_url: str,
+        onion_index,
+        driver: webdriver,
+        previous_content_hash: str = None,
+    ) -> tuple:
         """
         Captures a screenshot of a given onion link using a webdriver.
 
         :param onion_url: The onion URL to capture.
         :param onion_index: The index of the onion link in a list or sequence.
         :param driver: The webdriver instance to use for capturing the screenshot.
-        :param screenshots_table: Table to add captured screenshots to.
+        :param previous_content_hash: The onion's content hash from its last capture.
+            In incremental (dom) mode, the screenshot is only taken if the rendered page's content hash differs.
+        :return: A tuple containing the path to the saved screenshot and the page's content hash
+            (None unless in incremental dom mode): (file_path, content_hash).
+        :raise ContentUnchanged: If the page's content hash is the same as the previous one.
         """
 
-        # Construct the directory name based on the URL
-        directory_name = construct_output_name(url=args.onion)
-
         # Add HTTP to the URL if it's not already there
         validated_onion_link = add_http_to_link(link=onion_url)
 
-        # Construct the filename for the screenshot from the onion link
-        filename = construct_output_name(url=validated_onion_link) + ".png"
-
-        # Construct the full file path
-        file_path = os.path.join(PROGRAM_DIRECTORY, directory_name, filename)
+        filename, file_path = self.screenshot_path(onion_url=validated_onion_link)
 
         # Log the onion link being captured
         log.info(f"{onion_index} Capturing... {validated_onion_link}")
 
-        # Navigate to the URL
-        driver.get(validated_onion_link)
+        # A page that doesn't finish loading in time is captured as it is, to a separate partial capture file
+        partial_file_path = file_path[: -len(".png")] + ".partial.png"
 
-        if os.path.exists(path=file_path):
-            log.info(f"{onion_index} [yellow][italic]{filename}[/][/] already exists.")
-        else:
-            # Take a full screenshot of the onion and save it to the given file path
-            driver.save_full_page_screenshot(file_path)
+        # Navigate to the URL (the page load timeout is the navigate deadline)
+        try:
+            with self.metrics.timer("navigate_seconds"):
+                driver.get(validated_onion_link)
+        except TimeoutException:
+            raise CaptureTimeout(
+                phase="navigate",
+                partial_capture=self.save_partial_capture(
+                    driver=driver, file_path=partial_file_path
+                ),
+            )
 
-            with self.log_lock:
-                # Log the successful capture
+        # Wait for the page to settle (finish loading), within the settle deadline
+        try:
+            with self.metrics.timer("settle_seconds"):
+                WebDriverWait(driver=driver, timeout=self.settle_timeout).until(
+                    lambda _driver: _driver.execute_script("return document.readyState")
+                    == "complete"
+                )
+            settled = True
+        except TimeoutException:
+            driver.execute_script("window.stop();")
+            settled = False
+
+        content_hash = None
+        if self.incremental == "dom" and settled:
+            # Skip the (expensive) full page screenshot if the rendered content hasn't changed
+            content_hash = get_content_hash(page_source=driver.page_source)
+            if content_hash == previous_content_hash:
+                raise ContentUnchanged(content_hash=content_hash)
+
+        # Take a screenshot of the onion (full page, or only the viewport) and save it to the given file path
+        self.save_screenshot(
+            driver=driver,
+            file_path=file_path if settled else partial_file_path,
+            full_page=not self.viewport_only,
+        )
+
+        if not settled:
+            raise CaptureTimeout(phase="settle", partial_capture=partial_file_path)
+
+        with self.log_lock:
+            # Log the successful capture
+            log.info(
+                f"{onion_index} [dim]{driver.title}[/] - [yellow][italic][link file://{filename}]{filename}[/][/]"
+            )
+
+        return file_path, content_hash
+
+    def load_duplicate_index(self):
+        """
+        Creates the near-duplicate index, unless it already exists, with the perceptual hashes of the archive
+        (from the capture index), so near-duplicates are found across runs.
+        """
+        if self.duplicate_index is None:
+            self.duplicate_index = DuplicateIndex(threshold=self.duplicate_threshold)
+            self.duplicate_index.load(entries=self.capture_index.perceptual_hashes())
+
+    def open_session(self, pool_size: int = 3):
+        """
+        Opens the resources that are shared by the runs of one or more seeds: the metrics exporters,
+        the launched Tor instances, the WebDriver pool, the near-duplicate index and the post-processor.
+
+        The Tor SOCKS endpoint(s) must already be running (unless Tor instances are launched by Tor2Tor).
+
+        :param pool_size: Size of the WebDriver instance pool.
+        """
+        try:
+            # Expose the metrics while the session is open
+            if self.metrics_port is not None:
+                self.metrics_exporters.append(
+                    MetricsServer(metrics=self.metrics, port=self.metrics_port)
+                )
                 log.info(
-                    f"{onion_index} [dim]{driver.title}[/] - [yellow][italic][link file://{filename}]{filename}[/][/]"
+                    f"Serving metrics on [italic]http://127.0.0.1:{self.metrics_port}/metrics[/]"
+                )
+            if self.metrics_file is not None:
+                self.metrics_exporters.append(
+                    MetricsFileWriter(
+                        metrics=self.metrics,
+                        file_path=self.metrics_file,
+                        interval=self.metrics_interval,
+                    )
                 )
 
-            with self.table_lock:
-                # Add screenshot info to the Table
-                file_size, created_time = get_file_info(filename=file_path)
-                screenshots_table.add_row(
-                    str(onion_index),
-                    filename,
-                    str(file_size),
-                    str(created_time),
+            if self.tor_instances_count:
+                # Launch the Tor instances the Tor SOCKS endpoints are sharded across.
+                log.info(f"Launching {self.tor_instances_count} Tor instances...")
+                self.tor_instances = launch_tor_instances(
+                    count=self.tor_instances_count,
+                    base_port=self.tor_base_port,
+                    data_directory=os.path.join(PROGRAM_DIRECTORY, "tor-instances"),
+                )
+
+                # Each instance's circuits are renewed through its own control port
+                self.tor_controllers = {
+                    (self.socks_host, instance.port): TorController(
+                        host=self.socks_host, port=instance.control_port
+                    )
+                    for instance in self.tor_instances
+                }
+
+            firefox_pool = self.firefox_pool = self.open_firefox_pool(pool_size=pool_size)
+            self.initial_pool_size = pool_size
+
+            # Register the live gauges of the pool
+            self.metrics.set_gauge("pool_size", lambda: self.pool_size)
+            self.metrics.set_gauge(
+                "pool_in_use", lambda: max(self.pool_size - firefox_pool.qsize(), 0)
+            )
+            self.metrics.set_gauge(
+                "pool_utilization",
+                lambda: max(self.pool_size - firefox_pool.qsize(), 0)
+                / max(self.pool_size, 1),
+            )
+            self.metrics.set_gauge(
+                "tor_streams_in_use", lambda: sum(self.tor_shards.loads().values())
+            )
+
+            self.load_duplicate_index()
+
+            if self.postprocess_enabled:
+                self.post_processor = ScreenshotPostProcessor(**self.postprocess_options)
+        except BaseException:
+            self.close_session()
+            raise
+
+    def close_session(self):
+        """
+        Closes the resources opened by open_session().
+        """
+        if self.firefox_pool is not None:
+            self.close_firefox_pool(pool=self.firefox_pool)
+            self.firefox_pool = None
+
+        if self.post_processor is not None:
+            self.post_processor.shutdown()
+            self.post_processor = None
+
+        # Write the rest of the session's archive manifest
+        self.screenshot_store.close()
+
+        stop_tor_instances(instances=self.tor_instances)
+        if self.tor_instances:
+            self.tor_controllers = {}
+        self.tor_instances = []
+
+        for gauge in [
+            "pool_size",
+            "pool_in_use",
+            "pool_utilization",
+            "tor_streams_in_use",
+        ]:
+            self.metrics.remove_gauge(name=gauge)
+
+        for metrics_exporter in self.metrics_exporters:
+            metrics_exporter.stop()
+        self.metrics_exporters = []
+
+    def run_seed(
+        self,
+        seed_onion: str,
+        worker_threads: int = 3,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+        feed: Callable[[Queue], None] = None,
+        stop_event: Event = None,
+    ) -> Iterator[dict]:
+        """
+        Crawls a seed onion and captures the onions found on it with the open session's WebDriver pool,
+        yielding the result of each onion as soon as it is captured or skipped.
+
+        :param seed_onion: The onion to start crawling from.
+        :param worker_threads: Number of worker threads.
+        :param depth: Number of hops to crawl away from the seed onion.
+        :param limit: Maximum number of onions to capture.
+        :param resume: If True, onions left pending by a previous (interrupted) run of the seed are captured first.
+        :param feed: A function that adds the onions to capture to the tasks queue (which it is called with),
+            instead of crawling the seed, e.g. to capture onions claimed from a distributed queue.
+        :param stop_event: An event that stops the run once it is set (see stop()), e.g. by another thread,
+            even before the run has started. If None, the run gets an event of its own.
+        :return: A generator yielding a dictionary for each captured, skipped or unchanged onion (see run()).
+        :raise RuntimeError: If no session is open (see open_session()).
+        """
+        if self.firefox_pool is None:
+            raise RuntimeError("A session must be opened (with open_session()) before running a seed.")
+
+        seed_url = add_http_to_link(link=seed_onion)
+        firefox_pool = self.firefox_pool
+
+        # Create a directory with the onion link as the name.
+        path_finder(url=seed_url)
+        self.output_directory = os.path.join(
+            PROGRAM_DIRECTORY, construct_output_name(url=seed_url)
+        )
+
+        # Each run has its own stop event, so stopping a run that has already ended doesn't affect the next one
+        self.stop_event = stop_event if stop_event is not None else Event()
+        self.workers_to_retire = 0
+        crawler = None
+        autoscaler = None
+        results_queue = Queue()
+        crawl_errors = []
+
+        # Onions are captured in order of their expected cost, estimated from their capture history
+        tasks_queue = CaptureScheduler(
+            history=self.capture_index.history,
+            default_duration=self.capture_index.average_duration() or DEFAULT_DURATION,
+            max_per_host=self.max_per_host,
+        )
+
+        # Failed captures are retried through the run's tasks queue
+        self.retry_scheduler = RetryScheduler(
+            tasks_queue=tasks_queue,
+            max_retries=self.max_retries,
+            base_delay=self.retry_delay,
+            controllers=self.tor_controllers,
+            newnym_after=self.newnym_after,
+        )
+
+        try:
+            # Register the live gauges of the queues
+            self.metrics.set_gauge("tasks_queue_depth", tasks_queue.queued)
+            self.metrics.set_gauge("results_queue_depth", results_queue.qsize)
+
+            # Start the workers, so captures start as soon as onions are found
+            workers = self.execute_worker(
+                worker_threads=worker_threads,
+                tasks_queue=tasks_queue,
+                firefox_pool=firefox_pool,
+                results_queue=results_queue,
+            )
+
+            if self.autoscale:
+                # Resize the pool during the run, with one worker per instance
+                # (extra workers would only wait to borrow an instance, and fewer would leave instances idle)
+                def resize(size: int):
+                    self.resize_firefox_pool(pool=firefox_pool, size=size)
+                    self.resize_workers(
+                        threads=workers,
+                        size=size,
+                        tasks_queue=tasks_queue,
+                        firefox_pool=firefox_pool,
+                        results_queue=results_queue,
+                    )
+
+                autoscaler = Autoscaler(
+                    metrics=self.metrics,
+                    pool_size=lambda: self.pool_size,
+                    pool_in_use=lambda: max(self.pool_size - firefox_pool.qsize(), 0),
+                    queued=tasks_queue.queued,
+                    resize=resize,
+                    min_pool_size=self.min_pool_size,
+                    max_pool_size=self.max_pool_size
+                    or max(self.initial_pool_size, os.cpu_count() or 1),
+                    interval=self.autoscale_interval,
                 )
 
+            def crawl():
+                prober = None
+                try:
+                    if feed is not None:
+                        feed(tasks_queue)
+                    else:
+                        if self.probe_timeout:
+                            # Probe the crawled onions first, so only the responsive ones reach the workers
+                            prober = LivenessProber(
+                                tasks_queue=tasks_queue,
+                                on_dead=lambda task, error, started_at: self.record_probe_failure(
+                                    results_queue=results_queue,
+                                    task=task,
+                                    error=error,
+                                    started_at=started_at,
+                                ),
+                                tor_shards=self.tor_shards,
+                                timeout=self.probe_timeout,
+                                concurrency=self.probe_concurrency,
+                                metrics=self.metrics,
+                            )
+
+                        # Crawl onion URLs from the provided URL and feed them to the workers
+                        self.crawl_onions(
+                            seed_onion=seed_url,
+                            depth=depth,
+                            limit=limit,
+                            tasks_queue=prober or tasks_queue,
+                            resume=resume,
+                        )
+                except Exception as e:
+                    crawl_errors.append(e)
+                finally:
+                    # Wait for the onions that are still being probed to reach the tasks queue
+                    if prober is not None:
+                        prober.close()
+                        log.info(
+                            f"{prober.dead} of {prober.alive + prober.dead} onions failed their liveness probe."
+                        )
+
+                    # Keep autoscaling while the queued tasks are captured, but not while the workers are stopped
+                    tasks_queue.join()
+                    if autoscaler is not None:
+                        autoscaler.stop()
+                    self.stop_workers(threads=workers, tasks_queue=tasks_queue)
+
+                    # Wait for the screenshots that are still being post-processed
+                    if self.post_processor is not None:
+                        self.post_processor.wait()
+
+                    results_queue.put(None)
+
+            crawler = Thread(target=crawl)
+            crawler.start()
+
+            # Yield the results as the workers add them, until the crawler signals the end of the run
+            for result in iter(results_queue.get, None):
+                result["seed"] = seed_url
+                self.results_counts[result["status"]] += 1
+                self.metrics.increment("results", status=result["status"])
+                yield result
+
+            crawler.join()
+            if crawl_errors:
+                raise crawl_errors[0]
+
+        finally:
+            if crawler is not None and crawler.is_alive():
+                # The results are no longer being consumed, so stop crawling and drop the remaining tasks
+                self.stop_event.set()
+                self.retry_scheduler.cancel()
+                crawler.join()
+
+            if autoscaler is not None:
+                autoscaler.stop()
+
+            for gauge in ["tasks_queue_depth", "results_queue_depth"]:
+                self.metrics.remove_gauge(name=gauge)
+
+    def stop(self):
+        """
+        Stops the current run (see run_seed()) from another thread: crawling stops, the queued onions are dropped
+        and the pending retries are cancelled, while the captures in progress finish within their timeouts.
+        The run's generator then ends once its remaining results are yielded.
+        Once the run has ended, this has no effect (the next run has a stop event of its own).
+        """
+        self.stop_event.set()
+        if self.retry_scheduler is not None:
+            self.retry_scheduler.cancel()
+
+    def run(
+        self,
+        seed_onion: str,
+        pool_size: int = 3,
+        worker_threads: int = 3,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Crawls a seed onion and captures the onions found on it, yielding the result of each onion
+        as soon as it is captured or skipped.
+
+        The Tor SOCKS endpoint(s) must already be running (unless Tor instances are launched by Tor2Tor).
+
+        :param seed_onion: The onion to start crawling from.
+        :param pool_size: Size of the WebDriver instance pool.
+        :param worker_threads: Number of worker threads.
+        :param depth: Number of hops to crawl away from the seed onion.
+        :param limit: Maximum number of onions to capture.
+        :param resume: If True, onions left pending by a previous (interrupted) run of the seed are captured first.
+        :return: A generator yielding a dictionary for each captured, skipped or unchanged onion, with the keys:
+            index, onion, seed, status ("captured", "skipped" or "unchanged"), file, thumbnail, processing_time,
+            phash, duplicate_of, already_captured, attempts, reason and timestamp (see sinks.RESULT_FIELDS).
+        """
+        self.results_counts.clear()
+        self.open_session(pool_size=pool_size)
+        try:
+            yield from self.run_seed(
+                seed_onion=seed_onion,
+                worker_threads=worker_threads,
+                depth=depth,
+                limit=limit,
+                resume=resume,
+            )
+        finally:
+            self.close_session()
+
+    def run_batch(
+        self,
+        seed_onions: list,
+        pool_size: int = 3,
+        worker_threads: int = 3,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Crawls and captures several seed onions one after another, through one session
+        (the same Tor instances and warm WebDriver pool), yielding the results of all of them.
+
+        A seed that fails (e.g. because its page can't be fetched) is logged, and the batch moves on to the next one.
+
+        :param seed_onions: The onions to start crawling from.
+        :param pool_size: Size of the WebDriver instance pool.
+        :param worker_threads: Number of worker threads.
+        :param depth: Number of hops to crawl away from each seed onion.
+        :param limit: Maximum number of onions to capture per seed.
+        :param resume: If True, onions left pending by previous (interrupted) runs of the seeds are captured first.
+        :return: A generator yielding a dictionary for each onion (see run()). The "seed" key tells the seeds apart.
+        """
+        self.results_counts.clear()
+        self.open_session(pool_size=pool_size)
+        try:
+            for seed_index, seed_onion in enumerate(seed_onions, start=1):
+                log.info(f"Seed {seed_index}/{len(seed_onions)}: {seed_onion}")
+                try:
+                    yield from self.run_seed(
+                        seed_onion=seed_onion,
+                        worker_threads=worker_threads,
+                        depth=depth,
+                        limit=limit,
+                        resume=resume,
+                    )
+                except Exception as e:
+                    log.error(f"Failed to capture {seed_onion}: [red]{e}[/]")
+        finally:
+            self.close_session()
+
+    def log_cache_counts(self):
+        """
+        Logs the page cache's hits, revalidations and misses.
+        """
+        if self.page_cache is not None:
+            counts = self.page_cache.counts
+            log.info(
+                f"Page cache: {counts['hit']} hits, {counts['revalidated']} revalidated, "
+                f"{counts['miss']} misses."
+            )
+
+    def close(self):
+        """
+        Closes the capture index, the fetcher's pooled connections, the page cache and the screenshot archive.
+        """
+        self.screenshot_store.close()
+        self.capture_index.close()
+        self.fetcher.close()
+        if self.page_cache is not None:
+            self.page_cache.close()
+
+    @contextmanager
+    def entry_point(
+        self, role: str = None, manage_tor_service: bool = True, exit_on_error: bool = True
+    ):
+        """
+        Wraps the body of an entry point (execute_scraper(), execute_daemon(), ...): the system's Tor service
+        is started before it and stopped after it, interruptions and errors are logged, and the resources
+        the body registers are closed (then Tor2Tor's own) however it ends.
+
+        :param role: What is being started (e.g. "coordinator"), for the log.
+        :param manage_tor_service: If True, the system's Tor service is started before the body and stopped after it.
+        :param exit_on_error: If True, the program exits once an interruption or error is logged,
+            otherwise the with block just ends.
+        :return: A context manager yielding an ExitStack, to which the body adds the cleanup of its resources.
+        """
+        start_time = datetime.now()
+        log.info(f"Starting 🧅Tor2Tor {__version__}{f' {role}' if role else ''} {start_time}...")
+
+        cleanup = ExitStack()
+        try:
+            if manage_tor_service:
+                tor_service(command="start")  # Start the Tor service.
+
+            yield cleanup
+
+        except KeyboardInterrupt:
+            log.warning(f"User Interruption detected ([yellow]Ctrl+C[/])")
+            if exit_on_error:
+                sys.exit()
+        except Exception as e:
+            log.error(f"An error occurred: [red]{e}[/]")
+            if exit_on_error:
+                sys.exit()
+        finally:
+            cleanup.close()
+            self.close()
+
+            if manage_tor_service:
+                tor_service(command="stop")  # Stop the Tor service.
+            log.info(f"Stopped in {datetime.now() - start_time} seconds.")
+
     def execute_scraper(
         self,
         target_onion: str,
         pool_size: int,
         worker_threads: int,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+        results_file: str = None,
+        results_format: str = None,
+        show_tables: bool = True,
+        manage_tor_service: bool = True,
     ):
         """
         Executes the scraper code.
@@ -322,77 +1920,684 @@ class Tor2Tor:
         :param target_onion: The onion to scrape.
         :param pool_size: Size of the WebDriver instance pool (default is 3).
         :param worker_threads: Number of threads.
+        :param depth: Number of hops to crawl away from the target onion.
+        :param limit: Maximum number of onions to capture.
+        :param resume: If True, onions left pending by a previous (interrupted) run are captured first.
+        :param results_file: Path to the file results are streamed to.
+            If None, they are streamed to results.jsonl in the onion's output directory.
+        :param results_format: Format of the results file ("jsonl" or "csv"). If None, the file's extension decides.
+        :param show_tables: If True, tables of the run's results are printed (from the results file) once it ends.
+        :param manage_tor_service: If True, the system's Tor service is started before the run and stopped after it.
         """
-        firefox_pool = None
+        with self.entry_point(manage_tor_service=manage_tor_service) as cleanup:
+            if results_file is None:
+                results_file = os.path.join(
+                    PROGRAM_DIRECTORY,
+                    construct_output_name(url=add_http_to_link(link=target_onion)),
+                    "results.jsonl",
+                )
 
-        start_time = datetime.now()
-        log.info(f"Starting 🧅Tor2Tor {__version__} {start_time}...")
+            # Stream each result to the results file as it is produced
+            results_sink = cleanup.enter_context(
+                open_sink(file_path=results_file, sink_format=results_format)
+            )
+            for result in self.run(
+                seed_onion=target_onion,
+                pool_size=pool_size,
+                worker_threads=worker_threads,
+                depth=depth,
+                limit=limit,
+                resume=resume,
+            ):
+                results_sink.write(result=result)
+            results_sink.close()
 
-        try:
-            check_updates()
+            log.info("DONE!\n")
 
-            tor_service(command="start")  # Start the Tor service.
+            if show_tables:
+                self.print_results_tables(
+                    results_file=results_file,
+                    results_format=results_format,
+                    offset=results_sink.start_offset,
+                )
 
-            # Fetch onion URLs from the provided URL
-            onions = self.get_onions_on_page(
-                onion_url=add_http_to_link(link=target_onion)
+            log.info(f"{self.results_counts['captured']} onions captured.")
+            log.info(f"{self.results_counts['skipped']} onions skipped.")
+            if self.incremental:
+                log.info(f"{self.results_counts['unchanged']} onions unchanged.")
+            log.info(
+                f"{self.retry_scheduler.retries} retries, "
+                f"{self.retry_scheduler.circuit_renewals} Tor circuit renewals."
             )
+            self.log_cache_counts()
+            log.info(f"Results saved to [italic]{results_file}[/]")
+
+    def execute_batch(
+        self,
+        target_onions: list,
+        pool_size: int,
+        worker_threads: int,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+        results_file: str = None,
+        results_format: str = None,
+        show_tables: bool = True,
+        manage_tor_service: bool = True,
+    ):
+        """
+        Executes the scraper code for several onions, through one Tor session and one warm WebDriver pool.
+
+        Each onion's screenshots and results are kept in its own output directory (as with execute_scraper()),
+        and the results of all the onions are also combined in one results file.
+
+        :param target_onions: The onions to scrape.
+        :param pool_size: Size of the WebDriver instance pool (default is 3).
+        :param worker_threads: Number of threads.
+        :param depth: Number of hops to crawl away from each target onion.
+        :param limit: Maximum number of onions to capture per target onion.
+        :param resume: If True, onions left pending by previous (interrupted) runs are captured first.
+        :param results_file: Path to the file the combined results are streamed to.
+            If None, they are streamed to batch-<start time>.jsonl in the program's directory.
+        :param results_format: Format of the results files ("jsonl" or "csv"). If None, the file's extension decides.
+        :param show_tables: If True, tables of the combined results are printed (from the results file) once it ends.
+        :param manage_tor_service: If True, the system's Tor service is started before the batch and stopped after it.
+        """
+        with self.entry_point(manage_tor_service=manage_tor_service) as cleanup:
+            log.info(f"Scraping {len(target_onions)} onions...")
 
-            firefox_pool = self.open_firefox_pool(pool_size=pool_size)
+            if results_file is None:
+                results_file = os.path.join(
+                    PROGRAM_DIRECTORY,
+                    f"batch-{datetime.now():%Y%m%d-%H%M%S}.{results_format or 'jsonl'}",
+                )
+            seed_results_format = detect_sink_format(
+                file_path=results_file, sink_format=results_format
+            )
 
-            # Create a table where capture screenshots will be displayed
-            screenshots_table = create_table(
-                table_title="Screenshots",
-                table_headers=["#", "filename", "size (bytes)", "timestamp"],
+            # Stream each result to the combined results file, and to its seed's own results file
+            results_sink = cleanup.enter_context(
+                open_sink(file_path=results_file, sink_format=results_format)
             )
+            seed_counts = Counter()
+            seed_sink = None
+            try:
+                for result in self.run_batch(
+                    seed_onions=target_onions,
+                    pool_size=pool_size,
+                    worker_threads=worker_threads,
+                    depth=depth,
+                    limit=limit,
+                    resume=resume,
+                ):
+                    results_sink.write(result=result)
+
+                    seed_file = os.path.join(
+                        PROGRAM_DIRECTORY,
+                        construct_output_name(url=result["seed"]),
+                        f"results.{seed_results_format}",
+                    )
+                    if seed_sink is None or seed_sink.file_path != seed_file:
+                        if seed_sink is not None:
+                            seed_sink.close()
+                        seed_sink = open_sink(file_path=seed_file, sink_format=seed_results_format)
+                    seed_sink.write(result=result)
+                    seed_counts[result["seed"]] += 1
+            finally:
+                if seed_sink is not None:
+                    seed_sink.close()
+
+            results_sink.close()
+
+            log.info("DONE!\n")
 
-            # Initialize Queue and add tasks
-            tasks_queue = Queue()
+            if show_tables:
+                self.print_results_tables(
+                    results_file=results_file,
+                    results_format=results_format,
+                    offset=results_sink.start_offset,
+                )
 
-            for onion_index, onion in enumerate(onions, start=1):
-                tasks_queue.put((onion_index, onion))
+            for seed_onion in target_onions:
+                seed_url = add_http_to_link(link=seed_onion)
+                log.info(f"{seed_counts[seed_url]} results from {seed_url}.")
+            log.info(f"{self.results_counts['captured']} onions captured.")
+            log.info(f"{self.results_counts['skipped']} onions skipped.")
+            if self.incremental:
+                log.info(f"{self.results_counts['unchanged']} onions unchanged.")
+            log.info(f"{self.metrics.counter_total('retries'):.0f} retries.")
+            self.log_cache_counts()
+            log.info(f"Combined results saved to [italic]{results_file}[/]")
+
+    def serve_queue(
+        self,
+        lease_queue: LeaseQueue,
+        pool_size: int = 3,
+        worker_threads: int = 3,
+        worker_id: str = None,
+        idle_timeout: float = None,
+        poll_interval: float = 5,
+    ) -> Iterator[dict]:
+        """
+        Captures onions claimed from a distributed queue (see distributed.LeaseQueue), one seed at a time,
+        and acknowledges each of them with its result. Leases are renewed while their onions are being captured.
+
+        :param lease_queue: The queue to claim onions from.
+        :param pool_size: Size of the WebDriver instance pool.
+        :param worker_threads: Number of worker threads.
+        :param worker_id: Identifier of this worker (default: the hostname and PID).
+        :param idle_timeout: Seconds to wait for new onions once the queue is empty. If None, wait forever.
+        :param poll_interval: Seconds between checks of an empty queue.
+        :return: A generator yielding a dictionary for each onion (see run()).
+        """
+        worker_id = worker_id or default_worker_id()
+        self.results_counts.clear()
+        self.open_session(pool_size=pool_size)
+        try:
+            idle_since = time.monotonic()
+            while True:
+                seed_url = lease_queue.next_seed()
+                if seed_url is None:
+                    if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                        log.info("No onions left to capture in the queue.")
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                # The leased task IDs of the onions that are queued or being captured, by onion url
+                leased_tasks = {}
+                leases_lock = Lock()
+
+                def feed(tasks_queue: Queue):
+                    last_renewal = time.monotonic()
+                    while not self.stop_event.is_set():
+                        # Claim enough onions to keep the pool busy, without hoarding them from other workers
+                        with leases_lock:
+                            capacity = max(self.pool_size, worker_threads) * 2 - len(leased_tasks)
+                            task_ids = list(leased_tasks.values())
+
+                        if time.monotonic() - last_renewal >= lease_queue.lease_seconds / 3:
+                            lease_queue.renew(task_ids=task_ids, worker_id=worker_id)
+                            last_renewal = time.monotonic()
+
+                        claimed_tasks = (
+                            lease_queue.claim(worker_id=worker_id, seed=seed_url, limit=capacity)
+                            if capacity > 0
+                            else []
+                        )
+                        with leases_lock:
+                            for task in claimed_tasks:
+                                leased_tasks[task.onion] = task.id
+                            if not leased_tasks:
+                                # The seed has no onions left to claim, and all of ours are acknowledged
+                                return
+
+                        for task in claimed_tasks:
+                            self.capture_index.mark_pending(
+                                key=task.key,
+                                url=task.onion,
+                                seed=construct_output_name(url=seed_url),
+                            )
+                            tasks_queue.put(CaptureTask(index=task.index, onion=task.onion))
+
+                        time.sleep(1)
+
+                log.info(f"Capturing onions of {seed_url} from the queue...")
+                try:
+                    for result in self.run_seed(
+                        seed_onion=seed_url, worker_threads=worker_threads, feed=feed
+                    ):
+                        with leases_lock:
+                            task_id = leased_tasks.pop(result["onion"], None)
+                        if task_id is not None:
+                            lease_queue.ack(task_id=task_id, result=result)
+                        yield result
+                finally:
+                    # Give back the onions that won't be captured (e.g. when the run is stopped)
+                    with leases_lock:
+                        lease_queue.release(
+                            task_ids=list(leased_tasks.values()), worker_id=worker_id
+                        )
+
+                idle_since = time.monotonic()
+        finally:
+            self.close_session()
 
-                if onion_index == args.limit:
-                    # If onion index is equal to the limit set in -l/--limit, break the loop.
+    def merge_result(
+        self, task: LeasedTask, result: dict, claimed_at: float, finished_at: float
+    ) -> dict:
+        """
+        Merges the result of an onion captured by a distributed worker into the central capture index
+        and near-duplicate index.
+
+        :param task: The onion's task.
+        :param result: The result the worker acknowledged the task with.
+        :param claimed_at: Unix timestamp of when the task was last claimed.
+        :param finished_at: Unix timestamp of when the task was finished.
+        :return: The merged result, with all the sinks.RESULT_FIELDS keys.
+        """
+        merged = {field: result.get(field) for field in RESULT_FIELDS}
+        merged.update(
+            index=task.index,
+            onion=task.onion,
+            seed=task.seed,
+            status=result.get("status") or "skipped",
+            already_captured=bool(result.get("already_captured")),
+            attempts=result.get("attempts") or task.attempts,
+            timestamp=result.get("timestamp")
+            or convert_timestamp_to_datetime(timestamp=finished_at),
+        )
+
+        entry = self.capture_index.get(key=task.key)
+        centrally_captured = entry is not None and entry["status"] == "captured"
+        self.capture_index.mark_pending(
+            key=task.key, url=task.onion, seed=construct_output_name(url=task.seed)
+        )
+
+        # An onion the worker had already captured (in an earlier run) is merged like a new capture
+        # if the central index doesn't have it yet, so it isn't left pending
+        if merged["status"] == "captured" and not (
+            merged["already_captured"] and centrally_captured
+        ):
+            phash = int(merged["phash"], 16) if merged["phash"] else None
+
+            # Near-duplicates are found across the screenshots of all the workers
+            duplicate = (
+                self.duplicate_index.add(key=task.key, file_path=merged["file"], phash=phash)
+                if phash is not None
+                else None
+            )
+            merged["duplicate_of"] = duplicate[0] if duplicate is not None else None
+
+            self.capture_index.mark_captured(
+                key=task.key,
+                file_path=merged["file"],
+                sha256=None,
+                started_at=claimed_at or finished_at,
+                finished_at=finished_at,
+                phash=phash,
+                duplicate_of=merged["duplicate_of"],
+                render_profile=merged["render_profile"],
+            )
+        elif merged["status"] == "unchanged":
+            self.capture_index.mark_unchanged(key=task.key, checked_at=finished_at)
+        elif merged["status"] == "skipped":
+            self.capture_index.mark_failed(
+                key=task.key,
+                started_at=claimed_at or finished_at,
+                finished_at=finished_at,
+                attempts=merged["attempts"],
+            )
+            self.capture_index.mark_skipped(
+                key=task.key,
+                reason=merged["reason"] or "",
+                started_at=claimed_at or finished_at,
+                finished_at=finished_at,
+            )
+        return merged
+
+    def execute_coordinator(
+        self,
+        target_onions: list,
+        queue_file: str,
+        depth: int = 1,
+        limit: int = 10,
+        resume: bool = False,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        results_file: str = None,
+        results_format: str = None,
+        show_tables: bool = True,
+        manage_tor_service: bool = True,
+        poll_interval: float = 5,
+        idle_timeout: float = None,
+    ):
+        """
+        Crawls onions and publishes the onions found to a distributed queue, for tor2tor workers
+        (on this or other nodes) to capture, then merges the workers' results centrally.
+
+        :param target_onions: The onions to crawl.
+        :param queue_file: Path to the queue's database (e.g. on a volume shared with the workers).
+        :param depth: Number of hops to crawl away from each target onion.
+        :param limit: Maximum number of onions to publish per target onion.
+        :param resume: If True, onions left pending by previous (interrupted) crawls are published first.
+        :param lease_seconds: Seconds a claimed onion is leased to a worker for.
+        :param results_file: Path to the file the merged results are streamed to.
+            If None, they are streamed to coordinator-<start time>.jsonl in the program's directory.
+        :param results_format: Format of the results file ("jsonl" or "csv"). If None, the file's extension decides.
+        :param show_tables: If True, tables of the merged results are printed (from the results file) once it ends.
+        :param manage_tor_service: If True, the system's Tor service is started before crawling and stopped after it.
+        :param poll_interval: Seconds between reads of the workers' results.
+        :param idle_timeout: Seconds to wait for workers to claim the remaining onions, when none are being
+            captured, before giving up on them. If None, wait forever.
+        """
+        with self.entry_point(role="coordinator", manage_tor_service=manage_tor_service) as cleanup:
+            lease_queue = LeaseQueue(database_path=queue_file, lease_seconds=lease_seconds)
+            cleanup.callback(lease_queue.close)
+            if results_file is None:
+                results_file = os.path.join(
+                    PROGRAM_DIRECTORY,
+                    f"coordinator-{datetime.now():%Y%m%d-%H%M%S}.{results_format or 'jsonl'}",
+                )
+            results_sink = cleanup.enter_context(
+                open_sink(file_path=results_file, sink_format=results_format)
+            )
+            self.results_counts.clear()
+            self.load_duplicate_index()
+
+            seed_urls = [add_http_to_link(link=target_onion) for target_onion in target_onions]
+            crawl_done = Event()
+
+            def crawl():
+                try:
+                    for seed_url in seed_urls:
+                        publishing_queue = PublishingQueue(
+                            lease_queue=lease_queue,
+                            seed=seed_url,
+                            key_function=lambda onion: construct_output_name(url=onion),
+                        )
+                        try:
+                            self.crawl_onions(
+                                seed_onion=seed_url,
+                                depth=depth,
+                                limit=limit,
+                                tasks_queue=publishing_queue,
+                                resume=resume,
+                            )
+                        except Exception as e:
+                            log.error(f"Failed to crawl {seed_url}: [red]{e}[/]")
+                        log.info(
+                            f"Published {publishing_queue.published} onions of {seed_url} to {queue_file}."
+                        )
+                finally:
+                    crawl_done.set()
+
+            crawler = Thread(target=crawl, daemon=True)
+            crawler.start()
+
+            # Merge the workers' results as they come in, until every published onion is finished
+            last_sequences = dict.fromkeys(seed_urls, 0)
+            idle_since = time.monotonic()
+            while True:
+                crawled = crawl_done.is_set()
+
+                # Expire the leases of workers that died, so their onions are claimed by other workers
+                # (or failed, once they have used up their attempts) instead of being waited for forever
+                lease_queue.expire_leases()
+
+                outstanding = 0
+                leased = 0
+                merged_results = 0
+                for seed_url in seed_urls:
+                    for sequence, task, result, claimed_at, finished_at in lease_queue.results(
+                        seed=seed_url, after=last_sequences[seed_url]
+                    ):
+                        last_sequences[seed_url] = sequence
+                        merged_results += 1
+                        merged = self.merge_result(
+                            task=task,
+                            result=result,
+                            claimed_at=claimed_at,
+                            finished_at=finished_at,
+                        )
+                        self.results_counts[merged["status"]] += 1
+                        self.metrics.increment("results", status=merged["status"])
+                        results_sink.write(result=merged)
+
+                    counts = lease_queue.counts(seed=seed_url)
+                    outstanding += counts.get("pending", 0) + counts.get("leased", 0)
+                    leased += counts.get("leased", 0)
+
+                if crawled and not outstanding:
                     break
 
-            self.execute_worker(
+                if not crawled or leased or merged_results:
+                    idle_since = time.monotonic()
+                elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                    log.warning(
+                        f"No worker claimed the remaining {outstanding} onions in {idle_timeout:.0f} seconds, "
+                        f"they are left in {queue_file}."
+                    )
+                    break
+                log.debug(f"Waiting for {outstanding} onions to be captured by the workers...")
+                time.sleep(poll_interval)
+
+            results_sink.close()
+
+            log.info("DONE!\n")
+
+            if show_tables:
+                self.print_results_tables(
+                    results_file=results_file,
+                    results_format=results_format,
+                    offset=results_sink.start_offset,
+                )
+
+            log.info(f"{self.results_counts['captured']} onions captured.")
+            log.info(f"{self.results_counts['skipped']} onions skipped.")
+            if self.results_counts["unchanged"]:
+                log.info(f"{self.results_counts['unchanged']} onions unchanged.")
+            self.log_cache_counts()
+            log.info(f"Merged results saved to [italic]{results_file}[/]")
+
+    def execute_queue_worker(
+        self,
+        queue_file: str,
+        pool_size: int,
+        worker_threads: int,
+        worker_id: str = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        idle_timeout: float = None,
+        results_file: str = None,
+        results_format: str = None,
+        manage_tor_service: bool = True,
+    ):
+        """
+        Runs a distributed worker, which captures the onions published to a queue by a coordinator
+        and reports their results back to it.
+
+        :param queue_file: Path to the queue's database (e.g. on a volume shared with the coordinator).
+        :param pool_size: Size of the WebDriver instance pool (default is 3).
+        :param worker_threads: Number of threads.
+        :param worker_id: Identifier of this worker (default: the hostname and PID).
+        :param lease_seconds: Seconds a claimed onion is leased to this worker for (renewed while it is captured).
+        :param idle_timeout: Seconds to wait for new onions once the queue is empty. If None, wait forever.
+        :param results_file: Path to a file the worker's own results are also streamed to, if set.
+        :param results_format: Format of the results file ("jsonl" or "csv"). If None, the file's extension decides.
+        :param manage_tor_service: If True, the system's Tor service is started before the worker and stopped after it.
+        """
+        worker_id = worker_id or default_worker_id()
+        with self.entry_point(
+            role=f"worker {worker_id}", manage_tor_service=manage_tor_service
+        ) as cleanup:
+            lease_queue = LeaseQueue(database_path=queue_file, lease_seconds=lease_seconds)
+            cleanup.callback(lease_queue.close)
+            results_sink = None
+            if results_file is not None:
+                results_sink = cleanup.enter_context(
+                    open_sink(file_path=results_file, sink_format=results_format)
+                )
+
+            for result in self.serve_queue(
+                lease_queue=lease_queue,
+                pool_size=pool_size,
                 worker_threads=worker_threads,
-                tasks_queue=tasks_queue,
-                screenshots_table=screenshots_table,
-                firefox_pool=firefox_pool,
-            )
+                worker_id=worker_id,
+                idle_timeout=idle_timeout,
+            ):
+                if results_sink is not None:
+                    results_sink.write(result=result)
 
             log.info("DONE!\n")
+            log.info(f"{self.results_counts['captured']} onions captured.")
+            log.info(f"{self.results_counts['skipped']} onions skipped.")
 
-            # Print table showing captured screenshots
-            print(screenshots_table)
-            print("\n")
+    def execute_daemon(
+        self,
+        pool_size: int,
+        worker_threads: int,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        socket_path: str = None,
+        manage_tor_service: bool = True,
+    ):
+        """
+        Runs Tor2Tor as a long-lived daemon, which keeps Tor and the WebDriver pool warm and captures
+        the jobs submitted to its local HTTP API (see daemon.DaemonServer), until it is interrupted.
 
-            # Print the summary tables for captured and skipped onions
-            captured_onions, skipped_onions = self.onion_summary_tables(
-                captured_onions=list(self.captured_onions_queue.queue),
-                skipped_onions=list(self.skipped_onions_queue.queue),
+        :param pool_size: Size of the WebDriver instance pool (default is 3).
+        :param worker_threads: Number of worker threads for each job.
+        :param host: Address the API listens on. Only the local host by default.
+        :param port: Port the API listens on.
+        :param socket_path: If set, the API listens on this Unix socket instead of a TCP port.
+        :param manage_tor_service: If True, the system's Tor service is started before the daemon and stopped after it.
+        """
+        stop_event = Event()
+        # Unlike the other entry points, the daemon returns (rather than exiting) on Ctrl+C or an error
+        with self.entry_point(
+            role="daemon", manage_tor_service=manage_tor_service, exit_on_error=False
+        ) as cleanup:
+            cleanup.callback(self.close_session)
+            self.open_session(pool_size=pool_size)
+            job_manager = JobManager(tor2tor=self, worker_threads=worker_threads)
+            cleanup.callback(job_manager.stop)
+            server = DaemonServer(
+                job_manager=job_manager, host=host, port=port, socket_path=socket_path
             )
+            cleanup.callback(server.stop)
+            log.info(f"Accepting capture jobs on [italic]{server.address}[/]")
 
-            log.info(f"{len(self.captured_onions_queue.queue)} onions captured.")
-            print(captured_onions)
+            # Stop gracefully on SIGTERM (e.g. from a service manager), as on Ctrl+C
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            while not stop_event.wait(timeout=1):
+                pass
+            log.info("Stopping the daemon...")
 
-            log.info(f"{len(self.skipped_onions_queue.queue)} onions skipped.")
-            print(skipped_onions)
+    def print_results_tables(
+        self, results_file: str, results_format: str = None, offset: int = 0
+    ):
+        """
+        Prints tables of a run's results, read back from its results file.
 
-        except KeyboardInterrupt:
-            log.warning(f"User Interruption detected ([yellow]Ctrl+C[/])")
-            sys.exit()
-        except Exception as e:
-            log.error(f"An error occurred: [red]{e}[/]")
-            sys.exit()
-        finally:
-            if firefox_pool is not None:
-                self.close_firefox_pool(pool=firefox_pool)
+        :param results_file: Path to the results file.
+        :param results_format: Format of the results file ("jsonl" or "csv"). If None, the file's extension decides.
+        :param offset: Offset in the results file where the run's results start.
+        """
+        # Create a table where capture screenshots will be displayed
+        screenshots_table = create_table(
+            table_title="Screenshots",
+            table_headers=["#", "filename", "size (bytes)", "timestamp"]
+            + (["processing (seconds)"] if self.postprocess_enabled else []),
+        )
 
-            tor_service(command="stop")  # Stop the Tor service.
-            log.info(f"Stopped in {datetime.now() - start_time} seconds.")
+        captured_onions = []
+        skipped_onions = []
+        unchanged_onions = []
+        captured_keys = set()
+
+        for result in iter_results(
+            file_path=results_file, sink_format=results_format, offset=offset
+        ):
+            if result["status"] == "skipped":
+                skipped_onions.append(
+                    (
+                        result["index"],
+                        result["onion"],
+                        f"[yellow]{result['reason']}[/]",
+                        result["timestamp"],
+                        result.get("attempts") or 1,
+                    )
+                )
+                continue
+
+            if result["status"] == "unchanged":
+                unchanged_onions.append(
+                    (result["index"], result["onion"], result["timestamp"])
+                )
+                continue
+
+            captured_onions.append(
+                (
+                    result["index"],
+                    result["onion"],
+                    result["timestamp"],
+                    result.get("attempts") or 1,
+                )
+            )
+            if result["already_captured"] or not os.path.exists(result["file"]):
+                continue
+
+            captured_keys.add(
+                construct_output_name(url=add_http_to_link(link=result["onion"]))
+            )
+
+            # Add screenshot info to the Table
+            file_size, created_time = get_file_info(filename=result["file"])
+            row = [
+                str(result["index"]),
+                os.path.basename(result["file"]),
+                str(file_size),
+                str(created_time),
+            ]
+            if self.postprocess_enabled:
+                processing_time = result["processing_time"]
+                row.append("-" if processing_time is None else f"{processing_time:.2f}")
+            screenshots_table.add_row(*row)
+
+        # Print table showing captured screenshots
+        print(screenshots_table)
+        print("\n")
+
+        # Print the summary tables for captured and skipped onions
+        captured_onions_table, skipped_onions_table = self.onion_summary_tables(
+            captured_onions=captured_onions,
+            skipped_onions=skipped_onions,
+        )
+        print(captured_onions_table)
+        print(skipped_onions_table)
+
+        if self.incremental:
+            # Print a table of onions that weren't captured again, because their content hasn't changed
+            unchanged_onions_table = create_table(
+                table_headers=["#", "index", "onion", "timestamp"],
+            )
+            for index, unchanged_onion in enumerate(unchanged_onions, start=1):
+                unchanged_onions_table.add_row(
+                    str(index),
+                    str(unchanged_onion[0]),
+                    str(unchanged_onion[1]),
+                    str(unchanged_onion[2]),
+                )
+            print(unchanged_onions_table)
+
+        # Print the clusters of near-duplicate screenshots the captured onions belong to
+        clusters = self.duplicate_index.clusters(keys=captured_keys)
+        if clusters:
+            log.info(f"{len(clusters)} clusters of near-duplicate screenshots found.")
+            print(self.duplicate_clusters_table(clusters=clusters))
+
+    @staticmethod
+    def duplicate_clusters_table(clusters: list):
+        """
+        Creates a table showing clusters of near-duplicate screenshots.
+
+        :param clusters: A list of (canonical key, canonical file, [duplicate keys]) tuples.
+        :return: A table of the clusters.
+        """
+        clusters_table = create_table(
+            table_title="Near-duplicates",
+            table_headers=["#", "canonical", "duplicates", "count"],
+        )
+        for index, (canonical_key, canonical_file, duplicate_keys) in enumerate(
+            clusters, start=1
+        ):
+            clusters_table.add_row(
+                str(index),
+                os.path.basename(canonical_file),
+                "\n".join(duplicate_keys),
+                str(len(duplicate_keys)),
+            )
+
+        return clusters_table
 
     @staticmethod
     def onion_summary_tables(
@@ -417,7 +2622,7 @@ class Tor2Tor:
 
         # Create a table of captured onions
         captured_onions_table = create_table(
-            table_headers=["#", "index", "onion", "timestamp"],
+            table_headers=["#", "index", "onion", "timestamp", "attempts"],
         )
         for index, captured_onion in enumerate(captured_onions, start=1):
             captured_onions_table.add_row(
@@ -425,11 +2630,12 @@ class Tor2Tor:
                 str(captured_onion[0]),  # Index of the onion from the scraping task
                 str(captured_onion[1]),  # Onion url
                 str(captured_onion[2]),  # Time the onion was captured
+                str(captured_onion[3]),  # Number of attempts it took to capture the onion
             )
 
         # Create a table of skipped onions
         skipped_onions_table = create_table(
-            table_headers=["#", "index", "onion", "reason", "timestamp"],
+            table_headers=["#", "index", "onion", "reason", "timestamp", "attempts"],
         )
         for index, skipped_onion in enumerate(skipped_onions, start=1):
             skipped_onions_table.add_row(
@@ -438,6 +2644,7 @@ class Tor2Tor:
                 str(skipped_onion[1]),  # Onion url
                 str(skipped_onion[2]),  # Reason the onion was skipped
                 str(skipped_onion[3]),  # Time the onion was skipped
+                str(skipped_onion[4]),  # Number of attempts made before the onion was skipped
             )
 
         return captured_onions_table, skipped_onions_table